@@ -5,5 +5,6 @@ from .joystick_ import Joystick as joystick
 from .keyboard_control_ import KeyboardControl as keyboard_control
 from .odometer import Odometer, VelocityProvider
 from .path_segment import PathSegment
+from .pose_history import PoseHistory
 from .robot_object_ import RobotObject as robot_object
 from .steerer import Steerer
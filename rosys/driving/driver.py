@@ -1,3 +1,7 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import suppress
 from copy import deepcopy
 from dataclasses import dataclass, field
 from typing import Optional
@@ -23,6 +27,8 @@ class DriveParameters(ModificationContext):
     carrot_offset: float = 0.6
     carrot_distance: float = 0.1
     hook_bending_factor: float = 0
+    control_frequency: float = 10.0
+    trigger_on_odometry: bool = False
 
 
 @dataclass(slots=True, kw_only=True)
@@ -31,6 +37,8 @@ class DriveState:
     curvature: float
     backward: bool
     turn_angle: float
+    num_cycles: int = 0
+    num_overruns: int = 0
 
 
 class DrivingAbortedException(Exception):
@@ -43,6 +51,8 @@ class Driver:
     It requires a wheels module (or any drivable hardware representation) to execute individual drive commands.
     It also requires an odometer to get a current prediction of the robot's pose.
     Its `parameters` allow controlling the specific drive behavior.
+    Drive commands are sent with the `control_frequency` (in Hz) or, if `trigger_on_odometry` is set,
+    whenever the odometer reports a robot movement (but at least with the control frequency).
     """
 
     def __init__(self, wheels: Drivable, odometer: Odometer) -> None:
@@ -51,6 +61,8 @@ class Driver:
         self.parameters = DriveParameters()
         self.state: Optional[DriveState] = None
         self._abort = False
+        self._robot_moved = asyncio.Event()
+        self.odometer.ROBOT_MOVED.register(self._robot_moved.set)
 
     def abort(self) -> None:
         """Abort the current drive routine."""
@@ -62,14 +74,19 @@ class Driver:
         for x, y in [(1, 0), (1, 1), (0, 1), (0, 0)]:
             await self.drive_to(start_pose.transform(Point(x=x, y=y)))
 
+    def _create_timer(self) -> ControlTimer:
+        return ControlTimer(self.parameters.control_frequency,
+                            self._robot_moved if self.parameters.trigger_on_odometry else None)
+
     @analysis.track
     async def drive_arc(self) -> None:
+        timer = self._create_timer()
         while self.odometer.prediction.x < 2:
             if self._abort:
                 self._abort = False
                 raise DrivingAbortedException()
             await self.wheels.drive(1, np.deg2rad(25))
-            await rosys.sleep(0.1)
+            await timer.wait()
         await self.wheels.stop()
 
     @analysis.track
@@ -93,6 +110,7 @@ class Driver:
 
     @analysis.track
     async def drive_circle(self, target: Point, backward: bool = False) -> None:
+        timer = self._create_timer()
         while True:
             if self._abort:
                 self._abort = False
@@ -109,7 +127,7 @@ class Driver:
                 sign *= -1
             angular = linear / self.parameters.minimum_turning_radius * sign
             await self.wheels.drive(*self._throttle(linear, angular))
-            await rosys.sleep(0.1)
+            await timer.wait()
 
     @analysis.track
     async def drive_spline(self, spline: Spline, *, flip_hook: bool = False, throttle_at_end: bool = True) -> None:
@@ -118,7 +136,11 @@ class Driver:
 
         hook_offset = Point(x=self.parameters.hook_offset, y=0) * (-1 if flip_hook else 1)
         carrot_offset = Point(x=self.parameters.carrot_offset, y=0)
-        carrot = Carrot(spline=spline, offset=carrot_offset)
+        # NOTE: the hook follows the carrot's offset point, so its closest spline point is near the carrot (plus a margin)
+        search_radius = abs(self.parameters.carrot_offset) + self.parameters.carrot_distance + \
+            abs(self.parameters.hook_offset) + 1.0
+        carrot = Carrot(spline=spline, offset=carrot_offset, search_radius=search_radius)
+        timer = self._create_timer()
 
         while True:
             if self._abort:
@@ -143,7 +165,7 @@ class Driver:
                 drive_backward = False
                 curvature = (-1 if curvature > 0 else 1) / max(self.parameters.minimum_turning_radius, 0.001)
             linear: float = -1 if drive_backward else 1
-            t = spline.closest_point(hook.x, hook.y)
+            t = carrot.closest_point(hook)
             if t >= 1.0 and throttle_at_end:
                 target_distance = self.odometer.prediction.projected_distance(spline.pose(1.0))
                 linear *= ramp(target_distance, self.parameters.hook_offset, 0.0, 1.0, 0.01, clip=True)
@@ -154,10 +176,12 @@ class Driver:
                 curvature=curvature,
                 backward=drive_backward,
                 turn_angle=turn_angle,
+                num_cycles=timer.num_cycles,
+                num_overruns=timer.num_overruns,
             )
 
             await self.wheels.drive(*self._throttle(linear, angular))
-            await rosys.sleep(0.1)
+            await timer.wait()
 
         self.state = None
         await self.wheels.stop()
@@ -191,15 +215,71 @@ class Driver:
         return ramp(age, age_ramp[0], age_ramp[1], 1.0, 0.0, clip=True)
 
 
+class ControlTimer:
+    """Paces a control loop with absolute deadlines, so that delays of single cycles do not accumulate.
+
+    If a `trigger` is given, the next cycle starts as soon as it is set, but at the latest after one period.
+    Cycles which take longer than one period are counted as overruns and the missed deadlines are skipped.
+    """
+
+    def __init__(self, frequency: float, trigger: Optional[asyncio.Event] = None) -> None:
+        if frequency <= 0:
+            raise ValueError('the control frequency must be positive')
+        self.period = 1.0 / frequency
+        self.trigger = trigger
+        self.deadline = rosys.time()
+        self.num_cycles = 0
+        self.num_overruns = 0
+        if self.trigger is not None:
+            self.trigger.clear()
+
+    async def wait(self) -> None:
+        """Wait until the next cycle is due."""
+        self.num_cycles += 1
+        self.deadline += self.period
+        now = rosys.time()
+        if now > self.deadline:
+            self.num_overruns += 1
+            self.deadline = now
+            await asyncio.sleep(0)  # NOTE: give other tasks a chance to run
+            return
+        if self.trigger is None:
+            await rosys.sleep(self.deadline - now)
+            return
+        await self._wait_for_trigger(self.trigger, self.deadline - now)
+        self.trigger.clear()
+        self.deadline = min(self.deadline, rosys.time())
+
+    @staticmethod
+    async def _wait_for_trigger(trigger: asyncio.Event, seconds: float) -> None:
+        if rosys.is_test:
+            end_time = rosys.time() + seconds
+            while not trigger.is_set() and rosys.time() <= end_time:
+                await asyncio.sleep(0)
+            return
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(trigger.wait(), seconds / max(rosys.config.simulation_speed, 0.01))
+
+
 @dataclass(slots=True, kw_only=True)
 class Carrot:
+    """A point moving along a spline ahead of the robot's hook.
+
+    All lookups use the spline's arc-length table, so they take logarithmic time in the spline length.
+    Closest points are only searched within `search_radius` meters of arc length around the carrot.
+    """
     spline: Spline
     offset: Point = field(default_factory=lambda: Point(x=0, y=0))
     t: float = 0
-    _estimated_spline_length: float = field(init=False)
+    search_radius: float = 2.0
+    _offset_x: np.ndarray = field(init=False)
+    _offset_y: np.ndarray = field(init=False)
 
     def __post_init__(self) -> None:
-        self._estimated_spline_length = self.spline.estimated_length()  # NOTE: compute once to avoid repeated computation
+        # NOTE: compute the offset point of every table sample once to avoid repeated transformations
+        table = self.spline.arc_length_table
+        self._offset_x = table.x + self.offset.x * np.cos(table.yaw) - self.offset.y * np.sin(table.yaw)
+        self._offset_y = table.y + self.offset.x * np.sin(table.yaw) + self.offset.y * np.cos(table.yaw)
 
     @property
     def pose(self) -> Pose:
@@ -216,13 +296,35 @@ class Carrot:
         return self.pose.transform(self.offset)
 
     def move(self, hook: Point, distance: float) -> bool:
-        dt = 0.1 * distance / self._estimated_spline_length
-        while hook.distance(self.offset_point) < distance:
-            self.t += dt
-            if self.t >= 1.0:
-                return False
-        return True
+        """Move the carrot to the first table sample whose offset point is at least `distance` away from the hook.
+
+        The samples are scanned in windows of increasing arc length, which are found with a binary search.
+        """
+        if hook.distance(self.offset_point) >= distance:
+            return True
+        table = self.spline.arc_length_table
+        start = int(np.searchsorted(table.t, self.t, side='right'))
+        window = distance
+        while start < len(table.t):
+            end = int(np.searchsorted(table.s, table.s[start] + window, side='right')) + 1
+            hits = np.flatnonzero(np.hypot(self._offset_x[start:end] - hook.x,
+                                           self._offset_y[start:end] - hook.y) >= distance)
+            if len(hits):
+                self.t = float(table.t[start + hits[0]])
+                return self.t < 1.0
+            start = end
+            window *= 2
+        self.t = 1.0
+        return False
 
     def move_by_foot(self, pose: Pose) -> bool:
-        self.t = self.spline.closest_point(pose.x, pose.y, t_min=self.t, t_max=1.0)
+        table = self.spline.arc_length_table
+        s = table.s_at(self.t)
+        self.t = max(table.closest_point(pose.x, pose.y, s_min=s, s_max=s + self.search_radius), self.t)
         return self.t < 1.0
+
+    def closest_point(self, point: Point) -> float:
+        """Find the spline parameter closest to a point near the carrot."""
+        table = self.spline.arc_length_table
+        s = table.s_at(self.t)
+        return table.closest_point(point.x, point.y, s_min=s - self.search_radius, s_max=s + self.search_radius)
@@ -2,9 +2,12 @@ import logging
 from copy import deepcopy
 from typing import Optional, Protocol
 
+import numpy as np
+
 from .. import rosys
 from ..event import Event
-from ..geometry import Pose, PoseStep, Velocity
+from ..geometry import Pose, Velocity
+from .pose_history import PoseHistory
 
 
 class VelocityProvider(Protocol):
@@ -18,6 +21,7 @@ class Odometer:
     Given the history of previously received velocities, it can update its prediction of the current pose.
 
     The `get_pose` method provides robot poses from the within the last 10 seconds.
+    Use `get_poses` to look up the poses at many timestamps at once.
     """
 
     def __init__(self, wheels: VelocityProvider) -> None:
@@ -31,31 +35,58 @@ class Odometer:
         self.detection: Optional[Pose] = None
         self.current_velocity: Optional[Velocity] = None
         self.last_movement: float = 0
-        self.history: list[Pose] = []
+        self.history = PoseHistory()
         self.odometry_frame: Pose = Pose()
 
         rosys.on_repeat(self.prune_history, 1.0)
 
     def handle_velocities(self, velocities: list[Velocity]) -> None:
-        robot_moved: bool = False
-        for velocity in velocities:
-            if not self.history:
-                self.history.append(Pose(time=velocity.time))
-                continue
-
-            dt = velocity.time - self.history[-1].time
-            step = PoseStep(linear=dt*velocity.linear, angular=dt*velocity.angular, time=velocity.time)
-            self.history.append(self.history[-1] + step)
-
-            if step.linear or step.angular:
-                robot_moved = True
-
-        if self.history:
-            self.prediction = self.odometry_frame.transform_pose(self.history[-1])
-        if velocities:
-            self.current_velocity = velocities[-1]
+        if not velocities:
+            return
+        self.handle_velocity_arrays(np.array([v.time for v in velocities]),
+                                    np.array([v.linear for v in velocities]),
+                                    np.array([v.angular for v in velocities]))
+        self.current_velocity = velocities[-1]
+
+    def handle_velocity_arrays(self, time: np.ndarray, linear: np.ndarray, angular: np.ndarray) -> None:
+        """Integrate a batch of velocity measurements and emit `ROBOT_MOVED` at most once.
+
+        Each velocity is applied from the time of the previous measurement to its own time.
+        The robot is assumed to move along a circular arc during each of these intervals.
+
+        :param time: array of shape (N,) with the timestamps of the measurements
+        :param linear: array of shape (N,) with the linear velocities
+        :param angular: array of shape (N,) with the angular velocities
+        """
+        time = np.asarray(time, dtype=float)
+        linear = np.asarray(linear, dtype=float)
+        angular = np.asarray(angular, dtype=float)
+        if not len(time):
+            return
+        self.current_velocity = Velocity(linear=float(linear[-1]), angular=float(angular[-1]), time=float(time[-1]))
+
+        start = 0
+        if not self.history:
+            self.history.append(Pose(time=float(time[0])))
+            start = 1
+        robot_moved = False
+        if start < len(time):
+            last = self.history[-1]
+            dt = np.diff(time[start:], prepend=last.time)
+            distance = dt * linear[start:]
+            rotation = dt * angular[start:]
+            yaw = last.yaw + np.cumsum(rotation)
+            # NOTE: the chord of an arc has the mean direction of its start and end and is shortened by sinc(rotation / 2)
+            chord = distance * np.sinc(rotation / (2 * np.pi))
+            heading = yaw - rotation / 2
+            x = last.x + np.cumsum(chord * np.cos(heading))
+            y = last.y + np.cumsum(chord * np.sin(heading))
+            self.history.extend(time[start:], x, y, yaw)
+            robot_moved = bool(np.any(distance) or np.any(rotation))
+
+        self.prediction = self.odometry_frame.transform_pose(self.history[-1])
         if robot_moved:
-            self.last_movement = step.time
+            self.last_movement = float(time[-1])
             self.ROBOT_MOVED.emit()
 
     def handle_detection(self, detection: Pose) -> None:
@@ -68,20 +99,36 @@ class Odometer:
             self.prediction = deepcopy(detection)
 
     def prune_history(self, max_age: float = 10.0) -> None:
-        cut_off_time = rosys.time() - max_age
-        while self.history and self.history[0].time <= cut_off_time:
-            del self.history[0]
+        self.history.prune(rosys.time() - max_age)
 
     def get_pose(self, time: float, local: bool = False) -> Pose:
-        for i in range(1, len(self.history)):
-            if self.history[i-1].time <= time < self.history[i].time:
-                f = (time - self.history[i-1].time) / (self.history[i].time - self.history[i-1].time)
-                local_pose = self.history[i-1].interpolate(self.history[i], f)
+        if self.history:
+            x, y, yaw, inside = self.history.interpolate(np.array([time]))
+            if inside[0]:
+                local_pose = Pose(x=float(x[0]), y=float(y[0]), yaw=float(yaw[0]), time=time)
                 return local_pose if local else self.odometry_frame.transform_pose(local_pose)
         if local:
-            return deepcopy(self.history[-1])
+            return self.history[-1]
         return Pose(x=self.prediction.x, y=self.prediction.y, yaw=self.prediction.yaw, time=time)
 
+    def get_poses(self, times: np.ndarray, local: bool = False) -> np.ndarray:
+        """Get the poses at multiple times like `get_pose`.
+
+        :param times: array of shape (N,) with the timestamps
+        :param local: whether to return the poses in the odometry frame instead of the global frame
+        :return: array of shape (N, 3) with x, y and yaw of the poses
+        """
+        times = np.asarray(times, dtype=float)
+        if not self.history and not local:
+            return np.tile([self.prediction.x, self.prediction.y, self.prediction.yaw], (len(times), 1))
+        x, y, yaw, _ = self.history.interpolate(times)
+        if not local:
+            frame = self.odometry_frame
+            x, y, yaw = (frame.x + x * np.cos(frame.yaw) - y * np.sin(frame.yaw),
+                         frame.y + x * np.sin(frame.yaw) + y * np.cos(frame.yaw),
+                         frame.yaw + yaw)
+        return np.column_stack((x, y, yaw))
+
     @staticmethod
     def _compute_odometry_frame(local_pose: Pose, global_pose: Pose) -> Pose:
         frame = Pose.from_matrix(global_pose.matrix @ local_pose.inv_matrix)
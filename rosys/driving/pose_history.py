@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from typing import Iterator, overload
+
+import numpy as np
+
+from ..geometry import Pose
+
+
+class PoseHistory:
+    """A chronological sequence of robot poses stored in preallocated NumPy buffers (time, x, y and yaw).
+
+    It behaves like a list of `Pose` objects (length, indexing, iteration, `append` and `clear`),
+    but many poses can be appended at once with `extend`, pruning old poses only moves the start index
+    and poses at arbitrary times are found with a binary search.
+    New poses are written behind the most recent one; when the end of the buffers is reached,
+    the remaining poses are moved to the front and the buffers are enlarged if they are more than half full.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        if capacity <= 0:
+            raise ValueError('the capacity of a pose history must be positive')
+        self._time = np.zeros(capacity)
+        self._x = np.zeros(capacity)
+        self._y = np.zeros(capacity)
+        self._yaw = np.zeros(capacity)
+        self._start = 0
+        self._end = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._time)
+
+    @property
+    def time(self) -> np.ndarray:
+        """timestamps of all poses (a view into the buffer, which is invalidated by subsequent modifications)"""
+        return self._time[self._start:self._end]
+
+    @property
+    def x(self) -> np.ndarray:
+        return self._x[self._start:self._end]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self._y[self._start:self._end]
+
+    @property
+    def yaw(self) -> np.ndarray:
+        return self._yaw[self._start:self._end]
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @overload
+    def __getitem__(self, index: int) -> Pose: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Pose]: ...
+
+    def __getitem__(self, index: int | slice) -> Pose | list[Pose]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('pose history index out of range')
+        i = self._start + index
+        return Pose(x=float(self._x[i]), y=float(self._y[i]), yaw=float(self._yaw[i]), time=float(self._time[i]))
+
+    def __iter__(self) -> Iterator[Pose]:
+        return (self[i] for i in range(len(self)))
+
+    def _reserve(self, count: int) -> None:
+        """Make sure that `count` more poses can be written behind the most recent one."""
+        if self._end + count <= self.capacity:
+            return
+        length = len(self)
+        capacity = self.capacity
+        while 2 * (length + count) > capacity:
+            capacity *= 2
+        for name in ['_time', '_x', '_y', '_yaw']:
+            buffer = getattr(self, name)
+            new_buffer = buffer if capacity == len(buffer) else np.zeros(capacity)
+            new_buffer[:length] = buffer[self._start:self._end]
+            setattr(self, name, new_buffer)
+        self._start = 0
+        self._end = length
+
+    def append(self, pose: Pose) -> None:
+        self._reserve(1)
+        i = self._end
+        self._time[i], self._x[i], self._y[i], self._yaw[i] = pose.time, pose.x, pose.y, pose.yaw
+        self._end += 1
+
+    def extend(self, time: np.ndarray, x: np.ndarray, y: np.ndarray, yaw: np.ndarray) -> None:
+        """Append multiple poses given as arrays of shape (N,)."""
+        count = len(time)
+        self._reserve(count)
+        i, j = self._end, self._end + count
+        self._time[i:j], self._x[i:j], self._y[i:j], self._yaw[i:j] = time, x, y, yaw
+        self._end = j
+
+    def clear(self) -> None:
+        self._start = 0
+        self._end = 0
+
+    def prune(self, cut_off_time: float) -> None:
+        """Remove all poses with a timestamp up to (and including) the given time."""
+        self._start += int(np.searchsorted(self.time, cut_off_time, side='right'))
+
+    def interpolate(self, times: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Linearly interpolate x, y and yaw at the given times.
+
+        :return: x, y and yaw as well as a mask indicating which times lie between two recorded poses
+            (the values of all other times are those of the most recent pose)
+        """
+        times = np.asarray(times, dtype=float)
+        if not len(self):
+            raise IndexError('the pose history is empty')
+        time = self.time
+        i = np.searchsorted(time, times, side='right')
+        inside = (i > 0) & (i < len(time))
+        i = np.where(inside, i, len(time) - 1)
+        j = np.where(inside, i - 1, len(time) - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f = np.where(inside, (times - time[j]) / (time[i] - time[j]), 0.0)
+        x, y, yaw = self.x, self.y, self.yaw
+        return (
+            (1 - f) * x[j] + f * x[i],
+            (1 - f) * y[j] + f * y[i],
+            (1 - f) * yaw[j] + f * yaw[i],
+            inside,
+        )
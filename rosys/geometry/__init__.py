@@ -8,4 +8,5 @@ from .prism import Prism
 from .rectangle import Rectangle
 from .rotation import Rotation
 from .spline import Spline
+from .spline_array import SplineArray
 from .velocity import Velocity
@@ -1,13 +1,79 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Optional, overload
+from dataclasses import dataclass, field, fields
+from typing import Any, Optional, overload
 
 import numpy as np
+from dataclasses_json import Exclude, config
 
 from .point import Point
 from .pose import Pose
 
+ARC_LENGTH_RESOLUTION = 0.01
+"""approximate arc length (in meters) between two samples of an arc-length table"""
+
+MAX_ARC_LENGTH_SAMPLES = 100_000
+"""upper bound for the number of samples of an arc-length table"""
+
+
+@dataclass(slots=True, kw_only=True)
+class ArcLengthTable:
+    """Samples of a spline at increasing parameters `t` with their arc length `s`, pose and curvature.
+
+    Arc lengths are accumulated along the straight lines between consecutive samples.
+    """
+    t: np.ndarray
+    s: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    yaw: np.ndarray
+    curvature: np.ndarray
+
+    @staticmethod
+    def from_spline(spline: Spline) -> ArcLengthTable:
+        num_samples = int(np.clip(np.ceil(spline.estimated_length() / ARC_LENGTH_RESOLUTION), 10, MAX_ARC_LENGTH_SAMPLES))
+        t = np.linspace(0, 1, num_samples + 1)
+        x = spline.x(t)
+        y = spline.y(t)
+        s = np.concatenate(([0], np.cumsum(np.sqrt(np.diff(x)**2 + np.diff(y)**2))))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            curvature = spline.curvature(t)
+        return ArcLengthTable(t=t, s=s, x=x, y=y, yaw=spline.yaw(t), curvature=curvature)
+
+    @property
+    def length(self) -> float:
+        return float(self.s[-1])
+
+    def t_at(self, s: float) -> float:
+        """Interpolate the parameter at a given arc length (clipped to the spline)."""
+        return float(np.interp(s, self.s, self.t))
+
+    def s_at(self, t: float) -> float:
+        """Interpolate the arc length at a given parameter (clipped to the spline)."""
+        return float(np.interp(t, self.t, self.s))
+
+    def closest_point(self, x: float, y: float, s_min: float = 0.0, s_max: float = np.inf) -> float:
+        """Find the parameter of the point closest to (x, y) with an arc length between `s_min` and `s_max`.
+
+        Only the samples within this window are considered, which are found with a binary search.
+        The closest sample is refined by projecting the point onto the lines to its neighbors.
+        """
+        i0 = max(int(np.searchsorted(self.s, s_min, side='left')) - 1, 0)
+        i1 = min(int(np.searchsorted(self.s, s_max, side='right')) + 1, len(self.s))
+        i = i0 + int(np.argmin((self.x[i0:i1] - x)**2 + (self.y[i0:i1] - y)**2))
+        best_t = float(self.t[i])
+        best_distance = (self.x[i] - x)**2 + (self.y[i] - y)**2
+        for a, b in [(i - 1, i), (i, i + 1)]:
+            if a < i0 or b >= i1:
+                continue
+            dx, dy = self.x[b] - self.x[a], self.y[b] - self.y[a]
+            u = np.clip(((x - self.x[a]) * dx + (y - self.y[a]) * dy) / max(dx**2 + dy**2, 1e-12), 0.0, 1.0)
+            distance = (self.x[a] + u * dx - x)**2 + (self.y[a] + u * dy - y)**2
+            if distance < best_distance:
+                best_t = float(self.t[a] + u * (self.t[b] - self.t[a])) if u < 1 else float(self.t[b])
+                best_distance = distance
+        return best_t
+
 
 @dataclass(slots=True, kw_only=True)
 class Spline:
@@ -32,6 +98,9 @@ class Spline:
     q: float = 0
     r: float = 0
 
+    _arc_length_table: Optional[ArcLengthTable] = \
+        field(default=None, init=False, repr=False, compare=False, metadata=config(exclude=Exclude.ALWAYS))
+
     def __post_init__(self) -> None:
         self.a = self.start.x
         self.e = self.start.y
@@ -57,6 +126,22 @@ class Spline:
             f'{self.end.x:.3f},{self.end.y:.3f}',
         ]) + ')'
 
+    def __getstate__(self) -> dict[str, Any]:
+        # NOTE: the arc-length table is a cache of up to several megabytes, so it is neither pickled nor copied
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != '_arc_length_table'}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._arc_length_table = None
+
+    @property
+    def arc_length_table(self) -> ArcLengthTable:
+        """lookup table between parameter and arc length, which is created on first access"""
+        if self._arc_length_table is None:
+            self._arc_length_table = ArcLengthTable.from_spline(self)
+        return self._arc_length_table
+
     @staticmethod
     def from_poses(start: Pose, end: Pose, *, control_dist: Optional[float] = None, backward: bool = False) -> Spline:
         """Generate a spline from two poses.
@@ -163,26 +248,7 @@ class Spline:
         return (x_ * y__ - y_ * x__) / (x_**2 + y_**2)**(3/2)
 
     def max_curvature(self, t_min: float = 0.0, t_max: float = 1.0) -> float:
-        poly = [
-            (1296 * self.m * self.p ** 2 + 1296 * self.m ** 3) * self.q - 1296 * self.n * self.p ** 3 - 1296 * self.m ** 2 *
-            self.n * self.p, (1620 * self.m * self.p ** 2 + 1620 * self.m ** 3) *
-            self.r + 3240 * self.m * self.p * self.q
-            ** 2 + (3240 * self.m ** 2 * self.n - 3240 * self.n * self.p ** 2) * self.q - 1620 * self.o * self.p ** 3 +
-            ((-1620 * self.m ** 2 * self.o) - 3240 * self.m * self.n ** 2) * self.p,
-            (5184 * self.m * self.p * self.q + 1296 * self.n * self.p ** 2 + 6480 * self.m ** 2 * self.n) * self.r + 1296 *
-            self.m * self.q ** 3 - 1296 * self.n * self.p * self.q ** 2 +
-            ((-6480 * self.o * self.p ** 2) - 1296 * self.m ** 2 * self.o + 1296 * self.m * self.n ** 2) * self.q +
-            ((-5184 * self.m * self.n * self.o) - 1296 * self.n ** 3) * self.p, 1296 * self.m * self.p * self.r ** 2 +
-            (1944 * self.m * self.q ** 2 + 6480 * self.n * self.p * self.q - 1296 * self.o * self.p ** 2 + 1296 * self.m **
-             2 * self.o + 8424 * self.m * self.n ** 2) * self.r - 8424 * self.o * self.p * self.q ** 2 - 6480 * self.m *
-            self.n * self.o * self.q + ((-1296 * self.m * self.o ** 2) - 1944 * self.n ** 2 * self.o) * self.p, 2592 *
-            self.n * self.p * self.r ** 2 +
-            (3888 * self.n * self.q ** 2 - 2592 * self.o * self.p * self.q + 2592 * self.m * self.n * self.o + 3888 * self.
-             n ** 3) * self.r - 3888 * self.o * self.q ** 3 +
-            ((-2592 * self.m * self.o ** 2) - 3888 * self.n ** 2 * self.o) * self.q, -324 * self.m * self.r ** 3 +
-            (1944 * self.n * self.q + 324 * self.o * self.p) * self.r ** 2 +
-            ((-1944 * self.o * self.q ** 2) - 324 * self.m * self.o ** 2 + 1944 * self.n ** 2 * self.o) * self.r - 1944 *
-            self.n * self.o ** 2 * self.q + 324 * self.o ** 3 * self.p, ]
+        poly = _curvature_polynomial(self.m, self.n, self.o, self.p, self.q, self.r)
         roots = np.roots(poly)
         t = np.array([t0 for t0 in roots if np.isreal(t0) and t_min < t0 < t_max] + [t_min, t_max])
 
@@ -238,3 +304,24 @@ class Spline:
         dx = np.diff([self.x(t) for t in np.linspace(0, 1, steps)])
         dy = np.diff([self.y(t) for t in np.linspace(0, 1, steps)])
         return np.sum(np.sqrt(dx**2 + dy**2))
+
+
+def _curvature_polynomial(m, n, o, p, q, r) -> list:
+    """Get the coefficients of the polynomial whose roots are the extrema of the curvature.
+
+    The derivative coefficients `m` to `r` can be floats or arrays.
+    """
+    return [
+        (1296 * m * p ** 2 + 1296 * m ** 3) * q - 1296 * n * p ** 3 - 1296 * m ** 2 * n * p,
+        (1620 * m * p ** 2 + 1620 * m ** 3) * r + 3240 * m * p * q ** 2 + (3240 * m ** 2 * n - 3240 * n * p ** 2) * q -
+        1620 * o * p ** 3 + ((-1620 * m ** 2 * o) - 3240 * m * n ** 2) * p,
+        (5184 * m * p * q + 1296 * n * p ** 2 + 6480 * m ** 2 * n) * r + 1296 * m * q ** 3 - 1296 * n * p * q ** 2 +
+        ((-6480 * o * p ** 2) - 1296 * m ** 2 * o + 1296 * m * n ** 2) * q + ((-5184 * m * n * o) - 1296 * n ** 3) * p,
+        1296 * m * p * r ** 2 +
+        (1944 * m * q ** 2 + 6480 * n * p * q - 1296 * o * p ** 2 + 1296 * m ** 2 * o + 8424 * m * n ** 2) * r -
+        8424 * o * p * q ** 2 - 6480 * m * n * o * q + ((-1296 * m * o ** 2) - 1944 * n ** 2 * o) * p,
+        2592 * n * p * r ** 2 + (3888 * n * q ** 2 - 2592 * o * p * q + 2592 * m * n * o + 3888 * n ** 3) * r -
+        3888 * o * q ** 3 + ((-2592 * m * o ** 2) - 3888 * n ** 2 * o) * q,
+        -324 * m * r ** 3 + (1944 * n * q + 324 * o * p) * r ** 2 +
+        ((-1944 * o * q ** 2) - 324 * m * o ** 2 + 1944 * n ** 2 * o) * r - 1944 * n * o ** 2 * q + 324 * o ** 3 * p,
+    ]
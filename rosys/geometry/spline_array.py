@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Optional, overload
+
+import numpy as np
+
+from .point import Point
+from .spline import Spline, _curvature_polynomial
+
+
+@dataclass(slots=True, kw_only=True)
+class SplineArray:
+    """Multiple cubic Bézier splines stored as arrays for vectorized evaluation.
+
+    The control points are stored as an array of shape (N, 4, 2) with start, first control, second control and end point.
+    The coefficients `a` to `r` correspond to those of `Spline` with one entry per spline.
+    All evaluation methods accept a parameter `t` with one value per spline (shape (N,))
+    or multiple values per spline (shape (N, K)).
+    """
+    points: np.ndarray
+
+    a: np.ndarray = field(init=False)
+    b: np.ndarray = field(init=False)
+    c: np.ndarray = field(init=False)
+    d: np.ndarray = field(init=False)
+    e: np.ndarray = field(init=False)
+    f: np.ndarray = field(init=False)
+    g: np.ndarray = field(init=False)
+    h: np.ndarray = field(init=False)
+
+    m: np.ndarray = field(init=False)
+    n: np.ndarray = field(init=False)
+    o: np.ndarray = field(init=False)
+    p: np.ndarray = field(init=False)
+    q: np.ndarray = field(init=False)
+    r: np.ndarray = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.points = np.asarray(self.points, dtype=float).reshape(-1, 4, 2)
+        self.a, self.b, self.c, self.d = self.points[:, :, 0].T
+        self.e, self.f, self.g, self.h = self.points[:, :, 1].T
+
+        self.m = self.d - 3 * self.c + 3 * self.b - self.a
+        self.n = self.c - 2 * self.b + self.a
+        self.o = self.b - self.a
+        self.p = self.h - 3 * self.g + 3 * self.f - self.e
+        self.q = self.g - 2 * self.f + self.e
+        self.r = self.f - self.e
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    @overload
+    def __getitem__(self, index: int | np.integer) -> Spline: ...
+
+    @overload
+    def __getitem__(self, index: slice | np.ndarray) -> SplineArray: ...
+
+    def __getitem__(self, index: int | np.integer | slice | np.ndarray) -> Spline | SplineArray:
+        """Get a single spline or a subset of splines (selected by a slice, an index array or a mask)."""
+        if not isinstance(index, (int, np.integer)):
+            return SplineArray(points=self.points[index])
+        start, control1, control2, end = (Point(x=x, y=y) for x, y in self.points[index].tolist())
+        return Spline(start=start, control1=control1, control2=control2, end=end)
+
+    def to_splines(self) -> list[Spline]:
+        return [self[i] for i in range(len(self))]
+
+    @staticmethod
+    def from_splines(splines: list[Spline]) -> SplineArray:
+        return SplineArray(points=np.array([[s.start.x, s.start.y, s.control1.x, s.control1.y,
+                                             s.control2.x, s.control2.y, s.end.x, s.end.y] for s in splines]))
+
+    @staticmethod
+    def from_poses(start_poses: np.ndarray,
+                   end_poses: np.ndarray,
+                   *,
+                   control_dist: Optional[float | np.ndarray] = None,
+                   backward: bool | np.ndarray = False) -> SplineArray:
+        """Generate splines between pairs of poses like `Spline.from_poses`.
+
+        :param start_poses: array of shape (N, 3) with x, y and yaw of the start poses
+        :param end_poses: array of shape (N, 3) with x, y and yaw of the end poses
+        :param control_dist: the distance of the control points from the start and end points (default: half the distance between start and end)
+        :param backward: whether the splines should move backwards (a single flag or one per spline)
+        """
+        start_poses = np.asarray(start_poses, dtype=float).reshape(-1, 3)
+        end_poses = np.asarray(end_poses, dtype=float).reshape(-1, 3)
+        if control_dist is None:
+            control_dist = np.sqrt((end_poses[:, 0] - start_poses[:, 0])**2 + (end_poses[:, 1] - start_poses[:, 1])**2)
+        distance = 0.5 * control_dist * np.where(backward, -1, 1)
+        start_direction = np.column_stack((np.cos(start_poses[:, 2]), np.sin(start_poses[:, 2])))
+        end_direction = np.column_stack((np.cos(end_poses[:, 2]), np.sin(end_poses[:, 2])))
+        distance = np.broadcast_to(distance, (len(start_poses),))[:, np.newaxis]
+        return SplineArray(points=np.stack((start_poses[:, :2],
+                                            start_poses[:, :2] + distance * start_direction,
+                                            end_poses[:, :2] - distance * end_direction,
+                                            end_poses[:, :2]), axis=1))
+
+    def _expand(self, t: np.ndarray, *coefficients: np.ndarray) -> list[np.ndarray]:
+        """Reshape coefficients so that they broadcast with a parameter of shape (N,) or (N, K)."""
+        shape = (len(self),) + (1,) * (np.ndim(t) - 1)
+        return [coefficient.reshape(shape) for coefficient in coefficients]
+
+    def x(self, t: np.ndarray) -> np.ndarray:
+        a, b, c, d = self._expand(t, self.a, self.b, self.c, self.d)
+        return t**3 * d + 3 * t**2 * (1 - t) * c + 3 * t * (1 - t)**2 * b + (1 - t)**3 * a
+
+    def y(self, t: np.ndarray) -> np.ndarray:
+        e, f, g, h = self._expand(t, self.e, self.f, self.g, self.h)
+        return t**3 * h + 3 * t**2 * (1 - t) * g + 3 * t * (1 - t)**2 * f + (1 - t)**3 * e
+
+    def gx(self, t: np.ndarray) -> np.ndarray:
+        m, n, o = self._expand(t, self.m, self.n, self.o)
+        return 3 * (m * t**2 + 2 * n * t + o)
+
+    def ggx(self, t: np.ndarray) -> np.ndarray:
+        m, n = self._expand(t, self.m, self.n)
+        return 6 * (m * t + n)
+
+    def gy(self, t: np.ndarray) -> np.ndarray:
+        p, q, r = self._expand(t, self.p, self.q, self.r)
+        return 3 * (p * t**2 + 2 * q * t + r)
+
+    def ggy(self, t: np.ndarray) -> np.ndarray:
+        p, q = self._expand(t, self.p, self.q)
+        return 6 * (p * t + q)
+
+    def yaw(self, t: np.ndarray) -> np.ndarray:
+        return np.arctan2(self.gy(t), self.gx(t))
+
+    def curvature(self, t: np.ndarray) -> np.ndarray:
+        x_ = self.gx(t)
+        y_ = self.gy(t)
+        x__ = self.ggx(t)
+        y__ = self.ggy(t)
+        return (x_ * y__ - y_ * x__) / (x_**2 + y_**2)**(3/2)
+
+    def max_curvature(self, t_min: float = 0.0, t_max: float = 1.0) -> np.ndarray:
+        """Get the signed curvature with the largest magnitude of each spline like `Spline.max_curvature`.
+
+        Instead of calling `np.roots` for each spline, the roots of all curvature polynomials are computed
+        as eigenvalues of their companion matrices in a single batch per polynomial degree.
+        """
+        roots = _find_roots(np.column_stack(_curvature_polynomial(self.m, self.n, self.o, self.p, self.q, self.r)))
+        valid = (roots.imag == 0) & (t_min < roots.real) & (roots.real < t_max)
+        t = np.column_stack((np.where(valid, roots.real, t_min), np.full(len(self), t_min), np.full(len(self), t_max)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            k = self.curvature(t)
+        k[:, :-2][~valid] = 0
+        return k[np.arange(len(self)), np.argmax(np.abs(k), axis=1)]
+
+    def estimated_length(self, steps: int = 10) -> np.ndarray:
+        t = np.broadcast_to(np.linspace(0, 1, steps), (len(self), steps))
+        return np.sum(np.sqrt(np.diff(self.x(t), axis=1)**2 + np.diff(self.y(t), axis=1)**2), axis=1)
+
+
+def _find_roots(polynomials: np.ndarray) -> np.ndarray:
+    """Find the complex roots of multiple polynomials (rows of coefficients with the highest degree first).
+
+    Leading zeros are stripped like in `np.roots`, so each row can have a different degree.
+    Missing roots are filled with NaN.
+    """
+    num_polynomials, num_coefficients = polynomials.shape
+    roots = np.full((num_polynomials, num_coefficients - 1), np.nan, dtype=complex)
+    nonzero = polynomials != 0
+    leading = np.where(nonzero.any(axis=1), np.argmax(nonzero, axis=1), num_coefficients - 1)
+    for degree in range(1, num_coefficients):
+        rows = np.flatnonzero(leading == num_coefficients - 1 - degree)
+        if not len(rows):
+            continue
+        coefficients = polynomials[rows, num_coefficients - 1 - degree:]
+        companion = np.zeros((len(rows), degree, degree))
+        companion[:, 0, :] = -coefficients[:, 1:] / coefficients[:, :1]
+        companion[:, np.arange(1, degree), np.arange(degree - 1)] = 1
+        roots[rows, :degree] = np.linalg.eigvals(companion)
+    return roots
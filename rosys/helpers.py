@@ -6,7 +6,7 @@ import os
 import sys
 import time
 from contextlib import contextmanager
-from typing import Any, Awaitable, Callable, Generator, Optional
+from typing import Any, Awaitable, Callable, Generator, Optional, overload
 
 import numpy as np
 from nicegui import app
@@ -30,7 +30,19 @@ def measure(*, reset: bool = False, ms: bool = False) -> None:
     globals()['t'] = time.perf_counter()
 
 
-def angle(yaw0: float, yaw1: float) -> float:
+@overload
+def angle(yaw0: float, yaw1: float) -> float: ...
+
+
+@overload
+def angle(yaw0: np.ndarray, yaw1: float | np.ndarray) -> np.ndarray: ...
+
+
+@overload
+def angle(yaw0: float, yaw1: np.ndarray) -> np.ndarray: ...
+
+
+def angle(yaw0: float | np.ndarray, yaw1: float | np.ndarray) -> float | np.ndarray:
     return eliminate_2pi(yaw1 - yaw0)
 
 
@@ -38,7 +50,15 @@ def eliminate_pi(angle_: float) -> float:
     return (angle_ + np.pi / 2) % np.pi - np.pi / 2
 
 
-def eliminate_2pi(angle_: float) -> float:
+@overload
+def eliminate_2pi(angle_: float) -> float: ...
+
+
+@overload
+def eliminate_2pi(angle_: np.ndarray) -> np.ndarray: ...
+
+
+def eliminate_2pi(angle_: float | np.ndarray) -> float | np.ndarray:
     return (angle_ + np.pi) % (2 * np.pi) - np.pi
 
 
@@ -1,6 +1,7 @@
 from .area import Area
 from .area_manipulation import AreaManipulation, AreaManipulationMode
 from .area_object_ import AreaObject as area_object
+from .delaunay_planner import PlannerParameters
 from .obstacle import Obstacle
 from .obstacle_object_ import ObstacleObject as obstacle_object
 from .path_object_ import PathObject as path_object
@@ -1,14 +1,17 @@
 import numpy as np
 from matplotlib.path import Path
 
+BACKENDS = ('scanline', 'matplotlib')
+"""polygon rasterizers; "matplotlib" tests each pixel with `Path.contains_points` and serves as reference"""
+
 
 class BinaryRenderer:
 
-    def __init__(self, size, fill_value: bool = False) -> None:
+    def __init__(self, size, fill_value: bool = False, *, backend: str = 'scanline') -> None:
+        if backend not in BACKENDS:
+            raise ValueError(f'unsupported rasterizer backend "{backend}"')
         self.map = np.full(size, fill_value=fill_value, dtype=bool)
-
-        self.xx, self.yy = np.meshgrid(range(size[1]), range(size[0]))
-        self.xy = np.vstack((self.xx.flatten(), self.yy.flatten())).T
+        self.backend = backend
 
     def circle(self, x, y, radius, value=True) -> None:
         x0 = max(int(x - radius), 0)
@@ -16,9 +19,8 @@ class BinaryRenderer:
         x1 = min(int(x + radius) + 2, self.map.shape[1] - 1)
         y1 = min(int(y + radius) + 2, self.map.shape[0] - 1)
         roi = self.map[y0:y1, x0:x1]
-        sqr_dist = (self.xx[y0:y1, x0:x1] - x)**2 + (self.yy[y0:y1, x0:x1] - y)**2
+        sqr_dist = (np.arange(x0, x1)[np.newaxis, :] - x)**2 + (np.arange(y0, y1)[:, np.newaxis] - y)**2
         roi[sqr_dist <= radius**2] = value
-        self.map[y0:y1, x0:x1] = roi
 
     def polygon(self, points, value=True) -> None:
         if len(points) == 0:
@@ -27,7 +29,45 @@ class BinaryRenderer:
         y0 = max(int(points[:, 1].min()), 0)
         x1 = min(int(points[:, 0].max()) + 2, self.map.shape[1] - 1)
         y1 = min(int(points[:, 1].max()) + 2, self.map.shape[0] - 1)
-        xy = np.vstack((self.xx[y0:y1, x0:x1].flatten(), self.yy[y0:y1, x0:x1].flatten())).T
+        if x1 <= x0 or y1 <= y0:
+            return
         roi = self.map[y0:y1, x0:x1]
-        roi[Path(points).contains_points(xy).reshape(roi.shape)] = value
-        self.map[y0:y1, x0:x1] = roi
+        if self.backend == 'matplotlib':
+            xx, yy = np.meshgrid(range(x0, x1), range(y0, y1))
+            roi[Path(points).contains_points(np.vstack((xx.flatten(), yy.flatten())).T).reshape(roi.shape)] = value
+        elif len(points) >= 3:  # NOTE: like in matplotlib, single points and lines do not cover any pixels
+            roi[_scanline_fill(np.asarray(points, dtype=float), x0, x1, y0, y1)] = value
+
+
+def _scanline_fill(points: np.ndarray, x0: int, x1: int, y0: int, y1: int) -> np.ndarray:
+    """Determine which pixel centers within [x0, x1) x [y0, y1) lie inside the polygon (even-odd rule).
+
+    For each row only the crossings with the polygon edges are computed.
+    Pixels on an edge are decided exactly like matplotlib's `Path.contains_points`:
+    an edge crosses row `y` if exactly one of its end points has a y-coordinate >= `y`
+    and toggles all pixels left of the crossing (including the crossing itself for upward edges).
+    """
+    xa, ya = points[:, 0], points[:, 1]
+    xb, yb = np.roll(xa, -1), np.roll(ya, -1)
+
+    # NOTE: rows y with min(ya, yb) < y <= max(ya, yb) are crossed by an edge
+    first_rows = np.maximum(np.floor(np.minimum(ya, yb)).astype(int) + 1, y0)
+    last_rows = np.minimum(np.floor(np.maximum(ya, yb)).astype(int), y1 - 1)
+    counts = np.maximum(last_rows - first_rows + 1, 0)
+    edges = np.repeat(np.arange(len(points)), counts)
+    rows = np.arange(len(edges)) - np.repeat(np.cumsum(counts) - counts, counts) + first_rows[edges]
+    xa, ya, xb, yb = xa[edges], ya[edges], xb[edges], yb[edges]
+    upward = yb >= rows
+
+    def toggles(x: np.ndarray) -> np.ndarray:
+        return ((yb - rows) * (xa - xb) >= (xb - x) * (ya - yb)) == upward
+
+    # NOTE: the last toggled pixel is next to the intersection; rounding errors are corrected with the exact test
+    last_cols = np.floor(xa + (rows - ya) * (xb - xa) / (yb - ya)).astype(int)
+    last_cols += toggles(last_cols + 1)
+    last_cols -= ~toggles(last_cols)
+
+    # NOTE: a pixel is inside if it is toggled by an odd number of crossings right of it
+    parity = np.zeros((y1 - y0, x1 - x0 + 1), dtype=np.uint8)
+    np.bitwise_xor.at(parity, (rows - y0, np.clip(last_cols - x0 + 1, 0, x1 - x0)), 1)
+    return np.bitwise_xor.accumulate(parity[:, ::-1], axis=1)[:, -2::-1].view(bool)
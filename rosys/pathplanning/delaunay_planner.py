@@ -1,7 +1,9 @@
+from __future__ import annotations
+
 import itertools
 import logging
-from dataclasses import dataclass
-from functools import lru_cache
+import time
+from dataclasses import dataclass, replace
 from typing import Optional
 
 import networkx as nx
@@ -9,18 +11,44 @@ import numpy as np
 from scipy import ndimage, spatial
 
 from ..driving import PathSegment
-from ..geometry import Point, Pose, PoseStep, Spline
+from ..geometry import Point, Pose, PoseStep, Spline, SplineArray
 from ..helpers import angle
 from .area import Area
 from .delaunay_pose_group import DelaunayPoseGroup
-from .fast_spline import FastSpline
+from .distance_map import DistanceMap
 from .grid import Grid
 from .obstacle import Obstacle
-from .obstacle_map import ObstacleMap
+from .obstacle_map import BaseObstacleMap, ObstacleMap, PixelRect
+from .sparse_graph import BACKWARD_PENALTY, SparseGraph
+from .tiled_obstacle_map import TiledObstacleMap
 
 GRID_RESOLUTION = 1.0
 MIN_MARGIN = 1.0
 
+GEODESIC_SCALE = np.cos(np.pi / 8)
+"""Factor compensating that distances along 8-connected pixels are up to 8% longer than the shortest path."""
+
+COARSE_GRID_SPACING = 8
+"""Largest lattice spacing (in multiples of `GRID_RESOLUTION`) in open space when using hierarchical search."""
+
+CORRIDOR_WIDTH = 3.0
+"""Distance from the coarse path (in meters) within which the fine lattice is used to refine it."""
+
+EDGE_CHUNK_SIZE = 10_000
+"""Number of edge candidates which are sampled and tested for collisions at once when creating the graph."""
+
+EDGE_KEY_BITS = 21
+"""Number of bits per point index in the keys of edge candidates, which limits the graph to about two million points."""
+
+GROWTH_FACTOR = 0.5
+"""Minimum growth of each enlarged side of the grid relative to its extent, so that repeated growth has amortized costs."""
+
+MAX_INCREMENTAL_UPDATE_SIZE = 0.25
+"""Maximum fraction of the grid which is updated incrementally when areas or obstacles change.
+
+Larger changes cause a complete regeneration of the obstacle map and the graph.
+"""
+
 TRY_SINGLE_PATH = True
 """Try to find a collision-free simple path between start and goal.
 
@@ -31,144 +59,455 @@ TRY_SINGLE_SHUNTING = True
 """Try to find collision-free path with minimal switching (single shunting)."""
 
 
+@dataclass(slots=True, kw_only=True)
+class PlannerParameters:
+    cache_obstacle_maps: bool = False
+    """store obstacle maps on disk and memory-map them when planning in the same world again (e.g. after a restart)
+
+    Each entry holds about `pixels * (1 + layers * (1 + distance bytes))` bytes
+    (e.g. 325 MB for a 100 m x 100 m map with 36 layers and float64 distances)
+    and up to `obstacle_map.MAX_CACHE_ENTRIES` entries are kept in `obstacle_map.CACHE_PATH`.
+    """
+    distance_dtype: str = 'float64'
+    """data type for storing obstacle distances (float64, float32, float16 or uint16 in centimeters)"""
+    max_distance: float = np.inf
+    """obstacle distances are saturated at this value (in meters)"""
+    num_threads: int = 1
+    """number of threads for creating the yaw layers of obstacle maps in parallel"""
+    graph_backend: str = 'networkx'
+    """graph used for shortest path searches ("networkx" or "scipy" for a sparse CSR graph, which is faster to build and search)"""
+    hierarchical_search: bool = False
+    """search on a coarse lattice in open space first and refine the path on the fine lattice within a corridor around it"""
+    search_algorithm: str = 'dijkstra'
+    """shortest path algorithm ("dijkstra" or "astar", which stops at the first reached exit and needs the "scipy" graph backend)"""
+    heuristic: str = 'euclidean'
+    """A* heuristic ("euclidean" or "geodesic" for the obstacle-aware distance to the goal, which needs a distance map per goal)"""
+    anytime_search: bool = False
+    """stop improving the path shortly before the deadline of a search command and return the best path found so far"""
+    search_cache_size: int = 16
+    """number of search results the planner process keeps for repeated searches on the same map (0 to disable)"""
+    search_cache_tolerance: float = 0.05
+    """start and goal positions (in meters) and yaws (in radians) are quantized with this step to look up cached results"""
+    tile_size: Optional[float] = None
+    """use a tiled obstacle map with tiles of this size (in meters) allocated only around areas, obstacles and points
+    (needs a finite `max_distance`, does not support the geodesic heuristic and is not cached on disk)"""
+
+
 class DelaunayPlanner:
 
-    def __init__(self, robot_outline: list[tuple[float, float]]) -> None:
+    def __init__(self, robot_outline: list[tuple[float, float]], parameters: Optional[PlannerParameters] = None) -> None:
         self.robot_outline = robot_outline
+        self.parameters = parameters or PlannerParameters()
+        if self.parameters.graph_backend not in ('networkx', 'scipy'):
+            raise ValueError(f'unsupported graph backend "{self.parameters.graph_backend}"')
+        if self.parameters.search_algorithm not in ('dijkstra', 'astar'):
+            raise ValueError(f'unsupported search algorithm "{self.parameters.search_algorithm}"')
+        if self.parameters.search_algorithm == 'astar' and self.parameters.graph_backend != 'scipy':
+            raise ValueError('A* search needs the "scipy" graph backend')
+        if self.parameters.heuristic not in ('euclidean', 'geodesic'):
+            raise ValueError(f'unsupported heuristic "{self.parameters.heuristic}"')
+        if self.parameters.tile_size is not None:
+            if not np.isfinite(self.parameters.max_distance):
+                raise ValueError('tiled obstacle maps need a finite maximum distance')
+            if self.parameters.heuristic == 'geodesic':
+                raise ValueError('the geodesic heuristic needs a dense obstacle map')
         self.areas: list[Area] = []
         self.obstacles: list[Obstacle] = []
-        self.obstacle_map: Optional[ObstacleMap] = None
+        self.obstacle_map: Optional[BaseObstacleMap] = None
+        self.map_version = 0
+        """incremented whenever the obstacle map or the graph changes"""
+        self.distance_map: Optional[DistanceMap] = None
+        self.distance_map_key: Optional[tuple[int, float, float]] = None
         self.tri_points: Optional[np.ndarray] = None
+        self.fine_points: Optional[np.ndarray] = None
+        self.lattice_origin: tuple[float, float] = (0.0, 0.0)
+        self.fine_planner: Optional[DelaunayPlanner] = None
         self.tri_mesh: Optional[spatial.Delaunay] = None
         self.pose_groups: Optional[list[DelaunayPoseGroup]] = None
         self.graph: Optional[nx.DiGraph] = None
+        self.sparse_graph: Optional[SparseGraph] = None
+        self.pose_array: np.ndarray = np.zeros((0, 3))
+        self.pose_offsets: np.ndarray = np.zeros(1, dtype=int)
+        self.edge_candidates: np.ndarray = np.zeros((0, 2), dtype=int)
+        self.edge_candidate_keys: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.edge_candidate_bboxes: np.ndarray = np.zeros((0, 4))
+        self.edge_candidate_blocked: np.ndarray = np.zeros(0, dtype=bool)
+        self.edge_candidate_lengths: np.ndarray = np.zeros(0)
         self.log = logging.getLogger('rosys.delaunay_planner')
 
     def update_map(self, areas: list[Area], obstacles: list[Obstacle], additional_points: list[Point],
                    deadline: float) -> None:
         if self.obstacle_map and \
-                self.areas == areas and \
-                self.obstacles == obstacles and \
                 all(self.obstacle_map.grid.contains(point, padding=1.0) for point in additional_points):
+            if self.areas == areas and self.obstacles == obstacles:
+                return
+            if self._update_incrementally(areas, obstacles, deadline):
+                self.map_version += 1
+                return
+        elif self.obstacle_map and self.areas == areas and self.obstacles == obstacles:
+            self._grow(additional_points, deadline)
             return
         self.areas = areas
         self.obstacles = obstacles
         self._create_obstacle_map(additional_points, deadline)
         self._create_graph()
+        self.map_version += 1
 
     def grow_map(self, points: list[Point], deadline: float) -> None:
         if self.obstacle_map is not None and \
                 all(self.obstacle_map.grid.contains(point, padding=1.0) for point in points):
             return
         if self.obstacle_map is not None:
-            bbox = self.obstacle_map.grid.bbox
-            points.append(Point(x=bbox[0],         y=bbox[1]))
-            points.append(Point(x=bbox[0]+bbox[2], y=bbox[1]))
-            points.append(Point(x=bbox[0],         y=bbox[1]+bbox[3]))
-            points.append(Point(x=bbox[0]+bbox[2], y=bbox[1]+bbox[3]))
+            self._grow(points, deadline)
+            return
         self._create_obstacle_map(points, deadline)
         self._create_graph()
+        self.map_version += 1
+
+    def _grow(self, points: list[Point], deadline: float) -> None:
+        """Enlarge the obstacle map in place to contain the given points and extend the graph accordingly."""
+        assert self.obstacle_map is not None
+        old_bbox = self.obstacle_map.grid.bbox
+        if isinstance(self.obstacle_map, TiledObstacleMap):
+            # NOTE: new tiles look like unallocated ones, so only the lattice outside of the old bounding box changes
+            self.obstacle_map.add_points(points, deadline)
+            self._extend_graph(old_bbox, [])
+        else:
+            assert isinstance(self.obstacle_map, ObstacleMap)
+            rects = self.obstacle_map.grow(self.areas, self.obstacles, _find_growth(self.obstacle_map.grid, points),
+                                           deadline)
+            self._extend_graph(old_bbox, rects)
+        self.map_version += 1
 
     def _create_obstacle_map(self, additional_points: list[Point], deadline: float) -> None:
         points = [p for obstacle in self.obstacles for p in obstacle.outline]
         points += [p for area in self.areas for p in area.outline]
         points += additional_points
+        if self.parameters.tile_size is not None:
+            self.obstacle_map = TiledObstacleMap(self.robot_outline, self.areas, self.obstacles, 0.1, 36, deadline,
+                                                 additional_points=additional_points,
+                                                 point_padding=1.0,
+                                                 tile_size=self.parameters.tile_size,
+                                                 distance_dtype=self.parameters.distance_dtype,
+                                                 max_distance=self.parameters.max_distance)
+            self.lattice_origin = self.obstacle_map.grid.bbox[0], self.obstacle_map.grid.bbox[1]
+            return
         grid = Grid.from_points(points, pixel_size=0.1, num_layers=36, padding=1.0)
-        self.obstacle_map = ObstacleMap.from_world(self.robot_outline, self.areas, self.obstacles, grid, deadline)
-
-    def _create_graph(self) -> None:
+        self.lattice_origin = grid.bbox[0], grid.bbox[1]
+        self.obstacle_map = ObstacleMap.from_world(self.robot_outline, self.areas, self.obstacles, grid, deadline,
+                                                   distance_dtype=self.parameters.distance_dtype,
+                                                   max_distance=self.parameters.max_distance,
+                                                   num_threads=self.parameters.num_threads,
+                                                   use_cache=self.parameters.cache_obstacle_maps)
+
+    def _update_incrementally(self, areas: list[Area], obstacles: list[Obstacle], deadline: float) -> bool:
+        assert self.obstacle_map is not None
+        if any(len(a.outline) > 2 for a in areas) != any(len(a.outline) > 2 for a in self.areas):
+            return False
+        changed = _find_changed_outlines(self.areas, areas) + _find_changed_outlines(self.obstacles, obstacles)
+        grid = self.obstacle_map.grid
+        if not all(grid.contains(point, padding=1.0) for outline in changed for point in outline):
+            return False
+        regions = [_bbox(outline) for outline in changed]
+        changed_size = sum(w * h for _, _, w, h in regions)
+        if changed_size > MAX_INCREMENTAL_UPDATE_SIZE * grid.bbox[2] * grid.bbox[3]:
+            return False
+        self.areas = areas
+        self.obstacles = obstacles
+        if isinstance(self.obstacle_map, TiledObstacleMap):
+            rects = self.obstacle_map.update(areas, obstacles, regions, deadline)
+            if self.obstacle_map.grid.bbox != grid.bbox:
+                # NOTE: the lattice depends on the bounding box of the tiles, which changed with the required tiles
+                self._create_graph()
+                return True
+        else:
+            assert isinstance(self.obstacle_map, ObstacleMap)
+            rects = self.obstacle_map.update(areas, obstacles, regions, deadline)
+        self._update_graph(rects)
+        return True
+
+    def _lattice_range(self, bbox: tuple[float, float, float, float]) -> tuple[int, int, int, int]:
+        """Get the range of lattice rows and columns (with exclusive upper bounds) within a bounding box."""
+        origin_x, origin_y = self.lattice_origin
+        row_spacing = GRID_RESOLUTION * np.sqrt(3) / 2
+        # NOTE: the tolerance avoids losing the first row or column if the bounding box starts right on it
+        return (int(np.ceil((bbox[1] - origin_y) / row_spacing - 1e-9)),
+                int(np.ceil((bbox[1] + bbox[3] - origin_y) / row_spacing)),
+                int(np.ceil((bbox[0] - origin_x) / GRID_RESOLUTION - 1e-9)),
+                int(np.ceil((bbox[0] + bbox[2] - GRID_RESOLUTION / 2 - origin_x) / GRID_RESOLUTION)))
+
+    def _create_lattice(self, exclude: Optional[tuple[int, int, int, int]] = None) \
+            -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Create a triangular lattice of points which are not blocked in every yaw layer.
+
+        The lattice starts at `lattice_origin` and covers the grid, except for an optional range of rows and columns.
+        Points close to obstacles are pushed away from them to keep a margin of `MIN_MARGIN` if possible.
+        Returns the points, the largest lattice spacing (in multiples of `GRID_RESOLUTION`) each point is part of
+        and the distance of each point to the closest obstacle.
+        """
         assert self.obstacle_map is not None
-        min_x, min_y, size_x, size_y = self.obstacle_map.grid.bbox
-        X, Y = np.meshgrid(np.arange(min_x, min_x + size_x - GRID_RESOLUTION / 2, GRID_RESOLUTION),
-                           np.arange(min_y, min_y + size_y, GRID_RESOLUTION * np.sqrt(3) / 2))
-        X[::2] += GRID_RESOLUTION / 2
-
-        rows, cols = self.obstacle_map.grid.to_grid(X.flatten(), Y.flatten())
-        distance = ndimage.distance_transform_edt(1 - self.obstacle_map.map) * self.obstacle_map.grid.pixel_size
-        D = ndimage.map_coordinates(distance, [[rows], [cols]], order=0).reshape(X.shape)
-        gradient_y, gradient_x = np.gradient(distance)
-        dD_dX = ndimage.map_coordinates(gradient_x, [[rows], [cols]], order=0).reshape(X.shape)
-        dD_dY = ndimage.map_coordinates(gradient_y, [[rows], [cols]], order=0).reshape(X.shape)
+        row0, row1, col0, col1 = self._lattice_range(self.obstacle_map.grid.bbox)
+        lattice_rows, lattice_cols = np.meshgrid(np.arange(row0, row1), np.arange(col0, col1), indexing='ij')
+        X = self.lattice_origin[0] + lattice_cols * GRID_RESOLUTION
+        Y = self.lattice_origin[1] + lattice_rows * GRID_RESOLUTION * np.sqrt(3) / 2
+        X[lattice_rows % 2 == 0] += GRID_RESOLUTION / 2
+
+        blocked = self.obstacle_map.is_blocked(X.flatten(), Y.flatten()).reshape(X.shape)
+        D, dD_dX, dD_dY = (values.reshape(X.shape)
+                           for values in self.obstacle_map.get_obstacle_distances(X.flatten(), Y.flatten()))
         dD = np.sqrt(dD_dX**2 + dD_dY**2)
         close = np.logical_and(0.0 < D, D < MIN_MARGIN)
         close = np.logical_and(close, dD > 0)
         X[close] += dD_dX[close] / dD[close] * (MIN_MARGIN - D[close])
         Y[close] += dD_dY[close] / dD[close] * (MIN_MARGIN - D[close])
 
-        keep = np.reshape([not all(self.obstacle_map.stack[int(np.round(row)), int(np.round(col)), :])
-                           for row, col in zip(rows, cols)], X.shape)
-        keep[1::2, :] = np.logical_and(keep[1::2, :], D[1::2, :] < 2)
-        keep[::4, 1::2] = np.logical_and(keep[::4, 1::2], D[::4, 1::2] < 2)
-        keep[2::4, ::2] = np.logical_and(keep[2::4, ::2], D[2::4, ::2] < 2)
-        self.tri_points = np.stack((X[keep], Y[keep]), axis=1)
-        assert self.tri_points is not None  # NOTE: mypy doesn't seem to understand np.stack
-
+        # NOTE: every second row of a triangular lattice with shifted columns forms a triangular lattice with twice the spacing
+        spacings = np.ones(X.shape, dtype=int)
+        spacing = 2
+        while spacing <= COARSE_GRID_SPACING:
+            spacings[(lattice_rows % spacing == 0) &
+                     (lattice_cols % spacing == spacing // 2 * (lattice_rows // spacing % 2))] = spacing
+            spacing *= 2
+
+        keep = ~blocked
+        if exclude is not None:
+            keep &= ~((exclude[0] <= lattice_rows) & (lattice_rows < exclude[1]) &
+                      (exclude[2] <= lattice_cols) & (lattice_cols < exclude[3]))
+        return np.stack((X[keep], Y[keep]), axis=1), spacings[keep], D[keep]
+
+    def _create_graph(self,
+                      tri_points: Optional[np.ndarray] = None,
+                      *,
+                      fine_points: Optional[np.ndarray] = None,
+                      known_tests: Optional[EdgeTests] = None) -> None:
+        """Create the graph on the given points or on a lattice whose spacing grows with the distance to obstacles.
+
+        Lattice points with a spacing `s` are used if they are closer than `2 * s * GRID_RESOLUTION` to an obstacle.
+        Without hierarchical search the spacing is at most 2, otherwise it goes up to `COARSE_GRID_SPACING`.
+        Edge candidates whose keys are found in `known_tests` are not tested again.
+        """
+        assert self.obstacle_map is not None
+        self.fine_planner = None
+        if tri_points is None:
+            points, spacings, distances = self._create_lattice()
+            max_spacing = COARSE_GRID_SPACING if self.parameters.hierarchical_search else 2
+            self.tri_points = _select_lattice_points(points, spacings, distances, max_spacing)
+            self.fine_points = _select_lattice_points(points, spacings, distances, 2) \
+                if self.parameters.hierarchical_search else self.tri_points
+        else:
+            self.tri_points = tri_points
+            self.fine_points = tri_points if fine_points is None else fine_points
+
+        # NOTE: each group has one pose per neighbor, which are stored consecutively in the arrays of all poses
         self.tri_mesh = spatial.Delaunay(self.tri_points)
+        offsets, neighbors = self.tri_mesh.vertex_neighbor_vertices
+        groups = np.repeat(np.arange(len(self.tri_points)), np.diff(offsets))
+        yaws = np.arctan2(self.tri_points[neighbors, 1] - self.tri_points[groups, 1],
+                          self.tri_points[neighbors, 0] - self.tri_points[groups, 0])
+        self.pose_offsets = offsets
+        self.pose_array = np.column_stack((self.tri_points[groups], yaws))
         self.pose_groups = [
             DelaunayPoseGroup(
                 index=i,
                 point=Point(x=self.tri_points[i, 0], y=self.tri_points[i, 1]),
-                neighbor_indices=_tri_neighbors(self.tri_mesh, i).tolist(),
-                poses=[
-                    Pose(x=point[0], y=point[1], yaw=np.arctan2(neighbor[1] - point[1], neighbor[0] - point[0]))
-                    for neighbor in self.tri_points[_tri_neighbors(self.tri_mesh, i)]
-                ],
+                neighbor_indices=neighbors[offsets[i]:offsets[i+1]].tolist(),
+                poses=[Pose(x=x, y=y, yaw=yaw) for x, y, yaw in self.pose_array[offsets[i]:offsets[i+1]].tolist()],
             )
-            for i, point in enumerate(self.tri_points)
+            for i in range(len(self.tri_points))
         ]
 
+        # NOTE: connect each pose with all poses of the neighbor group it is pointing to, except for 180-degree turns
+        counts = np.diff(offsets)[neighbors]
+        sources = np.repeat(np.arange(len(neighbors)), counts)
+        targets = np.repeat(offsets[neighbors], counts) + np.arange(len(sources)) - np.repeat(np.cumsum(counts) - counts, counts)
+        turns = np.abs(angle(yaws[sources], yaws[targets] + np.pi)) < 0.01
+        self.edge_candidates = np.column_stack((sources[~turns], targets[~turns]))
+        self.edge_candidate_keys = _edge_keys(groups[sources[~turns]], neighbors[sources[~turns]],
+                                              neighbors[targets[~turns]])
+        if known_tests is None or len(known_tests.keys) == 0:
+            self.edge_candidate_blocked, self.edge_candidate_lengths, self.edge_candidate_bboxes = \
+                self._test_edge_candidates(self.edge_candidates)
+        else:
+            self._reuse_edge_tests(known_tests)
+        if self.parameters.graph_backend == 'scipy':
+            self.graph = None
+            self.sparse_graph = self._create_sparse_graph()
+            return
+
+        nodes = self._nodes()
+        free = self.edge_candidates[~self.edge_candidate_blocked].tolist()
+        free_lengths = self.edge_candidate_lengths[~self.edge_candidate_blocked].tolist()
+        self.sparse_graph = None
         self.graph = nx.DiGraph()
-        for g, group in enumerate(self.pose_groups):
-            for p in range(len(group.poses)):
-                self.graph.add_node((g, p))
-        for g, group in enumerate(self.pose_groups):
-            for p, (pose, g_) in enumerate(zip(group.poses, group.neighbor_indices)):
-                for p_, pose_ in enumerate(self.pose_groups[g_].poses):
-                    if abs(angle(pose.yaw, pose_.yaw + np.pi)) < 0.01:
-                        continue  # NOTE: avoid 180-degree turns
-                    x, y, yaw = _generate_poses(self.obstacle_map.grid, pose, pose_)
-                    if not self.obstacle_map.test(x, y, yaw).any():
-                        length = np.sum(np.sqrt(np.diff(x)**2 + np.diff(y)**2))
-                        self.graph.add_edge((g, p), (g_, p_), backward=False, weight=length)
-                        if ((g_, p_), (g, p)) not in self.graph.edges:
-                            self.graph.add_edge((g_, p_), (g, p), backward=True, weight=1.2*length)
-
-    def search(self, start: Pose, goal: Pose) -> list[PathSegment]:
+        self.graph.add_nodes_from(nodes)
+        self.graph.add_edges_from((nodes[b], nodes[a], {'backward': True, 'weight': BACKWARD_PENALTY * length})
+                                  for (a, b), length in zip(free, free_lengths))
+        # NOTE: forward edges replace backward edges in the opposite direction
+        self.graph.add_edges_from((nodes[a], nodes[b], {'backward': False, 'weight': length})
+                                  for (a, b), length in zip(free, free_lengths))
+
+    def _reuse_edge_tests(self, known_tests: EdgeTests) -> None:
+        """Take the test results of known edge candidates and test only the remaining ones."""
+        self.edge_candidate_blocked = np.zeros(len(self.edge_candidates), dtype=bool)
+        self.edge_candidate_lengths = np.zeros(len(self.edge_candidates))
+        self.edge_candidate_bboxes = np.zeros((len(self.edge_candidates), 4))
+        order = np.argsort(known_tests.keys)
+        indices = order[np.minimum(np.searchsorted(known_tests.keys, self.edge_candidate_keys, sorter=order),
+                                   len(order) - 1)]
+        known = known_tests.keys[indices] == self.edge_candidate_keys
+        self.edge_candidate_blocked[known] = known_tests.blocked[indices[known]]
+        self.edge_candidate_lengths[known] = known_tests.lengths[indices[known]]
+        self.edge_candidate_bboxes[known] = known_tests.bboxes[indices[known]]
+        self.edge_candidate_blocked[~known], self.edge_candidate_lengths[~known], self.edge_candidate_bboxes[~known] = \
+            self._test_edge_candidates(self.edge_candidates[~known])
+
+    def _extend_graph(self, old_bbox: tuple[float, float, float, float], rects: list[PixelRect]) -> None:
+        """Add lattice points outside of the old bounding box to the graph after the obstacle map has grown.
+
+        The old points keep their indices, so that the test results of edge candidates between them can be reused.
+        Only candidates involving new points or passing the given pixel regions are tested again.
+        """
         assert self.obstacle_map is not None
+        assert self.tri_points is not None
+        assert self.fine_points is not None
+        points, spacings, distances = self._create_lattice(exclude=self._lattice_range(old_bbox))
+        max_spacing = COARSE_GRID_SPACING if self.parameters.hierarchical_search else 2
+        tri_points = np.concatenate((self.tri_points, _select_lattice_points(points, spacings, distances, max_spacing)))
+        fine_points = np.concatenate((self.fine_points, _select_lattice_points(points, spacings, distances, 2))) \
+            if self.parameters.hierarchical_search else None
+        valid = ~_find_affected(self.obstacle_map.grid, self.edge_candidate_bboxes, rects)
+        known_tests = EdgeTests(keys=self.edge_candidate_keys[valid],
+                                blocked=self.edge_candidate_blocked[valid],
+                                lengths=self.edge_candidate_lengths[valid],
+                                bboxes=self.edge_candidate_bboxes[valid])
+        self._create_graph(tri_points, fine_points=fine_points, known_tests=known_tests)
+
+    def _create_sparse_graph(self) -> SparseGraph:
+        free = self.edge_candidates[~self.edge_candidate_blocked]
+        return SparseGraph(len(self.pose_array), free[:, 0], free[:, 1],
+                           self.edge_candidate_lengths[~self.edge_candidate_blocked])
+
+    def _nodes(self) -> list[tuple[int, int]]:
+        """Get the graph nodes (group index and pose index) for all poses."""
+        groups = np.repeat(np.arange(len(self.pose_offsets) - 1), np.diff(self.pose_offsets))
+        return list(zip(groups.tolist(), (np.arange(len(groups)) - self.pose_offsets[groups]).tolist()))
+
+    def _test_edge_candidates(self, candidates: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Test the splines of the given edge candidates for collisions.
+
+        Returns whether each candidate is blocked, its length and the bounding box of its sampled poses.
+        """
+        assert self.obstacle_map is not None
+        blocked = np.zeros(len(candidates), dtype=bool)
+        lengths = np.zeros(len(candidates))
+        bboxes = np.zeros((len(candidates), 4))
+        for c in range(0, len(candidates), EDGE_CHUNK_SIZE):
+            chunk = slice(c, c + EDGE_CHUNK_SIZE)
+            start_poses = self.pose_array[candidates[chunk, 0]]
+            end_poses = self.pose_array[candidates[chunk, 1]]
+            x, y, yaw, counts = _sample_splines(self.obstacle_map.grid, start_poses, end_poses)
+            starts = np.cumsum(counts)[counts > 0] - counts[counts > 0]
+            step_lengths = np.sqrt(np.diff(x, prepend=0)**2 + np.diff(y, prepend=0)**2)
+            step_lengths[starts] = 0
+            blocked[chunk][counts > 0] = np.add.reduceat(self.obstacle_map.test(x, y, yaw)[0], starts) > 0
+            lengths[chunk][counts > 0] = np.add.reduceat(step_lengths, starts)
+            bboxes[chunk] = np.column_stack((start_poses[:, :2], start_poses[:, :2]))
+            bboxes[chunk][counts > 0] = np.column_stack((np.minimum.reduceat(x, starts), np.minimum.reduceat(y, starts),
+                                                         np.maximum.reduceat(x, starts), np.maximum.reduceat(y, starts)))
+        return blocked, lengths, bboxes
+
+    def _update_graph(self, rects: list[PixelRect]) -> None:
+        """Test all edge candidates passing the given pixel regions again and update the graph accordingly."""
+        assert self.obstacle_map is not None
+        affected = _find_affected(self.obstacle_map.grid, self.edge_candidate_bboxes, rects)
+        self.fine_planner = None
+        blocked, lengths, _ = self._test_edge_candidates(self.edge_candidates[affected])
+        self.edge_candidate_blocked[affected] = blocked
+        self.edge_candidate_lengths[affected] = lengths
+        if self.sparse_graph is not None:
+            self.sparse_graph = self._create_sparse_graph()
+            return
+
         assert self.graph is not None
-        assert self.pose_groups is not None
+        nodes = self._nodes()
+        for (a, b), is_blocked, length in zip(self.edge_candidates[affected].tolist(), blocked, lengths.tolist()):
+            if is_blocked:
+                if self.graph.has_edge(nodes[a], nodes[b]):
+                    self.graph.remove_edge(nodes[a], nodes[b])
+                if self.graph.has_edge(nodes[b], nodes[a]):
+                    self.graph.remove_edge(nodes[b], nodes[a])
+            elif not self.graph.has_edge(nodes[a], nodes[b]):
+                self.graph.add_edge(nodes[a], nodes[b], backward=False, weight=length)
+                if not self.graph.has_edge(nodes[b], nodes[a]):
+                    self.graph.add_edge(nodes[b], nodes[a], backward=True, weight=BACKWARD_PENALTY * length)
+
+    def search(self, start: Pose, goal: Pose, deadline: Optional[float] = None) -> list[PathSegment]:
+        """Search a path from start to goal.
+
+        If a `deadline` is given, the search stops improving paths (by trying more entry/exit pairs and shortcuts)
+        when it is reached and returns the best valid path found so far.
+        Finding the first path is not interrupted.
+        """
+        assert self.obstacle_map is not None
+        simple_path = self._find_simple_path(start, goal)
+        if simple_path is not None:
+            return simple_path
+        if not self.parameters.hierarchical_search:
+            return self._search_graph(start, goal, deadline)
+
+        try:
+            coarse_path = self._search_graph(start, goal, deadline)
+        except RuntimeError:
+            self.log.info('could not find path on coarse graph, searching on fine graph')
+            return self._get_fine_planner()._search_graph(start, goal, deadline)
+        if deadline is not None and time.time() > deadline:
+            return coarse_path
+        corridor_planner = self._create_corridor_planner(coarse_path)
+        if corridor_planner is not None:
+            try:
+                return corridor_planner._search_graph(start, goal, deadline)
+            except RuntimeError:
+                self.log.info('could not refine coarse path within corridor')
+        return coarse_path
+
+    def _find_simple_path(self, start: Pose, goal: Pose) -> Optional[list[PathSegment]]:
+        """Try to reach the goal with a single spline or a single shunt."""
+        assert self.obstacle_map is not None
         paths: list[list[PathSegment]] = []
 
         if TRY_SINGLE_PATH:
-            for backward in [True, False]:
-                simple_spline = Spline.from_poses(start, goal, backward=backward)
-                if _is_healthy(simple_spline) and not self.obstacle_map.test_spline(simple_spline, backward):
-                    paths.append([PathSegment(spline=simple_spline, backward=backward)])
+            segments = [PathSegment(spline=Spline.from_poses(start, goal, backward=backward), backward=backward)
+                        for backward in [True, False]]
+            free = _are_free(self.obstacle_map, segments)
+            paths += [[segment] for segment, is_free in zip(segments, free) if is_free]
         if paths:
             self.log.info('found single spline to reach goal')
             return min(paths, key=lambda path: path[0].spline.estimated_length())
 
         if TRY_SINGLE_SHUNTING:
+            shunts: list[list[PathSegment]] = []
             for backward in [True, False]:
                 for length in [1, 1.5, 2]:
                     y_outline = [p[1] for p in self.robot_outline]
                     robot_length = max(y_outline) - min(y_outline)
                     step = PoseStep(linear=robot_length * (-length if backward else length), angular=0, time=0)
                     intermediate = start + step
-                    spline1 = Spline.from_poses(start, intermediate, backward=backward)
-                    if not _is_healthy(spline1) or self.obstacle_map.test_spline(spline1, backward):
-                        continue
-                    spline2 = Spline.from_poses(intermediate, goal, backward=not backward)
-                    if not _is_healthy(spline2) or self.obstacle_map.test_spline(spline2, not backward):
-                        continue
-                    paths.append([
-                        PathSegment(spline=spline1, backward=backward),
-                        PathSegment(spline=spline2, backward=not backward),
+                    shunts.append([
+                        PathSegment(spline=Spline.from_poses(start, intermediate, backward=backward), backward=backward),
+                        PathSegment(spline=Spline.from_poses(intermediate, goal, backward=not backward),
+                                    backward=not backward),
                     ])
+            free = _are_free(self.obstacle_map, [segment for shunt in shunts for segment in shunt]).reshape(-1, 2)
+            paths += [shunt for shunt, is_free in zip(shunts, free) if is_free.all()]
         if paths:
             self.log.info('found single shunt to reach goal')
             return min(paths, key=lambda path: path[0].spline.estimated_length() + path[1].spline.estimated_length())
+        return None
 
+    def _search_graph(self, start: Pose, goal: Pose, deadline: Optional[float] = None) -> list[PathSegment]:
+        assert self.obstacle_map is not None
+        assert self.pose_groups is not None
+        paths: list[list[PathSegment]] = []
         grid_entries = _find_grid_passages(self.obstacle_map, self.pose_groups, start, True)
         grid_exits = _find_grid_passages(self.obstacle_map, self.pose_groups, goal, False)
         if not grid_entries:
@@ -176,95 +515,277 @@ class DelaunayPlanner:
         if not grid_exits:
             raise RuntimeError('could not find exit segment')
 
-        for enter, exit_ in itertools.product(grid_entries, grid_exits):
-            p, g = enter.coordinate
-            p_, g_ = exit_.coordinate
-            path: list[PathSegment] = [enter.segment]
-            last_g, last_p = g, p
-            try:
-                for next_g, next_p in nx.shortest_path(self.graph, (g, p), (g_, p_), weight='weight')[1:]:
-                    last_pose = self.pose_groups[last_g].poses[last_p]
-                    next_pose = self.pose_groups[next_g].poses[next_p]
-                    backward = self.graph.edges[((last_g, last_p), (next_g, next_p))]['backward']
-                    spline = Spline.from_poses(last_pose, next_pose, backward=backward)
-                    path.append(PathSegment(spline=spline, backward=backward))
-                    last_g, last_p = next_g, next_p
-            except nx.exception.NetworkXNoPath:
+        node_paths = self._find_shortest_paths([(g, p) for p, g in (enter.coordinate for enter in grid_entries)],
+                                               [(g, p) for p, g in (exit_.coordinate for exit_ in grid_exits)], goal)
+        for (enter, exit_), node_path in zip(itertools.product(grid_entries, grid_exits), node_paths):
+            if paths and deadline is not None and time.time() > deadline:
+                break  # NOTE: the first path is always completed, further entry/exit pairs are skipped
+            if node_path is None:
                 continue
+            path: list[PathSegment] = [enter.segment]
+            for (last_g, last_p), (next_g, next_p) in zip(node_path[:-1], node_path[1:]):
+                last_pose = self.pose_groups[last_g].poses[last_p]
+                next_pose = self.pose_groups[next_g].poses[next_p]
+                backward = self._is_backward((last_g, last_p), (next_g, next_p))
+                spline = Spline.from_poses(last_pose, next_pose, backward=backward)
+                path.append(PathSegment(spline=spline, backward=backward))
             path.append(exit_.segment)
 
             while True:
-                shortcuts: list[PathSegment] = []
+                if deadline is not None and time.time() > deadline:
+                    break  # NOTE: paths consist of free graph edges and tested segments, so they are valid at any point
+                shortened = False
+                path_splines = SplineArray.from_splines([segment.spline for segment in path])
+                path_backward = np.array([segment.backward for segment in path], dtype=bool)
+                path_lengths = path_splines.estimated_length()
+                path_starts = np.column_stack((path_splines.a, path_splines.e,
+                                               path_splines.yaw(np.zeros(len(path))) + np.where(path_backward, np.pi, 0)))
+                path_ends = np.column_stack((path_splines.d, path_splines.h,
+                                             path_splines.yaw(np.ones(len(path))) + np.where(path_backward, np.pi, 0)))
                 for step_size in [1, 2]:
-                    for s in range(len(path) - step_size):
-                        new_start = Pose(
-                            x=path[s].spline.start.x,
-                            y=path[s].spline.start.y,
-                            yaw=path[s].spline.yaw(0) + (np.pi if path[s].backward else 0),
-                        )
-                        new_end = Pose(
-                            x=path[s+step_size].spline.end.x,
-                            y=path[s+step_size].spline.end.y,
-                            yaw=path[s+step_size].spline.yaw(1) + (np.pi if path[s+step_size].backward else 0),
-                        )
-                        if abs(angle(new_start.yaw, new_end.yaw + np.pi)) < 0.01:
-                            continue
-                        for new_backward in [False, True]:
-                            new_spline = Spline.from_poses(new_start, new_end, backward=new_backward)
-                            if not _is_healthy(new_spline):
-                                continue
-                            if self.obstacle_map.test_spline(new_spline, new_backward):
-                                continue
-                            combined_length = path[s].spline.estimated_length() + \
-                                path[s+step_size].spline.estimated_length()
-                            if .9 * new_spline.estimated_length() > combined_length:
-                                continue
-                            shortcuts.append(PathSegment(spline=new_spline, backward=new_backward))
-                        if shortcuts:
-                            lengths = [segment.spline.estimated_length() for segment in shortcuts]
-                            path[s] = shortcuts[np.argmin(lengths)]
-                            for _ in range(step_size):
-                                del path[s+1]
-                            break  # restart while loop
-                    if shortcuts:
+                    starts = path_starts[:len(path) - step_size]
+                    ends = path_ends[step_size:]
+                    indices = np.flatnonzero(np.abs(angle(starts[:, 2], ends[:, 2] + np.pi)) >= 0.01)
+                    if not len(indices):
+                        continue
+                    # NOTE: all candidates are tested at once, but only the first index with valid ones is used
+                    candidate_indices = np.repeat(indices, 2)
+                    candidate_backward = np.tile([False, True], len(indices))
+                    candidates = SplineArray.from_poses(starts[candidate_indices], ends[candidate_indices],
+                                                        backward=candidate_backward)
+                    lengths = candidates.estimated_length()
+                    combined_lengths = path_lengths[candidate_indices] + path_lengths[candidate_indices + step_size]
+                    valid = _are_splines_free(self.obstacle_map, candidates, candidate_backward) & \
+                        (.9 * lengths <= combined_lengths)
+                    if valid.any():
+                        s = int(candidate_indices[valid].min())
+                        options = np.flatnonzero(valid & (candidate_indices == s))
+                        best = options[np.argmin(lengths[options])]
+                        path[s] = PathSegment(spline=candidates[best], backward=bool(candidate_backward[best]))
+                        for _ in range(step_size):
+                            del path[s+1]
+                        shortened = True
                         break  # restart while loop
-                if not shortcuts:
+                if not shortened:
                     break  # exit while loop
             paths.append(path)
+        if deadline is not None and time.time() > deadline:
+            self.log.info('search deadline reached, returning best path found so far')
         if not paths:
             raise RuntimeError('could not find path')
         return min(paths, key=len)
 
+    def _create_sub_planner(self, tri_points: np.ndarray) -> DelaunayPlanner:
+        """Create a planner for the same world and obstacle map, but with a graph on the given points."""
+        planner = DelaunayPlanner(self.robot_outline, replace(self.parameters, hierarchical_search=False))
+        planner.areas = self.areas
+        planner.obstacles = self.obstacles
+        planner.obstacle_map = self.obstacle_map
+        planner._create_graph(tri_points)
+        return planner
+
+    def _get_fine_planner(self) -> DelaunayPlanner:
+        """Get a planner with the graph on the fine lattice, which is only created when the coarse graph fails."""
+        assert self.fine_points is not None
+        if self.fine_planner is None:
+            self.fine_planner = self._create_sub_planner(self.fine_points)
+        return self.fine_planner
+
+    def _create_corridor_planner(self, path: list[PathSegment]) -> Optional[DelaunayPlanner]:
+        """Create a planner with the graph on all points of the fine lattice within `CORRIDOR_WIDTH` of the path."""
+        assert self.fine_points is not None
+        samples = np.concatenate([
+            np.column_stack((segment.spline.x(t), segment.spline.y(t)))
+            for segment in path
+            for t in [np.linspace(0, 1, int(segment.spline.estimated_length() / GRID_RESOLUTION) + 2)]
+        ])
+        distances, _ = spatial.cKDTree(samples).query(self.fine_points, distance_upper_bound=CORRIDOR_WIDTH)
+        corridor_points = self.fine_points[np.isfinite(distances)]
+        if len(corridor_points) < 3:
+            return None
+        try:
+            return self._create_sub_planner(corridor_points)
+        except spatial.QhullError:  # NOTE: e.g. if all corridor points are collinear
+            return None
+
+    def _find_shortest_paths(self, sources: list[tuple[int, int]], targets: list[tuple[int, int]],
+                             goal: Optional[Pose] = None) -> list[Optional[list[tuple[int, int]]]]:
+        """Find the shortest paths between all combinations of source and target nodes.
+
+        The paths are returned in the order of `itertools.product(sources, targets)`.
+        A* only finds the shortest path from any source to any target, so all other combinations are `None`.
+        The `goal` is needed for the geodesic heuristic.
+        """
+        if self.sparse_graph is not None:
+            nodes = self._nodes()
+            source_indices = [int(self.pose_offsets[g] + p) for g, p in sources]
+            target_indices = [int(self.pose_offsets[g] + p) for g, p in targets]
+            if self.parameters.search_algorithm == 'astar':
+                path = self.sparse_graph.astar(source_indices, target_indices, self._heuristic(target_indices, goal))
+                return [
+                    [nodes[n] for n in path] if path is not None and path[0] == source and path[-1] == target else None
+                    for source, target in itertools.product(source_indices, target_indices)
+                ]
+            paths = self.sparse_graph.shortest_paths(source_indices, target_indices)
+            return [None if path is None else [nodes[n] for n in path] for row in paths for path in row]
 
-def _tri_neighbors(tri_mesh: spatial.Delaunay, vertex_index: int) -> np.ndarray:
-    return tri_mesh.vertex_neighbor_vertices[1][tri_mesh.vertex_neighbor_vertices[0][vertex_index]:
-                                                tri_mesh.vertex_neighbor_vertices[0][vertex_index + 1]]
-
-
-@lru_cache(maxsize=1000)
-def _t_array(n: int) -> np.ndarray:
-    return np.linspace(0, 1, n)
-
-
-@lru_cache(maxsize=10000)
-def _generate_pose_offsets(grid: Grid, dx: float, dy: float, yaw: float, yaw_: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
-    spline = FastSpline(0, 0, yaw, dx, dy, yaw_, False)
-    row0, col0, layer0 = grid.to_3d_grid(0, 0, yaw)
-    row1, col1, layer1 = grid.to_3d_grid(dx, dy, yaw_)
-    num_rows = int(abs(row1 - row0))
-    num_cols = int(abs(col1 - col0))
-    num_layers = int(abs(layer1 - layer0))
-    t = _t_array(max(num_rows, num_cols, num_layers))
-    return (spline.x(t), spline.y(t), spline.yaw(t) + [0, np.pi][spline.backward])
-
-
-def _generate_poses(grid: Grid, pose: Pose, pose_: Pose) -> tuple:
-    dx, dy, yaw = _generate_pose_offsets(grid, pose_.x - pose.x, pose_.y - pose.y, pose.yaw, pose_.yaw)
-    return pose.x + dx, pose.y + dy, yaw
+        assert self.graph is not None
+        results: list[Optional[list[tuple[int, int]]]] = []
+        for source, target in itertools.product(sources, targets):
+            try:
+                results.append(nx.shortest_path(self.graph, source, target, weight='weight'))
+            except nx.exception.NetworkXNoPath:
+                results.append(None)
+        return results
+
+    def _heuristic(self, targets: list[int], goal: Optional[Pose]) -> np.ndarray:
+        """Compute a lower bound of the path length from each pose to the closest target pose.
+
+        The Euclidean distance is a lower bound, because edges are at least as long as the straight line.
+        The geodesic distance to the goal (minus that of the farthest target) is scaled and reduced by two pixels
+        to stay below the path length despite the discretization of the distance map.
+        """
+        positions = self.pose_array[:, :2]
+        target_positions = self.pose_array[targets, :2]
+        heuristic = np.full(len(positions), np.inf)
+        for target_position in target_positions:
+            heuristic = np.minimum(heuristic, np.linalg.norm(positions - target_position, axis=1))
+        if self.parameters.heuristic == 'geodesic' and goal is not None:
+            assert self.obstacle_map is not None
+            distance_map = self._get_distance_map(goal.point)
+            geodesic = distance_map.interpolate(positions[:, 0], positions[:, 1])
+            offset = np.max(distance_map.interpolate(target_positions[:, 0], target_positions[:, 1]))
+            bound = GEODESIC_SCALE * (geodesic - offset) - 2 * self.obstacle_map.grid.pixel_size
+            # NOTE: interpolated distances next to obstacles are infinite, so we only use finite bounds
+            heuristic = np.maximum(heuristic, np.where(np.isfinite(bound), bound, 0))
+        return heuristic
+
+    def _get_distance_map(self, goal: Point) -> DistanceMap:
+        assert isinstance(self.obstacle_map, ObstacleMap)
+        key = (self.map_version, goal.x, goal.y)
+        if self.distance_map is None or self.distance_map_key != key:
+            self.distance_map = DistanceMap(self.obstacle_map, goal)
+            self.distance_map_key = key
+        return self.distance_map
+
+    def _is_backward(self, source: tuple[int, int], target: tuple[int, int]) -> bool:
+        if self.sparse_graph is not None:
+            return self.sparse_graph.is_backward(int(self.pose_offsets[source[0]] + source[1]),
+                                                 int(self.pose_offsets[target[0]] + target[1]))
+        assert self.graph is not None
+        return self.graph.edges[(source, target)]['backward']
+
+
+def _select_lattice_points(points: np.ndarray, spacings: np.ndarray, distances: np.ndarray, max_spacing: int) -> np.ndarray:
+    """Select the lattice points forming a lattice with a spacing of up to `max_spacing` far away from obstacles."""
+    return points[(spacings >= max_spacing) | (distances < 2 * spacings * GRID_RESOLUTION)]
+
+
+def _edge_keys(groups: np.ndarray, neighbors: np.ndarray, next_neighbors: np.ndarray) -> np.ndarray:
+    """Encode edge candidates by the indices of their start point, end point and the neighbor the end pose is pointing to.
+
+    Unlike pose indices, these keys do not change when points are appended to the graph.
+    """
+    assert len(groups) == 0 or max(groups.max(), neighbors.max(), next_neighbors.max()) < 1 << EDGE_KEY_BITS
+    return (groups.astype(np.int64) << 2 * EDGE_KEY_BITS) | (neighbors.astype(np.int64) << EDGE_KEY_BITS) | next_neighbors
+
+
+def _find_affected(grid: Grid, bboxes: np.ndarray, rects: list[PixelRect]) -> np.ndarray:
+    """Find the bounding boxes (min x, min y, max x, max y) intersecting any of the given pixel regions."""
+    affected = np.zeros(len(bboxes), dtype=bool)
+    for row0, row1, col0, col1 in rects:
+        min_x, min_y = grid.from_grid(row0 - 0.5, col0 - 0.5)
+        max_x, max_y = grid.from_grid(row1 - 0.5, col1 - 0.5)
+        affected |= (bboxes[:, 0] <= max_x) & (bboxes[:, 2] >= min_x) & (bboxes[:, 1] <= max_y) & (bboxes[:, 3] >= min_y)
+    return affected
+
+
+def _find_growth(grid: Grid, points: list[Point]) -> PixelRect:
+    """Determine how many pixels the grid has to grow on each side (like `ObstacleMap.grow`) to contain the points.
+
+    Each side which has to grow is enlarged by at least `GROWTH_FACTOR` times the extent of the grid.
+    """
+    min_x, min_y, width, height = grid.bbox
+    margin = 1.0 + 2 * grid.pixel_size
+    required = [min_y - min(p.y for p in points) + margin, max(p.y for p in points) + margin - min_y - height,
+                min_x - min(p.x for p in points) + margin, max(p.x for p in points) + margin - min_x - width]
+    extents = [height, height, width, width]
+    spacings = [height / grid.size[0]] * 2 + [width / grid.size[1]] * 2
+    return tuple(int(np.ceil(max(r, GROWTH_FACTOR * e) / s)) if r > 0 else 0  # type: ignore[return-value]
+                 for r, e, s in zip(required, extents, spacings))
+
+
+def _sample_splines(grid: Grid, start_poses: np.ndarray, end_poses: np.ndarray) \
+        -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Sample the splines between pairs of poses (rows of x, y and yaw) with about one sample per grid cell.
+
+    Returns x, y and yaw of all samples (concatenated) and the number of samples per spline.
+    """
+    dx = end_poses[:, 0] - start_poses[:, 0]
+    dy = end_poses[:, 1] - start_poses[:, 1]
+    row0, col0, layer0 = grid.to_3d_grid(0, 0, start_poses[:, 2])
+    row1, col1, layer1 = grid.to_3d_grid(dx, dy, end_poses[:, 2])
+    counts = np.max(np.abs([row1 - row0, col1 - col0, layer1 - layer0]), axis=0).astype(int)
+    index = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    # NOTE: same values as np.linspace(0, 1, count) for each spline
+    steps = 1.0 / np.maximum(counts - 1, 1)
+    t = (np.arange(len(index)) - starts[index]) * steps[index]
+    t[(starts + counts - 1)[counts > 1]] = 1.0
+    zeros = np.zeros(len(counts))
+    splines = SplineArray.from_poses(np.column_stack((zeros, zeros, start_poses[:, 2])),
+                                     np.column_stack((dx, dy, end_poses[:, 2])))[index]
+    return start_poses[index, 0] + splines.x(t), start_poses[index, 1] + splines.y(t), splines.yaw(t), counts
+
+
+def _find_changed_outlines(old_items: list[Area] | list[Obstacle],
+                           new_items: list[Area] | list[Obstacle]) -> list[list[Point]]:
+    """Find the outlines of all areas or obstacles which have been added, removed or modified."""
+    old_dict = {item.id: item for item in old_items}
+    new_dict = {item.id: item for item in new_items}
+    outlines: list[list[Point]] = []
+    for id_ in old_dict.keys() | new_dict.keys():
+        old_item = old_dict.get(id_)
+        new_item = new_dict.get(id_)
+        if old_item == new_item:
+            continue
+        if old_item is not None:
+            outlines.append(old_item.outline)
+        if new_item is not None:
+            outlines.append(new_item.outline)
+    return [outline for outline in outlines if outline]
+
+
+def _bbox(points: list[Point]) -> tuple[float, float, float, float]:
+    min_x = min(p.x for p in points)
+    min_y = min(p.y for p in points)
+    return min_x, min_y, max(p.x for p in points) - min_x, max(p.y for p in points) - min_y
+
+
+def _are_healthy(splines: SplineArray, curvature_limit: float = 10.0) -> np.ndarray:
+    return np.abs(splines.max_curvature()) < curvature_limit
+
+
+def _are_free(obstacle_map: BaseObstacleMap, segments: list[PathSegment]) -> np.ndarray:
+    """Check which segments are collision-free and healthy, testing all of them with a single map lookup."""
+    return _are_splines_free(obstacle_map, SplineArray.from_splines([segment.spline for segment in segments]),
+                             np.array([segment.backward for segment in segments], dtype=bool))
+
+
+def _are_splines_free(obstacle_map: BaseObstacleMap, splines: SplineArray, backward: np.ndarray) -> np.ndarray:
+    """Check which splines are collision-free and healthy; the curvature is only computed for collision-free ones."""
+    free = ~obstacle_map.test_splines(splines, backward)
+    free[free] = _are_healthy(splines[free])
+    return free
 
 
-def _is_healthy(spline: Spline, curvature_limit: float = 10.0) -> bool:
-    return np.abs(spline.max_curvature()) < curvature_limit
+@dataclass(slots=True, kw_only=True)
+class EdgeTests:
+    """collision test results of edge candidates identified by their keys"""
+    keys: np.ndarray
+    blocked: np.ndarray
+    lengths: np.ndarray
+    bboxes: np.ndarray
 
 
 @dataclass(slots=True, kw_only=True)
@@ -273,22 +794,21 @@ class Passage:
     coordinate: tuple[int, int]
 
 
-def _find_grid_passages(obstacle_map: ObstacleMap,
+def _find_grid_passages(obstacle_map: BaseObstacleMap,
                         pose_groups: list[DelaunayPoseGroup],
                         pose: Pose,
                         entering: bool,
                         max_num_groups: int = 10,
                         max_num_results: int = 3) -> list[Passage]:
     group_distances = [g.point.distance(pose) for g in pose_groups]
-    group_indices = np.argsort(group_distances)
-    results: list[Passage] = []
-    for g, group in zip(group_indices, np.array(pose_groups)[group_indices][:max_num_groups]):
-        for p, group_pose in enumerate(group.poses):
-            for backward in [False, True]:
-                poses = (pose, group_pose) if entering else (group_pose, pose)
-                spline = Spline.from_poses(*poses, backward=backward)
-                if _is_healthy(spline) and not obstacle_map.test_spline(spline, backward):
-                    passage = Passage(segment=PathSegment(spline=spline, backward=backward), coordinate=(p, g))
-                    results.append(passage)
-    results.sort(key=lambda passage: passage.segment.spline.estimated_length())
-    return results[:max_num_results]
+    group_indices = np.argsort(group_distances)[:max_num_groups].tolist()
+    coordinates = [(p, g) for g in group_indices for p in range(len(pose_groups[g].poses))]
+    # NOTE: each group pose is connected forward and backward
+    group_poses = np.repeat(np.array([[p.x, p.y, p.yaw] for g in group_indices for p in pose_groups[g].poses]), 2, axis=0)
+    backward = np.tile([False, True], len(coordinates))
+    poses = np.broadcast_to([pose.x, pose.y, pose.yaw], group_poses.shape)
+    splines = SplineArray.from_poses(*((poses, group_poses) if entering else (group_poses, poses)), backward=backward)
+    free = np.flatnonzero(_are_splines_free(obstacle_map, splines, backward))
+    results = free[np.argsort(splines[free].estimated_length(), kind='stable')][:max_num_results]
+    return [Passage(segment=PathSegment(spline=splines[i], backward=bool(backward[i])), coordinate=coordinates[i // 2])
+            for i in results.tolist()]
@@ -2,7 +2,9 @@ import time
 from typing import Optional
 
 import numpy as np
-import scipy.interpolate
+from scipy import sparse
+from scipy.interpolate import RegularGridInterpolator
+from scipy.sparse import csgraph
 
 from ..geometry import Point
 from .obstacle_map import ObstacleMap
@@ -11,74 +13,93 @@ from .obstacle_map import ObstacleMap
 class DistanceMap:
 
     def __init__(self, obstacle_map: ObstacleMap, target: Point, deadline: Optional[float] = None):
+        """Compute the geodesic distance of each free pixel to the target with a single Dijkstra pass.
+
+        Pixels are connected to their 8 neighbors if both are free.
+        A virtual source node is connected to the free pixels surrounding the target.
+        Obstacles and unreachable pixels have an infinite distance.
+        """
         self.grid = obstacle_map.grid
-        scaled_obstacle_map = obstacle_map.map
+        free = ~obstacle_map.map.astype(bool)
+        height, width = free.shape
+        spacing_x = self.grid.bbox[2] / self.grid.size[1]
+        spacing_y = self.grid.bbox[3] / self.grid.size[0]
 
-        self.INF = 1000000
-        self.F = 100
-        dx = self.F * self.grid.bbox[2] / self.grid.size[1]
-        dy = self.F * self.grid.bbox[3] / self.grid.size[0]
-        self.DX = int(dx)
-        self.DY = int(dy)
-        self.DD = int(np.sqrt(dx**2 + dy**2))
+        sources, targets, weights = _lattice_edges(free, spacing_x, spacing_y)
+        row, col = self.grid.to_grid(target.x, target.y)
+        source = height * width
+        for r in {int(np.floor(row)), int(np.ceil(row))}:
+            for c in {int(np.floor(col)), int(np.ceil(col))}:
+                if 0 <= r < height and 0 <= c < width and free[r, c]:
+                    sources = np.append(sources, source)
+                    targets = np.append(targets, r * width + c)
+                    weights = np.append(weights, np.hypot((row - r) * spacing_y, (col - c) * spacing_x))
+        graph = sparse.csr_matrix((weights, (sources, targets)), shape=(source + 1, source + 1))
+        if deadline and time.time() > deadline:
+            raise TimeoutError('distance map creation took too long')
+        distances = csgraph.dijkstra(graph, directed=False, indices=source)
+        if deadline and time.time() > deadline:
+            raise TimeoutError('distance map creation took too long')
 
-        scaled_inf = self.F * self.INF
+        self.map = distances[:-1].reshape(height, width)
+        """distance of each pixel to the target in meters (infinite for obstacles and unreachable pixels)"""
+        with np.errstate(invalid='ignore'):
+            gradient_y, gradient_x = np.gradient(self.map, spacing_y, spacing_x)
 
-        d = np.zeros(self.grid.size[:2], dtype=int)
-        d.fill(scaled_inf)
-        row, col = self.grid.to_grid(target.x, target.y)
-        for r in [np.floor(row), np.ceil(row)]:
-            for c in [np.floor(col), np.ceil(col)]:
-                d[int(r), int(c)] = np.sqrt((row - r)**2 + (col - c)**2)
-
-        old_sum = d.sum()
-        while True:
-            d_dx = d + self.DX
-            d_dy = d + self.DY
-            d_dd = d + self.DD
-            d[1:-1, 1:-1] = np.minimum(
-                d[1:-1, 1:-1],
-                np.minimum(
-                    np.minimum(
-                        np.minimum(d_dy[:-2, 1:-1], d_dy[+2:, 1:-1]),
-                        np.minimum(d_dx[1:-1, :-2], d_dx[1:-1, +2:])
-                    ),
-                    np.minimum(
-                        np.minimum(d_dd[+2:, +2:], d_dd[+2:, :-2]),
-                        np.minimum(d_dd[:-2, +2:], d_dd[:-2, :-2])
-                    )
-                )
-            )
-            d[scaled_obstacle_map] = scaled_inf
-            new_sum = d.sum()
-            if new_sum == old_sum:
-                break
-            old_sum = new_sum
-            if deadline and time.time() > deadline:
-                raise TimeoutError('distance map creation took too long')
-
-        self.map = d.astype(float) / self.F
-        gy, gx = np.gradient(self.map)
-
-        rows = np.arange(self.grid.size[0])
-        cols = np.arange(self.grid.size[1])
-        xx, yy = self.grid.from_grid(rows, cols)
-        self._interp = scipy.interpolate.interp2d(xx, yy, self.map, kind='linear')
-        self._grad_x = scipy.interpolate.interp2d(xx, yy, gx, kind='linear')
-        self._grad_y = scipy.interpolate.interp2d(xx, yy, gy, kind='linear')
-
-        self.map[self.map >= self.INF] = np.inf
+        reachable = np.isfinite(self.map)
+        valid_gradient = np.isfinite(gradient_x) & np.isfinite(gradient_y)
+        axes = (np.arange(height), np.arange(width))
+        self._distance = RegularGridInterpolator(axes, np.stack((
+            np.where(reachable, self.map, 0),
+            ~reachable,
+        ), axis=-1))
+        self._gradient = RegularGridInterpolator(axes, np.stack((
+            np.where(valid_gradient, gradient_x, 0),
+            np.where(valid_gradient, gradient_y, 0),
+            ~valid_gradient,
+        ), axis=-1))
 
     def interpolate(self, x, y):
-        result = self._interp(x, y)
-        result[result >= self.INF / self.F] = np.inf
-        return result
+        """Interpolate the distance to the target at the given points (scalars or arrays of the same shape).
+
+        Points between an unreachable pixel and its neighbors have an infinite distance.
+        Points outside the grid get the value of the closest pixel.
+        """
+        values, shape = self._evaluate(self._distance, x, y)
+        result = np.where(values[:, 1] > 0, np.inf, values[:, 0])
+        return result.reshape(shape)[()]
 
     def gradient(self, x, y):
-        result_x = self._grad_x(x, y)
-        result_y = self._grad_y(x, y)
-        result_x[result_x <= -self.INF / self.F] = -np.inf
-        result_y[result_y <= -self.INF / self.F] = -np.inf
-        result_x[result_x >= self.INF / self.F] = np.inf
-        result_y[result_y >= self.INF / self.F] = np.inf
-        return result_x, result_y
+        """Interpolate the gradient of the distance (per meter) at the given points (scalars or arrays of the same shape).
+
+        The gradient is `nan` next to obstacles and unreachable pixels.
+        """
+        values, shape = self._evaluate(self._gradient, x, y)
+        invalid = values[:, 2] > 0
+        result_x = np.where(invalid, np.nan, values[:, 0])
+        result_y = np.where(invalid, np.nan, values[:, 1])
+        return result_x.reshape(shape)[()], result_y.reshape(shape)[()]
+
+    def _evaluate(self, interpolator: RegularGridInterpolator, x, y) -> tuple[np.ndarray, tuple[int, ...]]:
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        rows, cols = self.grid.to_grid(x.ravel(), y.ravel())
+        rows = np.clip(rows, 0, self.map.shape[0] - 1)
+        cols = np.clip(cols, 0, self.map.shape[1] - 1)
+        return interpolator(np.stack((rows, cols), axis=-1)), x.shape
+
+
+def _lattice_edges(free: np.ndarray, spacing_x: float, spacing_y: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get source and target indices (row-major) and lengths of all edges between 8-connected free pixels."""
+    height, width = free.shape
+    index = np.arange(height * width).reshape(height, width)
+    sources: list[np.ndarray] = []
+    targets: list[np.ndarray] = []
+    weights: list[np.ndarray] = []
+    for dr, dc in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+        rows0, rows1 = slice(0, height - dr), slice(dr, height)
+        cols0, cols1 = slice(max(-dc, 0), width - max(dc, 0)), slice(max(dc, 0), width - max(-dc, 0))
+        both_free = free[rows0, cols0] & free[rows1, cols1]
+        sources.append(index[rows0, cols0][both_free])
+        targets.append(index[rows1, cols1][both_free])
+        weights.append(np.full(np.count_nonzero(both_free), np.hypot(dr * spacing_y, dc * spacing_x)))
+    return np.concatenate(sources), np.concatenate(targets), np.concatenate(weights)
@@ -34,19 +34,18 @@ with ui.pyplot():
 with ui.pyplot():
     rows = np.arange(0, grid.size[0] - 1, 0.2)
     cols = np.arange(0, grid.size[1] - 1, 0.2)
-    xx, yy = grid.from_grid(rows, cols)  # pylint: disable=unpacking-non-sequence
-    interp = distance_map.interpolate(xx, yy).reshape(len(rows), len(cols))
+    xx, yy = grid.from_grid(*np.meshgrid(rows, cols, indexing='ij'))  # pylint: disable=unpacking-non-sequence
+    interp = distance_map.interpolate(xx, yy)
     pl.imshow(interp, cmap=pl.cm.gray, interpolation='nearest', extent=extent, clim=[0, 30])
     pt.show_obstacle_map(obstacle_map)
     pl.autoscale(False)
-    for y in np.linspace(8.0, 11.0, 4):
-        for x in np.linspace(2.0, 14.0, 30):
-            dx, dy = distance_map.gradient(x, y)
-            pl.plot(x, y, 'C2.', ms=3)
-            pl.plot([x, x + dx], [y, y + dy], 'C2', lw=1)
+    x, y = np.meshgrid(np.linspace(2.0, 14.0, 30), np.linspace(8.0, 11.0, 4))
+    dx, dy = distance_map.gradient(x, y)
+    pl.plot(x, y, 'C2.', ms=3)
+    pl.plot([x.ravel(), (x + dx).ravel()], [y.ravel(), (y + dy).ravel()], 'C2', lw=1)
 
 with ui.pyplot():
-    Gx = distance_map.gradient(xx, yy)[0].reshape(len(yy), len(xx))
+    Gx = distance_map.gradient(xx, yy)[0]
     pl.imshow(Gx, cmap=pl.cm.gray, interpolation='nearest', extent=extent, clim=[-1, 1])
     pt.show_obstacle_map(obstacle_map)
 
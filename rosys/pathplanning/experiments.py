@@ -4,16 +4,30 @@ from .grid import Grid
 from .obstacle_map import ObstacleMap
 from .robot_renderer import RobotRenderer
 
+EXPERIMENT_IDS = [1.0, 1.1, 2.0, 4.0, 5.0, 5.1]
+"""IDs of all defined experiments (negative IDs lead to driving backward to the goal)"""
+
+BBOX = (0.0, 0.0, 8.0, 6.0)
+"""world region (x, y, width, height) of all experiments"""
+
+ROBOT_SIZE = (0.77, 1.21, 0.445)
+"""width, length and x shift of the robot in all experiments"""
+
 
 def generate_experiment(id_) -> tuple[RobotRenderer, tuple[float, float, float], tuple[float, float, float], ObstacleMap, bool]:
+    grid = Grid((60, 80, 36), BBOX)
+    robot_renderer = RobotRenderer.from_size(*ROBOT_SIZE)
+    obstacles, pose, goal, backward_to_goal = define_experiment(id_)
+    obstacle_map = ObstacleMap.from_list(grid, obstacles, robot_renderer)
+    return robot_renderer, pose, goal, obstacle_map, backward_to_goal
+
+
+def define_experiment(id_) -> tuple[list[list[float]], tuple[float, float, float], tuple[float, float, float], bool]:
+    """Get the obstacles (x, y, width, height), pose, goal and whether to drive backward to the goal."""
     group = abs(int(id_))
     variant = int(np.round(abs(id_) - group, 1) * 10)
     sign = 1 if id_ >= 0 else -1
 
-    grid = Grid((60, 80, 36), (0.0, 0.0, 8.0, 6.0))
-
-    robot_renderer = RobotRenderer.from_size(0.77, 1.21, 0.445)
-
     if group == 1:
         obstacles = [
             [1.5, 1.5, 0.2, 6.0],
@@ -24,7 +38,6 @@ def generate_experiment(id_) -> tuple[RobotRenderer, tuple[float, float, float],
         ]
         pose = (0.2, 0.75, 0.0)
         goal = (3.0, 3.5, 0.0) if variant == 0 else (0.75, 4.0, -np.pi / 2)
-        obstacle_map = ObstacleMap.from_list(grid, obstacles, robot_renderer)
 
     if group == 2:
         obstacles = [
@@ -33,7 +46,6 @@ def generate_experiment(id_) -> tuple[RobotRenderer, tuple[float, float, float],
         ]
         pose = (0.5, 1.0, 0.0)
         goal = (3.6, 3.5, np.pi / 2)
-        obstacle_map = ObstacleMap.from_list(grid, obstacles, robot_renderer)
 
     if group == 4:
         obstacles = [
@@ -42,7 +54,6 @@ def generate_experiment(id_) -> tuple[RobotRenderer, tuple[float, float, float],
         ]
         pose = (1.0, 3.1, 0.0)
         goal = (7.0, 3.1, np.pi)
-        obstacle_map = ObstacleMap.from_list(grid, obstacles, robot_renderer)
 
     if group == 5:
         obstacles = [
@@ -51,8 +62,7 @@ def generate_experiment(id_) -> tuple[RobotRenderer, tuple[float, float, float],
         ]
         pose = (1.0, 1.0, 0.0 if variant == 0 else np.pi)
         goal = (6.0, 3.5, 0.0 if variant == 0 else np.pi)
-        obstacle_map = ObstacleMap.from_list(grid, obstacles, robot_renderer)
 
     backward_to_goal = sign == -1
 
-    return robot_renderer, pose, goal, obstacle_map, backward_to_goal
+    return obstacles, pose, goal, backward_to_goal
@@ -1,38 +1,178 @@
 from __future__ import annotations
 
+import abc
+import hashlib
+import logging
+import os
 import time
-from typing import Optional, overload
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Sequence
 
 import cv2
 import numpy as np
 from scipy import ndimage
 
+from ..geometry import Point, Spline, SplineArray
 from .area import Area
 from .binary_renderer import BinaryRenderer
 from .grid import Grid
 from .obstacle import Obstacle
 from .robot_renderer import RobotRenderer
 
+CACHE_PATH = Path('~/.rosys/obstacle_maps').expanduser()
+MAX_CACHE_ENTRIES = 10
+CACHE_VERSION = 3
+"""increase whenever the content of cached layer stacks changes"""
 
-class ObstacleMap:
+DISTANCE_DTYPES = ('float64', 'float32', 'float16', 'uint16')
+"""supported data types for storing distances; integer types store centimeters"""
 
-    def __init__(self, grid, map_, robot_renderer, deadline=None) -> None:
+log = logging.getLogger('rosys.obstacle_map')
+
+PixelRect = tuple[int, int, int, int]
+"""A rectangular pixel region (row0, row1, col0, col1) with exclusive upper bounds."""
+
+
+class BaseObstacleMap(abc.ABC):
+    """Lookups of poses and spline tests shared by dense and tiled obstacle maps.
+
+    Subclasses provide a `grid` (which determines the sampling of splines) and the lookups of single poses and positions.
+    """
+    grid: Grid
+
+    @abc.abstractmethod
+    def test(self, x, y, yaw) -> np.ndarray:
+        """Test poses for collisions (returns an array with a leading axis of length 1)."""
+
+    @abc.abstractmethod
+    def get_distance(self, x, y, yaw) -> np.ndarray:
+        """Get the obstacle distance of poses (returns an array with a leading axis of length 1)."""
+
+    @abc.abstractmethod
+    def is_blocked(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Determine whether positions are blocked for every yaw."""
+
+    @abc.abstractmethod
+    def get_obstacle_distances(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the distance of positions to the closest obstacle pixel (ignoring the robot) and its gradient in x and y."""
+
+    def _create_poses(self, splines: list[Spline] | SplineArray,
+                      backward_flags: Optional[Sequence[bool] | np.ndarray] = None) \
+            -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Sample poses along multiple splines with about one sample per grid cell.
+
+        Returns x, y and yaw of all samples (concatenated) and the number of samples per spline.
+        """
+        if backward_flags is None:
+            backward_flags = [False] * len(splines)
+        array = splines if isinstance(splines, SplineArray) else SplineArray.from_splines(splines)
+        yaw_offsets = np.where(backward_flags, np.pi, 0.0)
+        zeros, ones = np.zeros(len(array)), np.ones(len(array))
+        row0, col0, layer0 = self.grid.to_3d_grid(array.x(zeros), array.y(zeros), array.yaw(zeros) + yaw_offsets)
+        row1, col1, layer1 = self.grid.to_3d_grid(array.x(ones), array.y(ones), array.yaw(ones) + yaw_offsets)
+        counts = np.max(np.abs([row1 - row0, col1 - col0, layer1 - layer0]), axis=0).astype(int).reshape(-1)
+        index = np.repeat(np.arange(len(array)), counts)
+        starts = np.cumsum(counts) - counts
+        # NOTE: same values as np.linspace(0, 1, count) for each spline
+        steps = 1.0 / np.maximum(counts - 1, 1)
+        t = (np.arange(len(index)) - starts[index]) * steps[index]
+        t[(starts + counts - 1)[counts > 1]] = 1.0
+        samples = array[index]
+        return samples.x(t), samples.y(t), samples.yaw(t) + yaw_offsets[index], counts
+
+    def test_spline(self, spline: Spline, backward: bool = False) -> bool:
+        return bool(self.test_splines([spline], [backward])[0])
+
+    def test_splines(self, splines: list[Spline] | SplineArray,
+                     backward_flags: Optional[Sequence[bool] | np.ndarray] = None) -> np.ndarray:
+        """Test multiple splines for collisions with a single lookup.
+
+        Returns a boolean array which is true for each spline colliding with an obstacle.
+        """
+        x, y, yaw, counts = self._create_poses(splines, backward_flags)
+        return _reduce_segments(np.logical_or, self.test(x, y, yaw)[0], counts, False)
+
+    def get_minimum_spline_distance(self, spline: Spline, backward: bool = False) -> float:
+        return float(self.get_minimum_spline_distances([spline], [backward])[0])
+
+    def get_minimum_spline_distances(self, splines: list[Spline] | SplineArray,
+                                     backward_flags: Optional[Sequence[bool] | np.ndarray] = None) -> np.ndarray:
+        """Get the minimum obstacle distance along multiple splines with a single lookup.
+
+        Splines which are too short to be sampled have an infinite distance.
+        """
+        x, y, yaw, counts = self._create_poses(splines, backward_flags)
+        return _reduce_segments(np.minimum, self.get_distance(x, y, yaw)[0], counts, np.inf)
+
+
+class ObstacleMap(BaseObstacleMap):
+
+    def __init__(self, grid, map_, robot_renderer, deadline=None, *,
+                 distance_dtype: str = 'float64',
+                 max_distance: float = np.inf,
+                 num_threads: int = 1,
+                 layers: Optional[tuple[np.ndarray, np.ndarray]] = None) -> None:
+        """Create the configuration space of a robot by dilating the map with the robot shape for each yaw layer.
+
+        The distance of each pose to the closest obstacle is stored in `dist_stack`.
+        To save memory, distances can be stored as `float32`, `float16` or `uint16` (in centimeters)
+        and saturated at `max_distance`.
+        With `num_threads` > 1 the layers are created in parallel by a thread pool.
+        """
+        if distance_dtype not in DISTANCE_DTYPES:
+            raise ValueError(f'unsupported distance data type "{distance_dtype}"')
+        if num_threads < 1:
+            raise ValueError('the obstacle map needs at least one thread')
         self.grid = grid
         self.map = map_
-        self.stack = np.zeros(grid.size, dtype=bool)
-        self.dist_stack = np.zeros(self.stack.shape)
-        for layer in range(grid.size[2]):
-            _, _, yaw = grid.from_3d_grid(0, 0, layer)
-            kernel = robot_renderer.render(grid.pixel_size, yaw).astype(np.uint8)
-            self.stack[:, :, layer] = cv2.dilate(self.map.astype(np.uint8), kernel)
-            self.dist_stack[:, :, layer] = \
-                ndimage.distance_transform_edt(~self.stack[:, :, layer]) * grid.pixel_size
-            if deadline and time.time() > deadline:
-                raise TimeoutError('obstacle map creation took too long')
+        self.distance_dtype = distance_dtype
+        self.max_distance = max_distance
+        if np.issubdtype(distance_dtype, np.integer):
+            self.max_distance = min(max_distance, np.iinfo(distance_dtype).max / 100)
+        self.kernel_library = robot_renderer.render_kernels(grid.pixel_size, grid.size[2])
+        self.kernels = self.kernel_library.kernels
+        if layers is not None:
+            self.stack, self.dist_stack = layers
+            return
+
+        # NOTE: when yaw wraps around, map_coordinates should wrap around on axis 2, so we append the first layer
+        self.stack = np.zeros((*grid.size[:2], grid.size[2] + 1), dtype=bool)
+        self.dist_stack = np.zeros(self.stack.shape, dtype=distance_dtype)
+        map_ = self.map.astype(np.uint8)
+        unique_layers = self.kernel_library.unique_layers
+        if num_threads == 1:
+            for layer in unique_layers:
+                self._create_layer(map_, layer, deadline)
+        else:
+            # NOTE: OpenCV and SciPy release the GIL, so the layers are actually computed in parallel
+            with ThreadPoolExecutor(max_workers=num_threads) as executor:
+                list(executor.map(lambda layer: self._create_layer(map_, layer, deadline), unique_layers))
+        for layer in unique_layers:
+            self._copy_to_duplicate_layers(layer, [(0, grid.size[0], 0, grid.size[1])])
+        self.stack[:, :, -1] = self.stack[:, :, 0]
+        self.dist_stack[:, :, -1] = self.dist_stack[:, :, 0]
+        if distance_dtype != 'float64':
+            log.info(f'storing distances as {distance_dtype} needs {self.dist_stack.nbytes / 1e6:.1f} MB '
+                     f'and saves {self.dist_stack.size * 8 / 1e6 - self.dist_stack.nbytes / 1e6:.1f} MB')
 
-        # NOTE: when yaw wraps around, map_coordinates should wrap around on axis 2
-        self.stack = np.dstack((self.stack, self.stack[:, :, :1]))
-        self.dist_stack = np.dstack((self.dist_stack, self.dist_stack[:, :, :1]))
+    def _create_layer(self, map_: np.ndarray, layer: int, deadline: Optional[float]) -> None:
+        if deadline and time.time() > deadline:
+            raise TimeoutError('obstacle map creation took too long')
+        self.stack[:, :, layer] = cv2.dilate(map_, self.kernels[layer])
+        self.dist_stack[:, :, layer] = \
+            self._quantize(ndimage.distance_transform_edt(~self.stack[:, :, layer]) * self.grid.pixel_size)
+        if deadline and time.time() > deadline:
+            raise TimeoutError('obstacle map creation took too long')
+
+    def _copy_to_duplicate_layers(self, source: int, rects: list[PixelRect]) -> None:
+        """Copy regions of a layer to all layers with an identical kernel (e.g. of point-symmetric robots)."""
+        for layer in self.kernel_library.get_duplicates(source):
+            for rect in rects:
+                self.stack[rect[0]:rect[1], rect[2]:rect[3], layer] = self.stack[rect[0]:rect[1], rect[2]:rect[3], source]
+                self.dist_stack[rect[0]:rect[1], rect[2]:rect[3], layer] = \
+                    self.dist_stack[rect[0]:rect[1], rect[2]:rect[3], source]
 
     @staticmethod
     def from_list(grid, obstacles, robot_renderer) -> ObstacleMap:
@@ -49,55 +189,331 @@ class ObstacleMap:
                    areas: list[Area],
                    obstacles: list[Obstacle],
                    grid: Grid,
-                   deadline: Optional[float] = None) -> ObstacleMap:
+                   deadline: Optional[float] = None,
+                   *,
+                   distance_dtype: str = 'float64',
+                   max_distance: float = np.inf,
+                   num_threads: int = 1,
+                   use_cache: bool = False) -> ObstacleMap:
+        """Render the world into an obstacle map.
+
+        See the constructor for a description of `distance_dtype`, `max_distance` and `num_threads`.
+        If `use_cache` is set, the layer stacks are stored in `CACHE_PATH` and memory-mapped when the same world is requested again,
+        e.g. by a restarted planner process.
+        The mapping is copy-on-write, so multiple processes share the same memory pages as long as the map is not updated.
+        """
         robot_renderer = RobotRenderer(robot_outline)
-        has_areas = any(len(a.outline) > 2 for a in areas)
-        binary_renderer = BinaryRenderer(grid.size[:2], fill_value=has_areas)
-        for area in areas:
-            binary_renderer.polygon(np.array([grid.to_grid(p.x, p.y)[::-1] for p in area.outline]), False)
-            if deadline and time.time() > deadline:
-                raise TimeoutError('obstacle map creation took too long')
-        for obstacle in obstacles:
-            binary_renderer.polygon(np.array([grid.to_grid(p.x, p.y)[::-1] for p in obstacle.outline]))
-            if deadline and time.time() > deadline:
-                raise TimeoutError('obstacle map creation took too long')
-        return ObstacleMap(grid, binary_renderer.map, robot_renderer, deadline)
+        key = _cache_key(robot_outline, areas, obstacles, grid, distance_dtype, max_distance) if use_cache else None
+        if key is not None:
+            cached = _load_from_cache(key)
+            if cached is not None:
+                map_, stack, dist_stack = cached
+                return ObstacleMap(grid, map_, robot_renderer, distance_dtype=distance_dtype, max_distance=max_distance,
+                                   layers=(stack, dist_stack))
+        map_ = _render_world(grid, areas, obstacles, (0, grid.size[0], 0, grid.size[1]), deadline)
+        obstacle_map = ObstacleMap(grid, map_, robot_renderer, deadline,
+                                   distance_dtype=distance_dtype, max_distance=max_distance, num_threads=num_threads)
+        if key is not None:
+            _store_in_cache(key, obstacle_map)
+        return obstacle_map
 
-    def test(self, x, y, yaw):
-        row, col, layer = self.grid.to_3d_grid(x, y, yaw)
-        return ndimage.map_coordinates(self.stack, [[row], [col], [layer]], order=0)
+    @property
+    def kernel_radius(self) -> int:
+        """the number of pixels the robot kernel reaches from its center"""
+        return max(kernel.shape[0] // 2 for kernel in self.kernels)
+
+    def to_pixel_rect(self, x: float, y: float, width: float, height: float, *, padding: int = 0) -> PixelRect:
+        """Convert a world bounding box into a pixel region, padded by a number of pixels and clipped to the grid."""
+        row0, col0 = self.grid.to_grid(x, y)
+        row1, col1 = self.grid.to_grid(x + width, y + height)
+        return _clip_rect((int(np.floor(row0)) - padding, int(np.ceil(row1)) + 1 + padding,
+                           int(np.floor(col0)) - padding, int(np.ceil(col1)) + 1 + padding), self.grid.size)
 
-    t_lookup = [np.linspace(0, 1, i) for i in range(360)]
+    def update(self,
+               areas: list[Area],
+               obstacles: list[Obstacle],
+               regions: list[tuple[float, float, float, float]],
+               deadline: Optional[float] = None) -> list[PixelRect]:
+        """Re-render the given world regions (x, y, width, height) and update all layers accordingly.
 
-    def _create_poses(self, spline, backward) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
-        @overload
-        def pose(t: float) -> tuple[float, float, float]: ...
+        Only the affected parts of each layer are dilated again.
+        Distances are recomputed within a window around all pixels whose nearest obstacle might have changed.
+        If this window does not contain the nearest obstacle of each of these pixels, the whole layer is recomputed.
 
-        @overload
-        def pose(t: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]: ...
+        :return: the pixel regions in which the layer stacks might have changed
+        """
+        rects = [self.to_pixel_rect(*region, padding=1) for region in regions]
+        for rect in rects:
+            self.map[rect[0]:rect[1], rect[2]:rect[3]] = _render_world(self.grid, areas, obstacles, rect, deadline)
+        return self._update_layers(rects, deadline)
 
-        def pose(t: float | np.ndarray) -> tuple[float | np.ndarray, float | np.ndarray, float | np.ndarray]:
-            return (
-                spline.x(t),
-                spline.y(t),
-                spline.yaw(t) + [0, np.pi][backward],
-            )
+    def grow(self,
+             areas: list[Area],
+             obstacles: list[Obstacle],
+             padding: PixelRect,
+             deadline: Optional[float] = None) -> list[PixelRect]:
+        """Enlarge the grid by the given numbers of pixels (rows before, rows after, columns before, columns after).
 
-        row0, col0, layer0 = self.grid.to_3d_grid(*pose(0.0))
-        row1, col1, layer1 = self.grid.to_3d_grid(*pose(1.0))
-        num_rows = int(abs(row1 - row0))
-        num_cols = int(abs(col1 - col0))
-        num_layers = int(abs(layer1 - layer0))
-        n = max(num_rows, num_cols, num_layers)
-        t = ObstacleMap.t_lookup[n] if n < len(ObstacleMap.t_lookup) else np.linspace(0, 1, n)
-        return pose(t)
+        The existing layer stacks are copied into larger arrays and only the new margin of the map is rendered and dilated.
+        Distances are recomputed for the whole grid, because the margin usually affects most of them anyway.
+
+        :return: the pixel regions (of the enlarged grid) in which the layer stacks might have changed
+        """
+        height, width, num_layers = self.grid.size
+        spacing_x = self.grid.bbox[2] / width
+        spacing_y = self.grid.bbox[3] / height
+        new_height = height + padding[0] + padding[1]
+        new_width = width + padding[2] + padding[3]
+        self.grid = Grid((new_height, new_width, num_layers), (self.grid.bbox[0] - padding[2] * spacing_x,
+                                                               self.grid.bbox[1] - padding[0] * spacing_y,
+                                                               new_width * spacing_x,
+                                                               new_height * spacing_y))
+        old = (padding[0], padding[0] + height, padding[2], padding[2] + width)
+        map_ = np.zeros((new_height, new_width), dtype=bool)
+        map_[old[0]:old[1], old[2]:old[3]] = self.map
+        stack = np.zeros((new_height, new_width, num_layers + 1), dtype=bool)
+        stack[old[0]:old[1], old[2]:old[3]] = self.stack
+        dist_stack = np.zeros(stack.shape, dtype=self.distance_dtype)
+        dist_stack[old[0]:old[1], old[2]:old[3]] = self.dist_stack
+        self.map, self.stack, self.dist_stack = map_, stack, dist_stack
+
+        # NOTE: the renderer skips the last row and column of a grid, so the old border is rendered again
+        inner = (old[0] + (2 if padding[0] else 0), old[1] - (2 if padding[1] else 0),
+                 old[2] + (2 if padding[2] else 0), old[3] - (2 if padding[3] else 0))
+        margin = [
+            (0, inner[0], 0, new_width),
+            (inner[1], new_height, 0, new_width),
+            (inner[0], inner[1], 0, inner[2]),
+            (inner[0], inner[1], inner[3], new_width),
+        ]
+        rects = [rect for rect in margin if rect[1] > rect[0] and rect[3] > rect[2]]
+        for rect in rects:
+            self.map[rect[0]:rect[1], rect[2]:rect[3]] = _render_world(self.grid, areas, obstacles, rect, deadline)
+        return self._update_layers(rects, deadline, full_distances=True)
+
+    def _update_layers(self, map_rects: list[PixelRect], deadline: Optional[float], *,
+                       full_distances: bool = False) -> list[PixelRect]:
+        """Dilate the given map regions again and update the distances (of the whole grid if `full_distances` is set)."""
+        r = self.kernel_radius
+        stack_rects = [_clip_rect(_pad_rect(rect, r), self.grid.size) for rect in map_rects]
+        dirty_distance = None if full_distances else _rect_distance(stack_rects, self.grid.size) * self.grid.pixel_size
+        for layer in self.kernel_library.unique_layers:
+            kernel = self.kernels[layer]
+            for rect in stack_rects:
+                window = _clip_rect(_pad_rect(rect, r), self.grid.size)
+                dilated = cv2.dilate(self.map[window[0]:window[1], window[2]:window[3]].astype(np.uint8), kernel)
+                self.stack[rect[0]:rect[1], rect[2]:rect[3], layer] = \
+                    dilated[rect[0] - window[0]:rect[1] - window[0], rect[2] - window[2]:rect[3] - window[2]]
+            if dirty_distance is None:
+                self.dist_stack[:, :, layer] = \
+                    self._quantize(ndimage.distance_transform_edt(~self.stack[:, :, layer]) * self.grid.pixel_size)
+                distance_rect: Optional[PixelRect] = (0, self.grid.size[0], 0, self.grid.size[1])
+            else:
+                distance_rect = self._update_distances(layer, dirty_distance)
+            self._copy_to_duplicate_layers(layer, stack_rects + ([distance_rect] if distance_rect else []))
+            if deadline and time.time() > deadline:
+                raise TimeoutError('obstacle map update took too long')
+        self.stack[:, :, -1] = self.stack[:, :, 0]
+        self.dist_stack[:, :, -1] = self.dist_stack[:, :, 0]
+        return stack_rects
 
-    def test_spline(self, spline, backward=False) -> bool:
-        return self.test(*self._create_poses(spline, backward)).any()
+    def _update_distances(self, layer: int, dirty_distance: np.ndarray) -> Optional[PixelRect]:
+        """Update the distances of a layer and return the region in which they might have changed."""
+        # NOTE: only pixels which are at least as close to a changed pixel as to their nearest obstacle are affected
+        # (with some tolerance for quantized distances)
+        old_distance = self._dequantize(self.dist_stack[:, :, layer]) * 1.001 + 0.01
+        affected = dirty_distance <= old_distance
+        rows = np.flatnonzero(affected.any(axis=1))
+        cols = np.flatnonzero(affected.any(axis=0))
+        if not len(rows):
+            return None
+        padding = int(np.ceil(old_distance[affected].max() / self.grid.pixel_size)) + 1
+        window = _clip_rect((rows[0] - padding, rows[-1] + 1 + padding, cols[0] - padding, cols[-1] + 1 + padding),
+                            self.grid.size)
+        blocked = self.stack[window[0]:window[1], window[2]:window[3], layer]
+        if blocked.any():
+            distances = np.minimum(ndimage.distance_transform_edt(~blocked) * self.grid.pixel_size, self.max_distance)
+            window_affected = affected[window[0]:window[1], window[2]:window[3]]
+            border_distance = _border_distance(window, self.grid.size) * self.grid.pixel_size
+            if np.all(distances[window_affected] <= border_distance[window_affected]):
+                self.dist_stack[window[0]:window[1], window[2]:window[3], layer][window_affected] = \
+                    self._quantize(distances[window_affected])
+                return window
+        self.dist_stack[:, :, layer] = \
+            self._quantize(ndimage.distance_transform_edt(~self.stack[:, :, layer]) * self.grid.pixel_size)
+        return (0, self.grid.size[0], 0, self.grid.size[1])
+
+    def _quantize(self, distances: np.ndarray) -> np.ndarray:
+        distances = np.minimum(distances, self.max_distance)
+        if np.issubdtype(self.distance_dtype, np.integer):
+            return np.round(distances * 100).astype(self.distance_dtype)
+        return distances.astype(self.distance_dtype)
+
+    def _dequantize(self, values: np.ndarray) -> np.ndarray:
+        if np.issubdtype(self.distance_dtype, np.integer):
+            return values * 0.01
+        return values.astype(float)
+
+    def test(self, x, y, yaw) -> np.ndarray:
+        row, col, layer = self.grid.to_3d_grid(x, y, yaw)
+        return _lookup(self.stack, row, col, layer)
 
     def get_distance(self, x, y, yaw) -> np.ndarray:
         row, col, layer = self.grid.to_3d_grid(x, y, yaw)
-        return ndimage.map_coordinates(self.dist_stack, [[row], [col], [layer]], order=0)
+        return self._dequantize(_lookup(self.dist_stack, row, col, layer))
+
+    def is_blocked(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        rows, cols = self.grid.to_grid(x, y)
+        rows = np.clip(np.round(rows).astype(int), 0, self.grid.size[0] - 1)
+        cols = np.clip(np.round(cols).astype(int), 0, self.grid.size[1] - 1)
+        return self.stack[rows, cols, :].all(axis=-1)
+
+    def get_obstacle_distances(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        rows, cols = self.grid.to_grid(x, y)
+        distance = ndimage.distance_transform_edt(1 - self.map) * self.grid.pixel_size
+        gradient_y, gradient_x = np.gradient(distance)
+
+        def sample(values: np.ndarray) -> np.ndarray:
+            return ndimage.map_coordinates(values, [[rows], [cols]], order=0).reshape(np.shape(x))
+        return sample(distance), sample(gradient_x), sample(gradient_y)
+
+
+def _render_world(grid: Grid,
+                  areas: list[Area],
+                  obstacles: list[Obstacle],
+                  rect: PixelRect,
+                  deadline: Optional[float] = None) -> np.ndarray:
+    """Render areas and obstacles into a binary map covering the given pixel region of the grid."""
+    # NOTE: the renderer skips its last row and column, so we render a slightly larger window
+    window = _clip_rect(_pad_rect(rect, 2), grid.size)
+    has_areas = any(len(a.outline) > 2 for a in areas)
+    binary_renderer = BinaryRenderer((window[1] - window[0], window[3] - window[2]), fill_value=has_areas)
+    offset = np.array([window[2], window[0]])
+    for area in areas:
+        binary_renderer.polygon(_to_pixels(grid, area.outline) - offset, False)
+        if deadline and time.time() > deadline:
+            raise TimeoutError('obstacle map creation took too long')
+    for obstacle in obstacles:
+        binary_renderer.polygon(_to_pixels(grid, obstacle.outline) - offset)
+        if deadline and time.time() > deadline:
+            raise TimeoutError('obstacle map creation took too long')
+    return binary_renderer.map[rect[0] - window[0]:rect[1] - window[0], rect[2] - window[2]:rect[3] - window[2]]
+
+
+def _to_pixels(grid: Grid, outline: list[Point]) -> np.ndarray:
+    return np.array([grid.to_grid(p.x, p.y)[::-1] for p in outline]).reshape(-1, 2)
+
+
+def _reduce_segments(ufunc: np.ufunc, values: np.ndarray, counts: np.ndarray, empty_value) -> np.ndarray:
+    """Reduce consecutive segments of the given lengths with a ufunc like `np.minimum` or `np.logical_or`."""
+    result = np.full(len(counts), empty_value, dtype=np.result_type(values, empty_value))
+    nonempty = counts > 0
+    if nonempty.any():
+        result[nonempty] = ufunc.reduceat(values, (np.cumsum(counts) - counts)[nonempty])
+    return result
+
+
+def _lookup(array: np.ndarray, row, col, layer) -> np.ndarray:
+    """Look up the nearest array elements like `ndimage.map_coordinates` with `order=0`, but for any data type."""
+    coordinates = [np.ravel(row), np.ravel(col), np.ravel(layer)]
+    valid = np.ones(len(coordinates[0]), dtype=bool)
+    for c, n in zip(coordinates, array.shape):
+        valid &= (c >= 0) & (c <= n - 1)  # NOTE: like mode='constant' with cval=0
+    indices = tuple(np.floor(c[valid] + 0.5).astype(int) for c in coordinates)
+    result = np.zeros(len(valid), dtype=array.dtype)
+    result[valid] = array[indices]
+    return result.reshape((1, *np.shape(row)))
+
+
+def _cache_key(robot_outline: list[tuple[float, float]],
+               areas: list[Area],
+               obstacles: list[Obstacle],
+               grid: Grid,
+               distance_dtype: str,
+               max_distance: float) -> str:
+    sha = hashlib.sha256()
+    sha.update(np.array([CACHE_VERSION, *grid.size], dtype=np.int64).tobytes())
+    sha.update(np.array([*grid.bbox, max_distance], dtype=float).tobytes())
+    sha.update(distance_dtype.encode())
+    sha.update(np.array(robot_outline, dtype=float).tobytes())
+    polygon_lists: list[tuple[bytes, list[Area] | list[Obstacle]]] = [(b'areas', areas), (b'obstacles', obstacles)]
+    for label, polygons in polygon_lists:
+        sha.update(label)
+        for polygon in polygons:
+            sha.update(np.array([(p.x, p.y) for p in polygon.outline], dtype=float).tobytes() + b';')
+    return sha.hexdigest()
+
+
+def _cache_files(key: str) -> tuple[Path, Path, Path]:
+    return CACHE_PATH / f'{key}.map.npy', CACHE_PATH / f'{key}.dist_stack.npy', CACHE_PATH / f'{key}.stack.npy'
+
+
+def _load_from_cache(key: str) -> Optional[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    map_file, dist_stack_file, stack_file = _cache_files(key)
+    if not stack_file.exists():  # NOTE: the stack file is written last
+        return None
+    try:
+        map_ = np.load(map_file, mmap_mode='c')
+        dist_stack = np.load(dist_stack_file, mmap_mode='c')
+        stack = np.load(stack_file, mmap_mode='c')
+        stack_file.touch()  # NOTE: keep recently used entries when pruning the cache
+    except (OSError, ValueError):
+        log.exception(f'could not load obstacle map "{key}" from cache')
+        return None
+    return map_, stack, dist_stack
+
+
+def _store_in_cache(key: str, obstacle_map: ObstacleMap) -> None:
+    try:
+        CACHE_PATH.mkdir(parents=True, exist_ok=True)
+        for path, array in zip(_cache_files(key), [obstacle_map.map, obstacle_map.dist_stack, obstacle_map.stack]):
+            tmp_path = path.with_name(f'{uuid.uuid4()}.tmp.npy')
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)  # NOTE: other processes should never see partially written files
+        _prune_cache()
+    except OSError:
+        log.exception(f'could not store obstacle map "{key}" in cache')
+
+
+def _prune_cache() -> None:
+    stack_files = sorted(CACHE_PATH.glob('*.stack.npy'), key=lambda path: path.stat().st_mtime, reverse=True)
+    for stack_file in stack_files[MAX_CACHE_ENTRIES:]:
+        key = stack_file.name.removesuffix('.stack.npy')
+        for path in _cache_files(key):
+            path.unlink(missing_ok=True)
+
+
+def _pad_rect(rect: PixelRect, padding: int) -> PixelRect:
+    return rect[0] - padding, rect[1] + padding, rect[2] - padding, rect[3] + padding
+
+
+def _clip_rect(rect: PixelRect, size: tuple[int, ...]) -> PixelRect:
+    return max(rect[0], 0), min(rect[1], size[0]), max(rect[2], 0), min(rect[3], size[1])
+
+
+def _rect_distance(rects: list[PixelRect], size: tuple[int, ...]) -> np.ndarray:
+    """Compute the pixel distance of each grid pixel to the nearest of the given regions."""
+    rows = np.arange(size[0])[:, np.newaxis]
+    cols = np.arange(size[1])[np.newaxis, :]
+    distance = np.full(size[:2], np.inf)
+    for row0, row1, col0, col1 in rects:
+        dr = np.maximum(np.maximum(row0 - rows, rows - (row1 - 1)), 0)
+        dc = np.maximum(np.maximum(col0 - cols, cols - (col1 - 1)), 0)
+        distance = np.minimum(distance, np.sqrt(dr**2 + dc**2))
+    return distance
+
 
-    def get_minimum_spline_distance(self, spline, backward=False) -> float:
-        return self.get_distance(*self._create_poses(spline, backward)).min()
+def _border_distance(window: PixelRect, size: tuple[int, ...]) -> np.ndarray:
+    """Compute the pixel distance of each window pixel to the nearest grid pixel outside of the window."""
+    rows = np.arange(window[0], window[1])[:, np.newaxis]
+    cols = np.arange(window[2], window[3])[np.newaxis, :]
+    distance = np.full((window[1] - window[0], window[3] - window[2]), np.inf)
+    if window[0] > 0:
+        distance = np.minimum(distance, rows - window[0] + 1)
+    if window[1] < size[0]:
+        distance = np.minimum(distance, window[1] - rows)
+    if window[2] > 0:
+        distance = np.minimum(distance, cols - window[2] + 1)
+    if window[3] < size[1]:
+        distance = np.minimum(distance, window[3] - cols)
+    return distance
@@ -1,47 +1,100 @@
 import asyncio
 import logging
 import time
-from copy import copy
+from collections import defaultdict, deque
+from copy import copy, deepcopy
+from dataclasses import dataclass, field
 from multiprocessing import Pipe
-from typing import Any
+from multiprocessing.connection import Connection
+from typing import Any, Optional, TypeVar
+
+import numpy as np
 
 from .. import persistence, rosys, run
 from ..driving import PathSegment
 from ..event import Event
 from ..geometry import Point, Pose, Prism, Spline
 from .area import Area
+from .delaunay_planner import PlannerParameters
 from .obstacle import Obstacle
 from .planner_process import (PlannerCommand, PlannerGrowMapCommand, PlannerObstacleDistanceCommand, PlannerProcess,
-                              PlannerResponse, PlannerSearchCommand, PlannerTestCommand)
+                              PlannerResponse, PlannerSearchCommand, PlannerTestCommand, PlannerWorldUpdate)
+
+T = TypeVar('T', Area, Obstacle)
+
+
+@dataclass(slots=True, kw_only=True)
+class PlannerWorker:
+    process: PlannerProcess
+    connection: Connection
+    pending: dict[str, bool] = field(default_factory=dict)
+    """ids of the commands which have been sent to the process and whether they are expensive (searching or growing the map)"""
+    search_cache_hits: int = 0
+    search_cache_misses: int = 0
+    """search cache statistics of the process as of its latest response"""
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.pending)
+
+    @property
+    def is_busy(self) -> bool:
+        return any(self.pending.values())
 
 
 class PathPlanner(persistence.PersistentModule):
-    """This module runs a path planning algorithm in a separate process.
+    """This module runs a path planning algorithm in separate processes.
 
     If given, the algorithm respects the given robot shape as well as a dictionary of accessible areas and a dictionary of obstacles, both of which a backed up and restored automatically.
     The path planner can search paths, check if a spline interferes with obstacles and get the distance of a pose to any obstacle.
+    Optional `parameters` allow tuning the planning algorithm.
+
+    With `num_workers` > 1 a pool of planner processes is used,
+    so that cheap queries like `test_spline` are answered by idle workers instead of waiting for running searches.
+    Each worker holds its own obstacle map.
+    With `cache_obstacle_maps` one worker creates each map and the others memory-map it from the disk cache
+    instead of creating it again (see `PlannerParameters.cache_obstacle_maps` for the size of the cache).
+
+    Areas and obstacles are sent to the planner processes as deltas whenever `AREAS_CHANGED` or `OBSTACLES_CHANGED` are emitted,
+    so that queries only need to refer to the current world version.
+    Areas and obstacles which are added, replaced or removed without emitting an event are sent with the next query.
     """
 
-    def __init__(self, robot_shape: Prism) -> None:
+    def __init__(self, robot_shape: Prism, parameters: Optional[PlannerParameters] = None, *, num_workers: int = 1) -> None:
         super().__init__()
 
         self.log = logging.getLogger('rosys.path_planner')
+        self.parameters = parameters or PlannerParameters()
 
-        self.connection, process_connection = Pipe()
-        self.process = PlannerProcess(process_connection, robot_shape.outline)
-        self.responses: dict[str, Any] = {}
+        if num_workers < 1:
+            raise ValueError('the path planner needs at least one worker')
+        self.workers: list[PlannerWorker] = []
+        for _ in range(num_workers):
+            connection, process_connection = Pipe()
+            process = PlannerProcess(process_connection, robot_shape.outline, self.parameters)
+            self.workers.append(PlannerWorker(process=process, connection=connection))
+        self.futures: dict[str, asyncio.Future] = {}
+        self.round_trip_times: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=1000))
+        """recent round-trip times of planner commands in seconds (by command type)"""
 
         self.obstacles: dict[str, Obstacle] = {}
         self.areas: dict[str, Area] = {}
+        self.world_version = 0
+        """version of the areas and obstacles which have been sent to the planner processes"""
+        self.sent_areas: dict[str, tuple[Area, Area]] = {}
+        self.sent_obstacles: dict[str, tuple[Obstacle, Obstacle]] = {}
+        self.is_running = False
 
         self.OBSTACLES_CHANGED = Event()
         """the obstacles have changed (argument: dictionary of obstacles)"""
         self.AREAS_CHANGED = Event()
         """the areas have changed (argument: list of areas that have changed, can be None for all areas)"""
 
+        self.AREAS_CHANGED.register(self._handle_world_change)
+        self.OBSTACLES_CHANGED.register(self._handle_world_change)
+
         rosys.on_startup(self.startup)
         rosys.on_shutdown(self.shutdown)
-        rosys.on_repeat(self.step, 0.1)
 
     def backup(self) -> dict:
         finished_areas = {area_id: copy(area).close() for area_id, area in self.areas.items() if len(area.outline) >= 3}
@@ -56,75 +109,167 @@ class PathPlanner(persistence.PersistentModule):
         self.AREAS_CHANGED.emit(None)
         self.OBSTACLES_CHANGED.emit(self.obstacles)
 
+    @property
+    def queue_depths(self) -> list[int]:
+        """number of unanswered commands for each worker"""
+        return [worker.queue_depth for worker in self.workers]
+
+    @property
+    def latency_stats(self) -> dict[str, dict[str, float]]:
+        """number, mean, median and maximum of recent round-trip times in seconds (by command type)"""
+        return {
+            command_type: {
+                'count': len(times),
+                'mean': float(np.mean(times)),
+                'median': float(np.median(times)),
+                'max': float(np.max(times)),
+            }
+            for command_type, times in self.round_trip_times.items() if times
+        }
+
+    @property
+    def search_cache_stats(self) -> dict[str, int]:
+        """number of searches answered from the search caches of all workers (hits) and of those which were not"""
+        return {
+            'hits': sum(worker.search_cache_hits for worker in self.workers),
+            'misses': sum(worker.search_cache_misses for worker in self.workers),
+        }
+
     def startup(self) -> None:
-        self.process.start()
+        loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            worker.process.start()
+            loop.add_reader(worker.connection.fileno(), self._receive, worker)
+        self.is_running = True
+        self._update_world(deep=True)
 
     async def shutdown(self) -> None:
-        self.log.info('stopping planner process...')
-        self.connection.close()
-        self.process.connection.close()
-        self.process.join(5)
-        if self.process.is_alive():
-            self.process.terminate()
-        else:
-            if self.process.exitcode:
-                self.log.info(f'bad exitcode for process: {self.process.exitcode}')
-        self.log.info(f'teardown of {self.process} completed')
-
-    async def step(self) -> None:
+        self.is_running = False
+        for worker in self.workers:
+            self.log.info('stopping planner process...')
+            if not worker.connection.closed:
+                asyncio.get_running_loop().remove_reader(worker.connection.fileno())
+            worker.connection.close()
+            worker.process.connection.close()
+            worker.process.join(5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            else:
+                if worker.process.exitcode:
+                    self.log.info(f'bad exitcode for process: {worker.process.exitcode}')
+            self.log.info(f'teardown of {worker.process} completed')
+
+    def _receive(self, worker: PlannerWorker) -> None:
+        """Deliver all available responses of a worker (called by the event loop when its connection is readable)."""
         try:
-            if self.connection.poll():
-                response = self.connection.recv()
+            while worker.connection.poll():
+                response = worker.connection.recv()
                 assert isinstance(response, PlannerResponse)
-                if time.time() < response.deadline:
-                    self.responses[response.id] = response.content
-        except OSError as e:
-            if 'handle is closed' in str(e):
+                worker.pending.pop(response.id, None)
+                worker.search_cache_hits = response.search_cache_hits
+                worker.search_cache_misses = response.search_cache_misses
+                future = self.futures.pop(response.id, None)
+                if future is not None and not future.done():
+                    future.set_result(response.content)
+        except (EOFError, OSError) as e:
+            if isinstance(e, EOFError) or 'handle is closed' in str(e):
                 self.log.info('path planner process connection closed')
+                asyncio.get_running_loop().remove_reader(worker.connection.fileno())
+                worker.pending.clear()  # NOTE: the process will not answer any more, so it should not look busy
             else:
                 raise
 
+    def _handle_world_change(self, _: Any) -> None:
+        self._update_world(deep=True)
+
+    def _update_world(self, *, deep: bool = False) -> None:
+        """Send added, changed and removed areas and obstacles to all planner processes.
+
+        By default only areas and obstacles which have been added, replaced or removed are detected.
+        With `deep` they are also compared with copies of their last sent state to detect modifications in place.
+        """
+        if not self.is_running:
+            return
+        areas, removed_areas = _find_changes(self.areas, self.sent_areas, deep=deep)
+        obstacles, removed_obstacles = _find_changes(self.obstacles, self.sent_obstacles, deep=deep)
+        if not areas and not removed_areas and not obstacles and not removed_obstacles:
+            return
+        self.world_version += 1
+        update = PlannerWorldUpdate(version=self.world_version,
+                                    areas=areas, removed_areas=removed_areas,
+                                    obstacles=obstacles, removed_obstacles=removed_obstacles)
+        for worker in self.workers:
+            worker.connection.send(update)
+
     async def grow_map(self, points: list[Point], timeout: float = 3.0) -> None:
-        return await self._call(PlannerGrowMapCommand(
-            points=points,
-            deadline=time.time()+timeout,
-        ))
+        deadline = time.time() + timeout
+        workers = sorted(self.workers, key=lambda worker: worker.queue_depth)
+        if self.parameters.cache_obstacle_maps and len(workers) > 1:
+            # NOTE: let the first worker create the map, so that the others can load it from the cache
+            await self._call(PlannerGrowMapCommand(points=points, deadline=deadline), workers[0])
+            workers = workers[1:]
+        await asyncio.gather(*[self._call(PlannerGrowMapCommand(points=points, deadline=deadline), worker)
+                               for worker in workers])
 
     async def search(self, *, start: Pose, goal: Pose, timeout: float = 3.0) -> list[PathSegment]:
+        self._update_world()
         return await self._call(PlannerSearchCommand(
-            areas=list(self.areas.values()),
-            obstacles=list(self.obstacles.values()),
+            world_version=self.world_version,
             start=start,
             goal=goal,
             deadline=time.time()+timeout,
         ))
 
     async def test_spline(self, spline: Spline, timeout: float = 3.0) -> bool:
+        self._update_world()
         return await self._call(PlannerTestCommand(
-            areas=list(self.areas.values()),
-            obstacles=list(self.obstacles.values()),
+            world_version=self.world_version,
             spline=spline,
             deadline=time.time()+timeout,
         ))
 
     async def get_obstacle_distance(self, pose: Pose, timeout: float = 3.0) -> float:
+        self._update_world()
         return await self._call(PlannerObstacleDistanceCommand(
-            areas=list(self.areas.values()),
-            obstacles=list(self.obstacles.values()),
+            world_version=self.world_version,
             pose=pose,
             deadline=time.time()+timeout,
         ))
 
-    async def _call(self, command: PlannerCommand, check_interval: float = 0.1) -> Any:
+    def _select_worker(self, command: PlannerCommand) -> PlannerWorker:
+        if isinstance(command, (PlannerTestCommand, PlannerObstacleDistanceCommand)):
+            return min(self.workers, key=lambda worker: (worker.is_busy, worker.queue_depth))
+        return min(self.workers, key=lambda worker: worker.queue_depth)
+
+    async def _call(self, command: PlannerCommand, worker: Optional[PlannerWorker] = None) -> Any:
         with run.cpu():
-            self.connection.send(command)
-            while command.id not in self.responses:
-                if time.time() > command.deadline:
-                    raise TimeoutError(f'process call {command.id} did not respond in time')
-                if rosys.is_test:
-                    await self.step()  # NOTE: otherwise step() is not called while awaiting response
-                await asyncio.sleep(check_interval)
-            result = self.responses.pop(command.id)
+            worker = worker or self._select_worker(command)
+            future = asyncio.get_running_loop().create_future()
+            self.futures[command.id] = future
+            start = time.perf_counter()
+            worker.connection.send(command)
+            worker.pending[command.id] = isinstance(command, (PlannerSearchCommand, PlannerGrowMapCommand))
+            try:
+                result = await asyncio.wait_for(future, timeout=max(command.deadline - time.time(), 0))
+            except asyncio.TimeoutError:
+                raise TimeoutError(f'process call {command.id} did not respond in time') from None
+            finally:
+                self.futures.pop(command.id, None)
+            self.round_trip_times[type(command).__name__].append(time.perf_counter() - start)
             if isinstance(result, Exception):
                 raise result
             return result
+
+
+def _find_changes(items: dict[str, T], sent_items: dict[str, tuple[T, T]], *, deep: bool) -> tuple[dict[str, T], list[str]]:
+    """Find changed and removed items and update the sent items (pairs of the original item and a copy) accordingly."""
+    changed = {
+        key: item for key, item in items.items()
+        if key not in sent_items or sent_items[key][0] is not item or (deep and sent_items[key][1] != item)
+    }
+    removed = [key for key in sent_items if key not in items]
+    for key in removed:
+        del sent_items[key]
+    for key, item in changed.items():
+        sent_items[key] = (item, deepcopy(item))
+    return changed, removed
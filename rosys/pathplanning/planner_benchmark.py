@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+import argparse
+import fnmatch
+import importlib
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+from rosys.geometry import Point, Pose
+from rosys.pathplanning.area import Area
+from rosys.pathplanning.delaunay_planner import DelaunayPlanner, PlannerParameters
+from rosys.pathplanning.distance_map import DistanceMap
+from rosys.pathplanning.experiments import BBOX, EXPERIMENT_IDS, ROBOT_SIZE, define_experiment
+from rosys.pathplanning.grid import Grid
+from rosys.pathplanning.obstacle import Obstacle
+from rosys.pathplanning.obstacle_map import ObstacleMap
+from rosys.pathplanning.robot_renderer import RobotRenderer
+from rosys.pathplanning.steps import Path as StepPath
+
+
+@dataclass(slots=True, kw_only=True)
+class Scenario:
+    name: str
+    bbox: tuple[float, float, float, float]
+    """world region (x, y, width, height) which is repeated when scaling the scenario"""
+    robot_outline: list[tuple[float, float]]
+    areas: list[Area]
+    obstacles: list[Obstacle]
+    start: Pose
+    goal: Pose
+
+    def scaled(self, scale: int) -> 'Scenario':
+        """Tile the scenario `scale` x `scale` times and move the goal into the last tile.
+
+        Note that tiles of scenarios with areas might not be connected, so that the search fails (see `path_found`).
+        """
+        if scale == 1:
+            return self
+        min_x, min_y, width, height = self.bbox
+        offsets = [(i * width, j * height) for i in range(scale) for j in range(scale)]
+        dx, dy = offsets[-1]
+        return Scenario(
+            name=self.name,
+            bbox=(min_x, min_y, scale * width, scale * height),
+            robot_outline=self.robot_outline,
+            areas=[Area(id=f'{area.id}-{k}', outline=_shift(area.outline, x, y))
+                   for k, (x, y) in enumerate(offsets) for area in self.areas],
+            obstacles=[Obstacle(id=f'{obstacle.id}-{k}', outline=_shift(obstacle.outline, x, y))
+                       for k, (x, y) in enumerate(offsets) for obstacle in self.obstacles],
+            start=self.start,
+            goal=Pose(x=self.goal.x + dx, y=self.goal.y + dy, yaw=self.goal.yaw),
+        )
+
+
+def _rectangle(x: float, y: float, width: float, height: float) -> list[Point]:
+    return [Point(x=x, y=y), Point(x=x+width, y=y), Point(x=x+width, y=y+height), Point(x=x, y=y+height)]
+
+
+def _shift(outline: list[Point], dx: float, dy: float) -> list[Point]:
+    return [Point(x=p.x + dx, y=p.y + dy) for p in outline]
+
+
+def load_scenarios() -> list[Scenario]:
+    scenarios: list[Scenario] = []
+    for file in sorted(Path(__file__).parent.joinpath('demos').glob('*.py')):
+        demo = importlib.import_module(f'rosys.pathplanning.demos.{file.stem}')
+        points = [p for item in demo.cmd.areas + demo.cmd.obstacles for p in item.outline]
+        points += [demo.cmd.start.point, demo.cmd.goal.point]
+        min_x, max_x = min(p.x for p in points), max(p.x for p in points)
+        min_y, max_y = min(p.y for p in points), max(p.y for p in points)
+        scenarios.append(Scenario(name=file.stem, bbox=(min_x, min_y, max_x - min_x, max_y - min_y),
+                                  robot_outline=demo.robot_outline,
+                                  areas=demo.cmd.areas, obstacles=demo.cmd.obstacles,
+                                  start=demo.cmd.start, goal=demo.cmd.goal))
+    for id_ in EXPERIMENT_IDS:
+        rects, pose, goal, _ = define_experiment(id_)
+        scenarios.append(Scenario(
+            name=f'experiment-{id_}',
+            bbox=BBOX,
+            robot_outline=RobotRenderer.from_size(*ROBOT_SIZE).outline,
+            areas=[],
+            obstacles=[Obstacle(id=str(i), outline=_rectangle(*rect)) for i, rect in enumerate(rects)],
+            start=Pose(x=pose[0], y=pose[1], yaw=pose[2]),
+            goal=Pose(x=goal[0], y=goal[1], yaw=goal[2]),
+        ))
+    return scenarios
+
+
+def measure(function: Callable[[], Any], repeat: int) -> tuple[dict[str, Any], Any]:
+    """Time a function `repeat` times and determine its peak memory in an additional traced run.
+
+    Memory is measured separately because tracing allocations slows down the function considerably.
+    """
+    times: list[float] = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - t)
+    tracemalloc.start()
+    function()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'times': times, 'min': min(times), 'median': float(np.median(times)), 'peak_memory': peak_memory}, result
+
+
+def run(scenario: Scenario, num_layers: int, num_threads: int, repeat: int, *, hierarchical: bool = False) -> dict[str, Any]:
+    points = [p for item in scenario.areas + scenario.obstacles for p in item.outline]
+    points += [scenario.start.point, scenario.goal.point]
+    grid = Grid.from_points(points, pixel_size=0.1, num_layers=num_layers, padding=1.0)
+    benchmarks: dict[str, dict[str, Any]] = {}
+
+    benchmarks['obstacle_map'], obstacle_map = measure(
+        lambda: ObstacleMap.from_world(scenario.robot_outline, scenario.areas, scenario.obstacles, grid,
+                                       num_threads=num_threads), repeat)
+
+    planner = DelaunayPlanner(scenario.robot_outline, PlannerParameters(hierarchical_search=hierarchical))
+    planner.areas = scenario.areas
+    planner.obstacles = scenario.obstacles
+    planner.obstacle_map = obstacle_map
+    benchmarks['graph'], _ = measure(planner._create_graph, repeat)  # pylint: disable=protected-access
+
+    def search() -> list:
+        try:
+            return planner.search(scenario.start, scenario.goal)
+        except RuntimeError:
+            return []
+    benchmarks['search'], path = measure(search, repeat)
+
+    benchmarks['distance_map'], _ = measure(lambda: DistanceMap(obstacle_map, scenario.goal.point), repeat)
+
+    if path:
+        poses = [(scenario.start.x, scenario.start.y, scenario.start.yaw)]
+        poses += [(p.x, p.y, p.yaw) for p in (segment.spline.pose(1.0) for segment in path)]
+        benchmarks['smooth'], _ = measure(lambda: StepPath.from_poses(poses).smooth(obstacle_map), repeat)
+
+    return {
+        'scenario': scenario.name,
+        'grid_size': list(grid.size),
+        'num_areas': len(scenario.areas),
+        'num_obstacles': len(scenario.obstacles),
+        'num_nodes': len(planner.pose_array),
+        'path_found': bool(path),
+        'benchmarks': benchmarks,
+    }
+
+
+def find_regressions(results: list[dict[str, Any]], baseline: list[dict[str, Any]], tolerance: float) -> list[str]:
+    """Compare median times and peak memory with a baseline and describe all values exceeding it by more than `tolerance`."""
+    reference = {(r['scenario'], r['scale'], r['num_layers'], name): benchmark
+                 for r in baseline for name, benchmark in r['benchmarks'].items()}
+    regressions: list[str] = []
+    for result in results:
+        for name, benchmark in result['benchmarks'].items():
+            key = (result['scenario'], result['scale'], result['num_layers'], name)
+            if key not in reference:
+                continue
+            for value in ['median', 'peak_memory']:
+                if benchmark[value] > (1 + tolerance) * reference[key][value]:
+                    regressions.append(f'{" ".join(map(str, key))}: {value} increased from '
+                                       f'{reference[key][value]:.6g} to {benchmark[value]:.6g}')
+    return regressions
+
+
+parser = argparse.ArgumentParser(description='Benchmark the path planner on the demos and experiments.')
+parser.add_argument('--scenarios', nargs='+', default=['*'], help='patterns of scenario names (default: all)')
+parser.add_argument('--scales', nargs='+', type=int, default=[1], help='numbers of tiles per dimension (default: 1)')
+parser.add_argument('--layers', nargs='+', type=int, default=[36], help='numbers of yaw layers (default: 36)')
+parser.add_argument('--threads', type=int, default=1, help='number of threads for creating obstacle maps (default: 1)')
+parser.add_argument('--hierarchical', action='store_true', help='use hierarchical coarse-to-fine search')
+parser.add_argument('--repeat', type=int, default=3, help='number of timed runs per benchmark (default: 3)')
+parser.add_argument('--output', type=Path, help='JSON file to write the results to')
+parser.add_argument('--compare', type=Path, help='JSON file with baseline results to check for regressions')
+parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative increase (default: 0.2)')
+args = parser.parse_args()
+
+results: list[dict[str, Any]] = []
+print(f'{"scenario":<16} {"scale":>5} {"layers":>6} {"nodes":>6} '
+      f'{"map [s]":>8} {"graph [s]":>9} {"search [s]":>10} {"dist [s]":>8} {"smooth [s]":>10} {"peak [MB]":>9}')
+for scenario in load_scenarios():
+    if not any(fnmatch.fnmatch(scenario.name, pattern) for pattern in args.scenarios):
+        continue
+    for scale in args.scales:
+        for num_layers in args.layers:
+            result = run(scenario.scaled(scale), num_layers, args.threads, args.repeat, hierarchical=args.hierarchical)
+            result = {'scale': scale, 'num_layers': num_layers, **result}
+            results.append(result)
+            medians = {name: f'{benchmark["median"]:.3f}' for name, benchmark in result['benchmarks'].items()}
+            peak = max(benchmark['peak_memory'] for benchmark in result['benchmarks'].values())
+            print(f'{scenario.name:<16} {scale:5d} {num_layers:6d} {result["num_nodes"]:6d} '
+                  f'{medians["obstacle_map"]:>8} {medians["graph"]:>9} {medians["search"]:>10} '
+                  f'{medians["distance_map"]:>8} {medians.get("smooth", "-"):>10} {peak / 1e6:9.1f}', flush=True)
+
+if args.output:
+    args.output.write_text(json.dumps({
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'threads': args.threads,
+        'hierarchical': args.hierarchical,
+        'results': results,
+    }, indent=2))
+
+if args.compare:
+    regressions = find_regressions(results, json.loads(args.compare.read_text())['results'], args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
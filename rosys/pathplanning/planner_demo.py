@@ -47,6 +47,7 @@ planner = DelaunayPlanner(robot_outline)
 
 
 def run() -> None:
+    assert cmd.areas is not None and cmd.obstacles is not None
     t = time.time()
     planner.update_map(cmd.areas, cmd.obstacles, [cmd.start.point, cmd.goal.point], deadline=time.time()+10.0)
     dt0 = time.time() - t
@@ -1,15 +1,21 @@
 import abc
 import logging
+import time
 import uuid
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from multiprocessing import Process
 from multiprocessing.connection import Connection
-from typing import Any
+from typing import Any, Optional
 
+from ..driving import PathSegment
 from ..geometry import Point, Pose, Spline
 from .area import Area
-from .delaunay_planner import DelaunayPlanner
+from .delaunay_planner import DelaunayPlanner, PlannerParameters
 from .obstacle_map import Obstacle
+from .search_cache import SearchCache
+
+ANYTIME_RESERVE = 0.2
+"""time (in seconds) reserved before the deadline of an anytime search to finish the current step and send the result"""
 
 
 @dataclass
@@ -21,10 +27,21 @@ class PlannerCommand(abc.ABC):
         self.id = str(uuid.uuid4())
 
 
+@dataclass(kw_only=True)
+class PlannerWorldCommand(PlannerCommand):
+    """Base class of commands which need the areas and obstacles.
+
+    Usually the areas and obstacles are not part of the command:
+    they are sent as `PlannerWorldUpdate` deltas whenever they change and the command only refers to their `world_version`.
+    Passing explicit `areas` and `obstacles` (e.g. for demos and analysis) overrides this world state.
+    """
+    world_version: int = 0
+    areas: Optional[list[Area]] = None
+    obstacles: Optional[list[Obstacle]] = None
+
+
 @dataclass
-class PlannerSearchCommand(PlannerCommand):
-    areas: list[Area]
-    obstacles: list[Obstacle]
+class PlannerSearchCommand(PlannerWorldCommand):
     start: Pose
     goal: Pose
 
@@ -35,35 +52,49 @@ class PlannerGrowMapCommand(PlannerCommand):
 
 
 @dataclass
-class PlannerTestCommand(PlannerCommand):
-    areas: list[Area]
-    obstacles: list[Obstacle]
+class PlannerTestCommand(PlannerWorldCommand):
     spline: Spline
     backward: bool = False
 
 
 @dataclass
-class PlannerObstacleDistanceCommand(PlannerCommand):
-    areas: list[Area]
-    obstacles: list[Obstacle]
+class PlannerObstacleDistanceCommand(PlannerWorldCommand):
     pose: Pose
     backward: bool = False
 
 
+@dataclass
+class PlannerWorldUpdate:
+    """Added, changed and removed areas and obstacles (by ID) which lead to the given world version."""
+    version: int
+    areas: dict[str, Area] = field(default_factory=dict)
+    removed_areas: list[str] = field(default_factory=list)
+    obstacles: dict[str, Obstacle] = field(default_factory=dict)
+    removed_obstacles: list[str] = field(default_factory=list)
+
+
 @dataclass
 class PlannerResponse:
     id: str
     deadline: float
     content: Any
+    search_cache_hits: int = 0
+    search_cache_misses: int = 0
 
 
 class PlannerProcess(Process):
 
-    def __init__(self, connection: Connection, robot_outline: list[tuple[float, float]]) -> None:
+    def __init__(self, connection: Connection, robot_outline: list[tuple[float, float]],
+                 parameters: Optional[PlannerParameters] = None) -> None:
         super().__init__()
         self.log = logging.getLogger('rosys.pathplanning.PlannerProcess')
         self.connection = connection
-        self.planner = DelaunayPlanner(robot_outline)
+        self.planner = DelaunayPlanner(robot_outline, parameters)
+        self.search_cache = SearchCache(self.planner.parameters.search_cache_size,
+                                        self.planner.parameters.search_cache_tolerance)
+        self.world_version = 0
+        self.areas: dict[str, Area] = {}
+        self.obstacles: dict[str, Obstacle] = {}
 
     def run(self) -> None:
         while True:
@@ -72,26 +103,64 @@ class PlannerProcess(Process):
             except (EOFError, KeyboardInterrupt):
                 self.log.info('PlannerProcess stopped')
                 return
+            if isinstance(cmd, PlannerWorldUpdate):
+                self.update_world(cmd)
+                continue
             try:
                 if isinstance(cmd, PlannerSearchCommand):
-                    self.log.info(cmd)
-                    additional_points = [cmd.start.point, cmd.goal.point]
-                    self.planner.update_map(cmd.areas, cmd.obstacles, additional_points, cmd.deadline)
-                    self.respond(cmd, self.planner.search(cmd.start, cmd.goal))
+                    self.update_map(cmd, [cmd.start.point, cmd.goal.point])
+                    self.respond(cmd, self.search(cmd.start, cmd.goal, cmd.deadline))
                 if isinstance(cmd, PlannerGrowMapCommand):
                     self.planner.grow_map(cmd.points, cmd.deadline)
                     self.respond(cmd, None)
                 if isinstance(cmd, PlannerTestCommand):
-                    self.planner.update_map(cmd.areas, cmd.obstacles, [cmd.spline.start, cmd.spline.end], cmd.deadline)
+                    self.update_map(cmd, [cmd.spline.start, cmd.spline.end])
                     assert self.planner.obstacle_map is not None
                     self.respond(cmd, bool(self.planner.obstacle_map.test_spline(cmd.spline, cmd.backward)))
                 if isinstance(cmd, PlannerObstacleDistanceCommand):
-                    self.planner.update_map(cmd.areas, cmd.obstacles, [cmd.pose.point], cmd.deadline)
+                    self.update_map(cmd, [cmd.pose.point])
                     assert self.planner.obstacle_map is not None
                     self.respond(cmd, self.planner.obstacle_map.get_distance(cmd.pose.x, cmd.pose.y, cmd.pose.yaw))
             except Exception as e:
                 self.log.exception(f'failed to compute cmd "{cmd}"')
                 self.respond(cmd, e)
 
+    def update_world(self, update: PlannerWorldUpdate) -> None:
+        for area_id in update.removed_areas:
+            self.areas.pop(area_id, None)
+        self.areas.update(update.areas)
+        for obstacle_id in update.removed_obstacles:
+            self.obstacles.pop(obstacle_id, None)
+        self.obstacles.update(update.obstacles)
+        self.world_version = update.version
+
+    def search(self, start: Pose, goal: Pose, deadline: float) -> list[PathSegment]:
+        assert self.planner.obstacle_map is not None
+        path = self.search_cache.get(self.planner.map_version, start, goal, self.planner.obstacle_map)
+        if path is not None:
+            self.log.info(f'using cached path ({self.search_cache.hits} hits, {self.search_cache.misses} misses)')
+            return path
+        if self.planner.parameters.anytime_search:
+            path = self.planner.search(start, goal, deadline - ANYTIME_RESERVE)
+            if time.time() > deadline - ANYTIME_RESERVE:
+                return path  # NOTE: the search might have been interrupted, so the path is not cached
+        else:
+            path = self.planner.search(start, goal)
+        self.search_cache.put(self.planner.map_version, start, goal, path)
+        return path
+
+    def update_map(self, cmd: PlannerWorldCommand, points: list[Point]) -> None:
+        if cmd.areas is not None and cmd.obstacles is not None:
+            areas, obstacles = cmd.areas, cmd.obstacles
+        else:
+            if cmd.world_version != self.world_version:
+                raise RuntimeError(f'world version {cmd.world_version} does not match {self.world_version}')
+            # NOTE: unchanged areas and obstacles remain the same objects, so the planner can compare them cheaply
+            areas, obstacles = list(self.areas.values()), list(self.obstacles.values())
+        if isinstance(cmd, PlannerSearchCommand):
+            self.log.info(replace(cmd, areas=areas, obstacles=obstacles))
+        self.planner.update_map(areas, obstacles, points, cmd.deadline)
+
     def respond(self, cmd: PlannerCommand, content: Any) -> None:
-        self.connection.send(PlannerResponse(cmd.id, cmd.deadline, content))
+        self.connection.send(PlannerResponse(cmd.id, cmd.deadline, content,
+                                             self.search_cache.hits, self.search_cache.misses))
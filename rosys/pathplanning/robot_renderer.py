@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
+from functools import lru_cache
+
 import numpy as np
 
 from .binary_renderer import BinaryRenderer
 
+MAX_KERNEL_LIBRARIES = 16
+"""number of kernel libraries (combinations of robot outline, pixel size and number of layers) kept in memory"""
+
 
 class RobotRenderer:
 
@@ -31,3 +37,44 @@ class RobotRenderer:
         renderer.map.fill(False)
         renderer.polygon(self.rendered_outline)
         return renderer.map
+
+    def render_kernels(self, pixel_size: float, num_layers: int) -> KernelLibrary:
+        """Get the robot kernels for all yaw layers, which are rendered only once per process."""
+        outline = tuple((float(x), float(y)) for x, y in self.outline)
+        return _create_kernel_library(outline, float(pixel_size), int(num_layers))
+
+
+@dataclass(slots=True, kw_only=True, frozen=True)
+class KernelLibrary:
+    kernels: tuple[np.ndarray, ...]
+    """read-only robot kernel (uint8) for each yaw layer"""
+    sources: tuple[int, ...]
+    """for each layer the first layer with an identical kernel (the layer itself if its kernel is unique)"""
+
+    @property
+    def unique_layers(self) -> list[int]:
+        return [layer for layer, source in enumerate(self.sources) if source == layer]
+
+    def get_duplicates(self, layer: int) -> list[int]:
+        """Get all other layers with the same kernel as the given unique layer."""
+        return [other for other, source in enumerate(self.sources) if source == layer and other != layer]
+
+
+@lru_cache(maxsize=MAX_KERNEL_LIBRARIES)
+def _create_kernel_library(outline: tuple[tuple[float, float], ...], pixel_size: float, num_layers: int) -> KernelLibrary:
+    """Render the robot kernels for all yaw layers and find layers with bit-identical kernels.
+
+    Kernels are not derived from each other by rotation or mirroring,
+    because rounding ties can make such kernels differ from the rendered ones by single pixels.
+    Symmetric robots still share the layers whose rendered kernels are identical.
+    """
+    renderer = RobotRenderer(list(outline))
+    kernels: list[np.ndarray] = []
+    for layer in range(num_layers):
+        kernel = renderer.render(pixel_size, layer / num_layers * 2 * np.pi).astype(np.uint8)
+        kernel.flags.writeable = False
+        kernels.append(kernel)
+
+    first_layers: dict[tuple[tuple[int, ...], bytes], int] = {}
+    sources = tuple(first_layers.setdefault((kernel.shape, kernel.tobytes()), layer) for layer, kernel in enumerate(kernels))
+    return KernelLibrary(kernels=tuple(kernels), sources=sources)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from ..driving import PathSegment
+from ..geometry import Pose, Spline
+from .obstacle_map import BaseObstacleMap
+
+CacheKey = tuple[int, int, int, int, int, int, int]
+"""map version and quantized x, y and yaw of start and goal"""
+
+
+class SearchCache:
+    """Least recently used search results for the same map and nearly the same start and goal poses.
+
+    Positions (in meters) and yaws (in radians) are quantized with the given `tolerance` (yaws modulo a full turn).
+    Cached paths are adapted to the exact start and goal and tested for collisions before they are returned.
+    Whenever the map version changes, all entries are dropped.
+    """
+
+    def __init__(self, size: int, tolerance: float) -> None:
+        if tolerance <= 0:
+            raise ValueError('the search cache tolerance must be positive')
+        self.size = size
+        self.tolerance = tolerance
+        self.map_version = 0
+        self.entries: OrderedDict[CacheKey, list[PathSegment]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, map_version: int, start: Pose, goal: Pose) -> CacheKey:
+        # NOTE: yaws are quantized with the step closest to the tolerance which divides a full turn,
+        # so that the bucket at 2π wraps around to 0 and yaws on both sides of ±π share their bucket
+        num_yaw_steps = max(int(np.round(2 * np.pi / self.tolerance)), 1)
+        yaw_steps = [int(np.round(np.mod(yaw, 2 * np.pi) / (2 * np.pi) * num_yaw_steps)) % num_yaw_steps
+                     for yaw in [start.yaw, goal.yaw]]
+        return (map_version,
+                int(np.round(start.x / self.tolerance)), int(np.round(start.y / self.tolerance)), yaw_steps[0],
+                int(np.round(goal.x / self.tolerance)), int(np.round(goal.y / self.tolerance)), yaw_steps[1])
+
+    def _set_map_version(self, map_version: int) -> None:
+        if map_version != self.map_version:
+            self.entries.clear()
+            self.map_version = map_version
+
+    def get(self, map_version: int, start: Pose, goal: Pose, obstacle_map: BaseObstacleMap) -> Optional[list[PathSegment]]:
+        """Get a cached path adapted to the given start and goal or `None` if there is none or it is blocked now."""
+        self._set_map_version(map_version)
+        key = self._key(map_version, start, goal)
+        path = self.entries.get(key)
+        if path is not None:
+            path = _adapt_path(path, start, goal)
+            if obstacle_map.test_splines([s.spline for s in path], [s.backward for s in path]).any():
+                del self.entries[key]
+                path = None
+        if path is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return path
+
+    def put(self, map_version: int, start: Pose, goal: Pose, path: list[PathSegment]) -> None:
+        if self.size <= 0 or not path:
+            return
+        self._set_map_version(map_version)
+        key = self._key(map_version, start, goal)
+        self.entries[key] = path
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+def _end_pose(segment: PathSegment) -> Pose:
+    spline = segment.spline
+    return Pose(x=spline.end.x, y=spline.end.y, yaw=spline.yaw(1) + (np.pi if segment.backward else 0))
+
+
+def _start_pose(segment: PathSegment) -> Pose:
+    spline = segment.spline
+    return Pose(x=spline.start.x, y=spline.start.y, yaw=spline.yaw(0) + (np.pi if segment.backward else 0))
+
+
+def _adapt_path(path: list[PathSegment], start: Pose, goal: Pose) -> list[PathSegment]:
+    """Connect the first and last segment of a path to the given start and goal."""
+    path = list(path)
+    first, last = path[0], path[-1]
+    end = goal if len(path) == 1 else _end_pose(first)
+    path[0] = PathSegment(spline=Spline.from_poses(start, end, backward=first.backward), backward=first.backward)
+    if len(path) > 1:
+        path[-1] = PathSegment(spline=Spline.from_poses(_start_pose(last), goal, backward=last.backward),
+                               backward=last.backward)
+    return path
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import heapq
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+BACKWARD_PENALTY = 1.2
+"""factor by which driving an edge backwards is more expensive than driving it forwards"""
+
+
+class SparseGraph:
+    """Directed pose graph stored as sparse matrix in compressed sparse row (CSR) format.
+
+    Nodes are indices of the flattened poses of all pose groups.
+    Each free edge candidate from pose `a` to pose `b` results in a forward edge from `a` to `b`
+    and - unless there is a forward edge in the opposite direction - a more expensive backward edge from `b` to `a`.
+    """
+
+    def __init__(self, num_nodes: int, sources: np.ndarray, targets: np.ndarray, lengths: np.ndarray) -> None:
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=float)
+        reverse = ~np.isin(targets * num_nodes + sources, sources * num_nodes + targets)
+        rows = np.concatenate((sources, targets[reverse]))
+        cols = np.concatenate((targets, sources[reverse]))
+        weights = np.concatenate((lengths, BACKWARD_PENALTY * lengths[reverse]))
+        backward = np.concatenate((np.zeros(len(sources), dtype=bool), np.ones(np.count_nonzero(reverse), dtype=bool)))
+        order = np.lexsort((cols, rows))
+        indptr = np.searchsorted(rows[order], np.arange(num_nodes + 1))
+        # NOTE: scipy keeps explicit zeros in CSR matrices, so edges of zero length are preserved
+        self.matrix = sparse.csr_matrix((weights[order], cols[order], indptr), shape=(num_nodes, num_nodes))
+        self.backward = backward[order]
+        self.num_expanded_nodes = 0
+        """number of nodes expanded by the last search"""
+        self._adjacency: Optional[tuple[list[int], list[int], list[float]]] = None
+
+    @property
+    def num_nodes(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def num_edges(self) -> int:
+        return self.matrix.nnz
+
+    def has_edge(self, source: int, target: int) -> bool:
+        return self._edge_index(source, target) is not None
+
+    def is_backward(self, source: int, target: int) -> bool:
+        index = self._edge_index(source, target)
+        if index is None:
+            raise KeyError(f'there is no edge from {source} to {target}')
+        return bool(self.backward[index])
+
+    def _edge_index(self, source: int, target: int) -> Optional[int]:
+        begin, end = self.matrix.indptr[source], self.matrix.indptr[source + 1]
+        index = begin + np.searchsorted(self.matrix.indices[begin:end], target)
+        return int(index) if index < end and self.matrix.indices[index] == target else None
+
+    def shortest_paths(self, sources: list[int], targets: list[int]) -> list[list[Optional[list[int]]]]:
+        """Find the shortest paths from each source to each target with a single Dijkstra call.
+
+        Returns a list of node indices for each source and target or `None` if the target is unreachable.
+        """
+        if not sources:
+            return []
+        distances, predecessors = csgraph.dijkstra(self.matrix, directed=True, indices=sources,
+                                                   return_predecessors=True)
+        self.num_expanded_nodes = int(np.isfinite(distances).sum())
+        paths: list[list[Optional[list[int]]]] = []
+        for s, source in enumerate(sources):
+            paths.append([])
+            for target in targets:
+                if not np.isfinite(distances[s, target]):
+                    paths[-1].append(None)
+                    continue
+                path = [target]
+                while path[-1] != source:
+                    path.append(int(predecessors[s, path[-1]]))
+                paths[-1].append(path[::-1])
+        return paths
+
+    def astar(self, sources: list[int], targets: list[int], heuristic: Optional[np.ndarray] = None) -> Optional[list[int]]:
+        """Find the shortest path from any of the sources to any of the targets with A*.
+
+        The `heuristic` is a lower bound of the distance from each node to the closest target.
+        Without heuristic the search is a Dijkstra search which stops when the first target is reached.
+        Nodes are expanded again if a shorter path to them is found, so the heuristic does not need to be consistent.
+
+        Returns a list of node indices or `None` if no target is reachable.
+        """
+        if self._adjacency is None:
+            # NOTE: Python lists are much faster than NumPy arrays when accessing single elements
+            self._adjacency = self.matrix.indptr.tolist(), self.matrix.indices.tolist(), self.matrix.data.tolist()
+        indptr, indices, weights = self._adjacency
+        h = [0.0] * self.num_nodes if heuristic is None else np.asarray(heuristic, dtype=float).tolist()
+        target_set = set(targets)
+        distances: dict[int, float] = {source: 0.0 for source in sources}
+        predecessors: dict[int, int] = {}
+        heap = [(h[source], 0.0, source) for source in set(sources)]
+        heapq.heapify(heap)
+        self.num_expanded_nodes = 0
+        while heap:
+            _, distance, node = heapq.heappop(heap)
+            if distance > distances[node]:
+                continue  # NOTE: outdated heap entry
+            self.num_expanded_nodes += 1
+            if node in target_set:
+                path = [node]
+                while path[-1] in predecessors:
+                    path.append(predecessors[path[-1]])
+                return path[::-1]
+            for i in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[i]
+                new_distance = distance + weights[i]
+                if new_distance < distances.get(neighbor, np.inf):
+                    distances[neighbor] = new_distance
+                    predecessors[neighbor] = node
+                    heapq.heappush(heap, (new_distance + h[neighbor], new_distance, neighbor))
+        return None
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import importlib
+import time
+from pathlib import Path
+
+import numpy as np
+
+from rosys.pathplanning.delaunay_planner import DelaunayPlanner, PlannerParameters
+
+CONFIGURATIONS = [
+    ('networkx', 'dijkstra', 'euclidean'),
+    ('scipy', 'dijkstra', 'euclidean'),
+    ('scipy', 'astar', 'euclidean'),
+    ('scipy', 'astar', 'geodesic'),
+]
+
+print(f'{"demo":<14} {"backend":<9} {"algorithm":<18} {"nodes":>6} {"edges":>7} {"graph [s]":>10} {"paths [ms]":>11} '
+      f'{"expanded":>9} {"search [s]":>11} {"length [m]":>11}')
+for file in sorted(Path(__file__).parent.joinpath('demos').glob('*.py')):
+    demo = importlib.import_module(f'rosys.pathplanning.demos.{file.stem}')
+    for backend, algorithm, heuristic in CONFIGURATIONS:
+        planner = DelaunayPlanner(demo.robot_outline, PlannerParameters(graph_backend=backend, search_algorithm=algorithm,
+                                                                        heuristic=heuristic))
+        planner.update_map(demo.cmd.areas, demo.cmd.obstacles, [demo.cmd.start.point, demo.cmd.goal.point], np.inf)
+        t = time.perf_counter()
+        planner._create_graph()  # pylint: disable=protected-access
+        graph_time = time.perf_counter() - t
+        if planner.graph is not None:
+            num_edges = planner.graph.number_of_edges()
+        else:
+            assert planner.sparse_graph is not None
+            num_edges = planner.sparse_graph.num_edges
+        nodes = planner._nodes()  # pylint: disable=protected-access
+        t = time.perf_counter()
+        planner._find_shortest_paths(nodes[:3], nodes[-3:], demo.cmd.goal)  # pylint: disable=protected-access
+        paths_time = time.perf_counter() - t
+        t = time.perf_counter()
+        try:
+            path = planner.search(demo.cmd.start, demo.cmd.goal)
+            length = f'{sum(segment.spline.estimated_length() for segment in path):11.2f}'
+        except RuntimeError:
+            length = f'{"-":>11}'
+        search_time = time.perf_counter() - t
+        # NOTE: the number of nodes expanded by the last shortest path search of the graph (not by a single spline or shunt)
+        expanded = f'{planner.sparse_graph.num_expanded_nodes:9d}' if planner.sparse_graph is not None else f'{"-":>9}'
+        name = algorithm if algorithm == 'dijkstra' else f'{algorithm} ({heuristic})'
+        print(f'{file.stem:<14} {backend:<9} {name:<18} {len(planner.pose_array):6d} {num_edges:7d} '
+              f'{graph_time:10.3f} {paths_time * 1000:11.1f} {expanded} {search_time:11.3f} {length}')
@@ -31,9 +31,9 @@ class Path(list):
                 new_distance = obstacle_map.get_minimum_spline_distance(new_step.spline, backward=new_step.backward)
                 if new_distance == 0:
                     continue
-                old_distance1 = obstacle_map.get_minimum_spline_distance(self[s].spline, self[s].backward)
-                old_distance2 = obstacle_map.get_minimum_spline_distance(self[s+1].spline, self[s+1].backward)
-                if new_distance < min(old_distance1, old_distance2):
+                old_distances = obstacle_map.get_minimum_spline_distances([self[s].spline, self[s+1].spline],
+                                                                          [self[s].backward, self[s+1].backward])
+                if new_distance < old_distances.min():
                     continue
                 self[s] = new_step
                 del self[s+1]
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+from typing import Callable, Optional
+
+import numpy as np
+
+from ..geometry import Point
+from .area import Area
+from .grid import Grid
+from .obstacle import Obstacle
+from .obstacle_map import BaseObstacleMap, ObstacleMap, PixelRect
+
+TileIndex = tuple[int, int]
+"""position (row, col) of a tile; tile (0, 0) starts at the world origin"""
+
+
+class TiledObstacleMap(BaseObstacleMap):
+
+    def __init__(self,
+                 robot_outline: list[tuple[float, float]],
+                 areas: list[Area],
+                 obstacles: list[Obstacle],
+                 pixel_size: float,
+                 num_layers: int,
+                 deadline: Optional[float] = None,
+                 *,
+                 additional_points: Optional[list[Point]] = None,
+                 point_padding: float = 0.0,
+                 tile_size: float = 20.0,
+                 distance_dtype: str = 'float64',
+                 max_distance: float = 2.0) -> None:
+        """Create an obstacle map which consists of square tiles allocated only around areas, obstacles and additional points.
+
+        Each tile is an `ObstacleMap` covering `tile_size` meters plus an overlap with its neighbors.
+        The overlap contains the robot kernel and the saturation distance `max_distance`,
+        so that collisions and distances within each tile are the same as in a dense map covering the whole world.
+        Tiles which are not allocated are blocked if there are areas (everything outside of areas is blocked)
+        and free with a distance of `max_distance` otherwise.
+        Around additional points, tiles are allocated within `point_padding` meters.
+        """
+        if not np.isfinite(max_distance):
+            raise ValueError('tiled obstacle maps need a finite maximum distance')
+        self.robot_outline = robot_outline
+        self.pixel_size = pixel_size
+        self.num_layers = num_layers
+        self.distance_dtype = distance_dtype
+        self.max_distance = max_distance
+        self.tile_pixels = max(int(round(tile_size / pixel_size)), 1)
+        """number of pixels per tile and dimension without the overlap"""
+        robot_radius = np.linalg.norm(robot_outline, axis=1).max()
+        self.overlap = int(np.ceil(robot_radius / pixel_size)) + int(np.ceil(max_distance / pixel_size)) + 2
+        """number of pixels each tile extends into its neighbors"""
+        self.areas: list[Area] = []
+        self.obstacles: list[Obstacle] = []
+        self.additional_points = list(additional_points or [])
+        self.point_padding = point_padding
+        self.default_blocked = False
+        self.tiles: dict[TileIndex, ObstacleMap] = {}
+        self.grid = Grid((0, 0, num_layers), (0, 0, 0, 0))
+        self.first_tile: TileIndex = (0, 0)
+        """index of the tile at the origin of `grid`"""
+        self._rebuild(areas, obstacles, deadline)
+
+    @property
+    def nbytes(self) -> int:
+        """memory occupied by the maps and layer stacks of all tiles"""
+        return sum(t.map.nbytes + t.stack.nbytes + t.dist_stack.nbytes for t in self.tiles.values())
+
+    def _rebuild(self, areas: list[Area], obstacles: list[Obstacle], deadline: Optional[float]) -> None:
+        self.areas = areas
+        self.obstacles = obstacles
+        self.default_blocked = any(len(a.outline) > 2 for a in areas)
+        self.tiles = {index: self._create_tile(index, deadline) for index in self._find_required_tiles()}
+        self._update_grid()
+
+    def update(self,
+               areas: list[Area],
+               obstacles: list[Obstacle],
+               regions: list[tuple[float, float, float, float]],
+               deadline: Optional[float] = None) -> list[PixelRect]:
+        """Re-render the given world regions (x, y, width, height) in all affected tiles.
+
+        Tiles which are needed for new areas or obstacles are created, tiles which are no longer needed are released.
+        If the default of unallocated tiles changes (areas are added to or removed from an area-less world),
+        all tiles are created from scratch.
+
+        :return: the pixel regions (of the possibly changed `grid`) in which the layer stacks might have changed
+        """
+        if any(len(a.outline) > 2 for a in areas) != self.default_blocked:
+            self._rebuild(areas, obstacles, deadline)
+            return [(0, self.grid.size[0], 0, self.grid.size[1])]
+        self.areas = areas
+        self.obstacles = obstacles
+        required = self._find_required_tiles()
+        changed: list[TileIndex] = []
+        tile_rects: list[tuple[TileIndex, PixelRect]] = []
+        for index in list(self.tiles):
+            if index not in required:
+                del self.tiles[index]
+                changed.append(index)
+        for index in sorted(required):
+            if index not in self.tiles:
+                self.tiles[index] = self._create_tile(index, deadline)
+                changed.append(index)
+                continue
+            tile_bbox = self.tiles[index].grid.bbox
+            tile_regions = [region for region in regions if _intersects(region, tile_bbox)]
+            if tile_regions:
+                for rect in self.tiles[index].update(areas, self._find_obstacles(tile_bbox), tile_regions, deadline):
+                    tile_rects.append((index, rect))
+        self._update_grid()
+        core = (self.overlap, self.overlap + self.tile_pixels, self.overlap, self.overlap + self.tile_pixels)
+        return [self._to_grid_rect(index, core) for index in changed] + \
+            [self._to_grid_rect(index, rect) for index, rect in tile_rects]
+
+    def _to_grid_rect(self, index: TileIndex, rect: PixelRect) -> PixelRect:
+        """Convert a pixel region of a tile into a region of `grid`, clipped to the part the tile is responsible for."""
+        row_offset = (index[0] - self.first_tile[0]) * self.tile_pixels - self.overlap
+        col_offset = (index[1] - self.first_tile[1]) * self.tile_pixels - self.overlap
+        row0 = max(rect[0], self.overlap) + row_offset
+        row1 = min(rect[1], self.overlap + self.tile_pixels) + row_offset
+        col0 = max(rect[2], self.overlap) + col_offset
+        col1 = min(rect[3], self.overlap + self.tile_pixels) + col_offset
+        return (int(np.clip(row0, 0, self.grid.size[0])), int(np.clip(max(row1, row0), 0, self.grid.size[0])),
+                int(np.clip(col0, 0, self.grid.size[1])), int(np.clip(max(col1, col0), 0, self.grid.size[1])))
+
+    def add_points(self, points: list[Point], deadline: Optional[float] = None) -> list[TileIndex]:
+        """Make sure that the tiles around the given points are allocated and return the indices of new tiles."""
+        self.additional_points += points
+        new_tiles = [index for index in sorted(self._find_tiles(points, self.point_padding)) if index not in self.tiles]
+        for index in new_tiles:
+            self.tiles[index] = self._create_tile(index, deadline)
+        self._update_grid()
+        return new_tiles
+
+    def _find_tiles(self, points: list[Point], padding: float) -> set[TileIndex]:
+        """Find the tiles containing the bounding box of the given points, expanded by `padding` meters."""
+        if not points:
+            return set()
+        size = self.tile_pixels * self.pixel_size
+        row0 = int(np.floor((min(p.y for p in points) - padding) / size))
+        row1 = int(np.floor((max(p.y for p in points) + padding) / size))
+        col0 = int(np.floor((min(p.x for p in points) - padding) / size))
+        col1 = int(np.floor((max(p.x for p in points) + padding) / size))
+        return {(row, col) for row in range(row0, row1 + 1) for col in range(col0, col1 + 1)}
+
+    def _find_required_tiles(self) -> set[TileIndex]:
+        # NOTE: tiles within the overlap of an outline see it in their extended region
+        padding = self.overlap * self.pixel_size
+        tiles: set[TileIndex] = set()
+        for item in self.areas + self.obstacles:
+            tiles |= self._find_tiles(item.outline, padding)
+        for point in self.additional_points:
+            tiles |= self._find_tiles([point], self.point_padding)
+        return tiles
+
+    def _find_obstacles(self, bbox: tuple[float, float, float, float]) -> list[Obstacle]:
+        return [obstacle for obstacle in self.obstacles if _intersects(_bbox(obstacle.outline), bbox)]
+
+    def _create_tile(self, index: TileIndex, deadline: Optional[float]) -> ObstacleMap:
+        size = self.tile_pixels + 2 * self.overlap
+        row0 = index[0] * self.tile_pixels - self.overlap
+        col0 = index[1] * self.tile_pixels - self.overlap
+        bbox = (col0 * self.pixel_size, row0 * self.pixel_size, size * self.pixel_size, size * self.pixel_size)
+        grid = Grid((size, size, self.num_layers), bbox)
+        # NOTE: all areas are passed, because the renderer decides by their presence whether the background is blocked
+        return ObstacleMap.from_world(self.robot_outline, self.areas, self._find_obstacles(bbox), grid, deadline,
+                                      distance_dtype=self.distance_dtype, max_distance=self.max_distance)
+
+    def _update_grid(self) -> None:
+        """Update the (unallocated) grid spanning all tiles, which is used to sample splines."""
+        if not self.tiles:
+            self.grid = Grid((0, 0, self.num_layers), (0, 0, 0, 0))
+            return
+        rows = [row for row, _ in self.tiles]
+        cols = [col for _, col in self.tiles]
+        self.first_tile = (min(rows), min(cols))
+        height = (max(rows) - min(rows) + 1) * self.tile_pixels
+        width = (max(cols) - min(cols) + 1) * self.tile_pixels
+        self.grid = Grid((height, width, self.num_layers),
+                         (min(cols) * self.tile_pixels * self.pixel_size, min(rows) * self.tile_pixels * self.pixel_size,
+                          width * self.pixel_size, height * self.pixel_size))
+
+    def _dispatch(self, x: np.ndarray, y: np.ndarray, lookup: Callable[[ObstacleMap, np.ndarray], np.ndarray],
+                  default) -> np.ndarray:
+        """Apply a lookup to the tiles containing the given positions and use the default value for unallocated tiles.
+
+        The positions are grouped by tile, so that the lookup gets each tile only once with the indices of its positions.
+        """
+        # NOTE: positions are assigned to the tile of their nearest pixel, which is the pixel used by the tile lookup
+        rows = np.floor(np.floor(y / self.pixel_size) / self.tile_pixels).astype(int)
+        cols = np.floor(np.floor(x / self.pixel_size) / self.tile_pixels).astype(int)
+        result = np.full(len(x), default)
+        tiles, inverse = np.unique(np.stack((rows, cols), axis=1), axis=0, return_inverse=True)
+        order = np.argsort(inverse.reshape(-1), kind='stable')
+        bounds = np.cumsum(np.bincount(inverse.reshape(-1), minlength=len(tiles)))
+        for (row, col), indices in zip(tiles.tolist(), np.split(order, bounds[:-1])):
+            tile = self.tiles.get((row, col))
+            if tile is not None:
+                result[indices] = lookup(tile, indices)
+        return result
+
+    def _query(self, x, y, yaw, function_name: str, default) -> np.ndarray:
+        """Dispatch a pose query to the tiles (see `_dispatch`)."""
+        x, y, yaw = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float),
+                                        np.asarray(yaw, dtype=float))
+        shape = x.shape
+        x, y, yaw = x.ravel(), y.ravel(), yaw.ravel()
+        result = self._dispatch(x, y, lambda tile, indices: getattr(tile, function_name)(x[indices], y[indices], yaw[indices])[0],
+                                default)
+        return result.reshape((1, *shape))
+
+    def test(self, x, y, yaw) -> np.ndarray:
+        return self._query(x, y, yaw, 'test', self.default_blocked)
+
+    def get_distance(self, x, y, yaw) -> np.ndarray:
+        return self._query(x, y, yaw, 'get_distance', 0.0 if self.default_blocked else self.max_distance)
+
+    def is_blocked(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        x, y = np.ravel(x), np.ravel(y)
+        return self._dispatch(x, y, lambda tile, indices: tile.is_blocked(x[indices], y[indices]), self.default_blocked)
+
+    def get_obstacle_distances(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the obstacle distances and their gradients like `ObstacleMap.get_obstacle_distances`.
+
+        Each tile only sees obstacles within its overlap, so larger distances are infinite.
+        """
+        x, y = np.ravel(x), np.ravel(y)
+        distances = np.full(len(x), 0.0 if self.default_blocked else np.inf)
+        gradient_x = np.zeros(len(x))
+        gradient_y = np.zeros(len(x))
+
+        def lookup(tile: ObstacleMap, indices: np.ndarray) -> np.ndarray:
+            distances[indices], gradient_x[indices], gradient_y[indices] = \
+                tile.get_obstacle_distances(x[indices], y[indices])
+            return distances[indices]
+        self._dispatch(x, y, lookup, 0.0)
+        far = distances >= self.overlap * self.pixel_size
+        distances[far] = np.inf
+        gradient_x[far] = 0.0
+        gradient_y[far] = 0.0
+        return distances, gradient_x, gradient_y
+
+
+def _bbox(outline: list[Point]) -> tuple[float, float, float, float]:
+    min_x, min_y = min(p.x for p in outline), min(p.y for p in outline)
+    return min_x, min_y, max(p.x for p in outline) - min_x, max(p.y for p in outline) - min_y
+
+
+def _intersects(a: tuple[float, float, float, float], b: tuple[float, float, float, float]) -> bool:
+    return a[0] <= b[0] + b[2] and b[0] <= a[0] + a[2] and a[1] <= b[1] + b[3] and b[1] <= a[1] + a[3]
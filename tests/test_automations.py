@@ -76,3 +76,17 @@ async def test_aborting_a_drive(driver: Driver, automator: Automator, robot: Rob
     await forward(seconds=1)
     assert_pose(1, 0, deg=0)
     assert cause == ['an exception occurred in an automation']
+
+
+@pytest.mark.parametrize('trigger_on_odometry', [False, True])
+async def test_driving_with_higher_control_frequency(driver: Driver, automator: Automator, robot: Robot,
+                                                     trigger_on_odometry: bool):
+    driver.parameters.control_frequency = 50
+    driver.parameters.trigger_on_odometry = trigger_on_odometry
+    automator.start(driver.drive_spline(Spline.from_poses(Pose(x=0, y=0, yaw=0), Pose(x=4, y=1, yaw=0))))
+    await forward(1.0)
+    assert driver.state is not None
+    assert driver.state.num_cycles >= 49
+    assert driver.state.num_overruns == 0
+    await forward(x=4)
+    assert_pose(4, 1, deg=0, deg_tolerance=5)
@@ -1,7 +1,10 @@
+import copy
+import pickle
+
 import numpy as np
 import pytest
 
-from rosys.geometry import Line, LineSegment, Point, Pose, PoseStep, Rectangle, Rotation
+from rosys.geometry import Line, LineSegment, Point, Pose, PoseStep, Rectangle, Rotation, Spline, SplineArray
 from rosys.test import approx
 
 
@@ -81,3 +84,51 @@ def test_quaternion():
     quaternion = rotation.quaternion
     rotation_ = Rotation.from_quaternion(*quaternion)
     assert np.allclose(rotation.R, rotation_.R)
+
+
+def test_spline_array():
+    rng = np.random.default_rng(42)
+    starts = np.column_stack((rng.uniform(-5, 5, (100, 2)), rng.uniform(-np.pi, np.pi, 100)))
+    ends = np.column_stack((rng.uniform(-5, 5, (100, 2)), rng.uniform(-np.pi, np.pi, 100)))
+    backward = rng.random(100) < 0.5
+    splines = [Spline.from_poses(Pose(x=s[0], y=s[1], yaw=s[2]), Pose(x=e[0], y=e[1], yaw=e[2]), backward=b)
+               for s, e, b in zip(starts, ends, backward)]
+    array = SplineArray.from_poses(starts, ends, backward=backward)
+    assert len(array) == 100
+    assert np.allclose(array.points, SplineArray.from_splines(splines).points)
+    assert repr(array[3]) == repr(splines[3])
+    assert len(array[backward]) == backward.sum()
+
+    t = rng.random((100, 5))
+    for name in ['x', 'y', 'yaw', 'curvature']:
+        assert np.allclose(getattr(array, name)(t), [getattr(spline, name)(t_) for spline, t_ in zip(splines, t)])
+    assert np.allclose(array.max_curvature(), [spline.max_curvature() for spline in splines])
+    assert np.allclose(array.estimated_length(), [spline.estimated_length() for spline in splines])
+
+
+def test_arc_length_table():
+    spline = Spline.from_poses(Pose(x=0, y=0, yaw=0), Pose(x=5, y=2, yaw=1.0))
+    table = spline.arc_length_table
+    assert spline.arc_length_table is table, 'the table should be cached'
+    assert table.length == pytest.approx(spline.estimated_length(), rel=0.01)
+    assert table.t_at(table.s_at(0.3)) == pytest.approx(0.3)
+    assert table.t_at(-1.0) == 0.0
+    assert table.t_at(table.length + 1.0) == 1.0
+
+    for t in [0.0, 0.2, 0.5, 0.9]:
+        point = spline.pose(t).transform(Point(x=0, y=0.2))
+        assert table.closest_point(point.x, point.y) == pytest.approx(spline.closest_point(point.x, point.y), abs=1e-3)
+    beyond = spline.pose(1.0).transform(Point(x=0.5, y=0))
+    assert table.closest_point(beyond.x, beyond.y) == 1.0
+    assert table.closest_point(beyond.x, beyond.y, s_max=2.0) == pytest.approx(table.t_at(2.0), abs=1e-3)
+
+
+def test_arc_length_table_is_not_pickled_or_copied():
+    spline = Spline.from_poses(Pose(x=0, y=0, yaw=0), Pose(x=50, y=2, yaw=1.0))
+    size = len(pickle.dumps(spline))
+    table = spline.arc_length_table
+    assert len(pickle.dumps(spline)) == size
+    for other in [pickle.loads(pickle.dumps(spline)), copy.copy(spline), copy.deepcopy(spline)]:
+        assert other == spline
+        assert other.arc_length_table is not table
+        assert np.array_equal(other.arc_length_table.s, table.s)
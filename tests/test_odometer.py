@@ -1,5 +1,5 @@
 import numpy as np
-from rosys.driving import Odometer
+from rosys.driving import Odometer, PoseHistory
 from rosys.event import Event
 from rosys.geometry import Pose, Velocity
 from rosys.test import approx
@@ -38,3 +38,56 @@ def test_odometry_frame():
     detection = Pose(x=1.5, y=4.0, yaw=np.deg2rad(135), time=2)
     odometry_frame = Odometer._compute_odometry_frame(local_pose, detection)
     approx(odometry_frame, Pose(x=1.0, y=2.0, yaw=np.deg2rad(90), time=2))
+
+
+def test_pose_history():
+    history = PoseHistory(capacity=4)
+    for t in range(10):
+        history.append(Pose(x=t, yaw=0.1 * t, time=t))
+    assert len(history) == 10
+    assert history[-1] == Pose(x=9, yaw=0.9, time=9)
+
+    history.prune(5.0)
+    assert [pose.time for pose in history] == [6, 7, 8, 9]
+    for t in range(10, 100):
+        history.prune(t - 5.0)
+        history.append(Pose(x=t, time=t))
+    assert history[0] == Pose(x=95, time=95)
+    assert history.capacity < 100
+
+    x, y, yaw, inside = history.interpolate(np.array([90.0, 95.5, 98.25, 99.0]))
+    assert x.tolist() == [99.0, 95.5, 98.25, 99.0]
+    assert y.tolist() == yaw.tolist() == [0.0, 0.0, 0.0, 0.0]
+    assert inside.tolist() == [False, True, True, False]
+
+
+def test_get_poses():
+    wheels = DummyVelocityProvider()
+    odometer = Odometer(wheels)
+    for t in range(11):
+        odometer.handle_velocities([Velocity(linear=1.0, angular=0.0, time=t)])
+    odometer.handle_detection(Pose(x=5.5, time=5.0))
+
+    times = np.array([2.0, 8.5, 12.0])
+    poses = odometer.get_poses(times)
+    for time, (x, y, yaw) in zip(times, poses):
+        assert Pose(x=x, y=y, yaw=yaw, time=time) == odometer.get_pose(time)
+    assert odometer.get_poses(times, local=True)[:, 0].tolist() == [2.0, 8.5, 10.0]
+
+
+def test_handle_velocity_arrays():
+    wheels = DummyVelocityProvider()
+    odometer = Odometer(wheels)
+
+    # NOTE: driving a quarter circle with a radius of 2 m in 100 steps
+    time = np.linspace(0.0, 1.0, 101)
+    odometer.handle_velocity_arrays(time, np.full(101, np.pi), np.full(101, np.pi / 2))
+    approx(odometer.prediction, Pose(x=2.0, y=2.0, yaw=np.pi / 2, time=1.0))
+    approx(odometer.get_pose(0.5), Pose(x=np.sqrt(2), y=2.0 - np.sqrt(2), yaw=np.pi / 4, time=0.5), abs=1e-3)
+    assert len(odometer.history) == 101
+    assert odometer.current_velocity == Velocity(linear=np.pi, angular=np.pi / 2, time=1.0)
+    assert odometer.last_movement == 1.0
+
+    odometer.handle_velocities([Velocity(linear=0.0, angular=0.0, time=t) for t in [1.1, 1.2]])
+    assert odometer.last_movement == 1.0
+    approx(odometer.prediction, Pose(x=2.0, y=2.0, yaw=np.pi / 2, time=1.2))
@@ -9,8 +9,16 @@ from rosys.automation import Automator
 from rosys.driving import Driver
 from rosys.geometry import Point, Pose, Prism, Spline
 from rosys.hardware import Robot
-from rosys.pathplanning import Obstacle, PathPlanner
+from rosys.pathplanning import Area, Obstacle, PathPlanner, PlannerParameters, obstacle_map
+from rosys.pathplanning.binary_renderer import BinaryRenderer
 from rosys.pathplanning.delaunay_planner import DelaunayPlanner
+from rosys.pathplanning.distance_map import DistanceMap
+from rosys.pathplanning.grid import Grid
+from rosys.pathplanning.obstacle_map import ObstacleMap
+from rosys.pathplanning.robot_renderer import RobotRenderer
+from rosys.pathplanning.search_cache import SearchCache
+from rosys.pathplanning.sparse_graph import SparseGraph
+from rosys.pathplanning.tiled_obstacle_map import TiledObstacleMap
 from rosys.test import assert_point, forward
 
 
@@ -34,6 +42,9 @@ async def test_basic_path_planning(path_planner: PathPlanner) -> None:
     path = await path_planner.search(start=Pose(), goal=goal, timeout=1.0)
     assert_point(path[-1].spline.end, goal.point)
 
+    await path_planner.search(start=Pose(), goal=goal, timeout=1.0)
+    assert path_planner.search_cache_stats == {'hits': 1, 'misses': 2}
+
 
 async def test_driving_to_planned_point(path_planner: PathPlanner, driver: Driver, automator: Automator, robot: Robot) -> None:
     await forward(1.0)
@@ -66,6 +77,31 @@ async def test_test_spline(path_planner: PathPlanner) -> None:
     obstacle = create_obstacle(x=2, y=1)
     path_planner.obstacles[obstacle.id] = obstacle
     assert await path_planner.test_spline(spline) == True
+    assert path_planner.latency_stats['PlannerTestCommand']['count'] == 2
+
+
+async def test_world_updates(path_planner: PathPlanner) -> None:
+    await forward(1.0)
+    spline = Spline.from_poses(Pose(x=0, y=0), Pose(x=2, y=1))
+    obstacle = create_obstacle(x=2, y=1)
+    path_planner.obstacles[obstacle.id] = obstacle
+    path_planner.OBSTACLES_CHANGED.emit(path_planner.obstacles)
+    assert await path_planner.test_spline(spline) == True
+    version = path_planner.world_version
+
+    obstacle.outline[:] = create_obstacle(x=5, y=5).outline
+    path_planner.OBSTACLES_CHANGED.emit(path_planner.obstacles)
+    await forward(0.1)
+    assert path_planner.world_version == version + 1, 'modifications in place should be sent after emitting the event'
+    assert await path_planner.test_spline(spline) == False
+
+    obstacle = create_obstacle(x=1, y=0.5)
+    path_planner.obstacles.clear()
+    path_planner.obstacles[obstacle.id] = obstacle
+    assert await path_planner.test_spline(spline) == True
+    assert path_planner.world_version == version + 2
+    await path_planner.get_obstacle_distance(Pose(x=1, y=0.5))
+    assert path_planner.world_version == version + 2, 'unchanged obstacles should not be sent again'
 
 
 def test_grow_map(shape: Prism) -> None:
@@ -79,8 +115,228 @@ def test_grow_map(shape: Prism) -> None:
     assert path is not None
     assert planner.obstacle_map.grid.bbox == pytest.approx((-1.2, -1.2, 4.4, 3.4))
 
+    obstacle_map = planner.obstacle_map
     planner.grow_map([Point(x=5, y=0)], time.time() + 3.0)
-    assert planner.obstacle_map.grid.bbox == pytest.approx((-2.4, -2.4, 8.6, 5.8))
+    assert planner.obstacle_map is obstacle_map, 'the map should have grown in place'
+    min_x, min_y, width, height = planner.obstacle_map.grid.bbox
+    assert (min_x, min_y, height) == pytest.approx((-1.2, -1.2, 3.4))
+    assert min_x + width >= 6.2
+
+    reference = ObstacleMap.from_world(shape.outline, [], [], planner.obstacle_map.grid, time.time() + 3.0)
+    assert np.array_equal(planner.obstacle_map.stack, reference.stack)
+    blocked, lengths, _ = planner._test_edge_candidates(planner.edge_candidates)  # pylint: disable=protected-access
+    assert np.array_equal(planner.edge_candidate_blocked, blocked)
+    assert np.allclose(planner.edge_candidate_lengths, lengths)
+    assert planner.search(start, Pose(x=5, y=0)) is not None
+
+
+def test_incremental_map_update(shape: Prism) -> None:
+    area = Area(id='area', outline=[Point(x=-5, y=-5), Point(x=10, y=-5), Point(x=10, y=5), Point(x=-5, y=5)])
+    obstacle = create_obstacle(x=3, y=2)
+    start = Pose(x=0, y=0)
+    goal = Pose(x=6, y=0)
+    planner = DelaunayPlanner(shape.outline)
+    planner.update_map([area], [obstacle], [start.point, goal.point], time.time() + 10.0)
+    obstacle_map = planner.obstacle_map
+
+    new_obstacle = create_obstacle(x=3, y=0)
+    planner.update_map([area], [obstacle, new_obstacle], [start.point, goal.point], time.time() + 10.0)
+    assert planner.obstacle_map is obstacle_map, 'the map should have been updated incrementally'
+    assert planner.obstacle_map.test_spline(Spline.from_poses(start, goal))
+
+    reference = DelaunayPlanner(shape.outline)
+    reference.update_map([area], [obstacle, new_obstacle], [start.point, goal.point], time.time() + 10.0)
+    assert reference.obstacle_map.grid.bbox == pytest.approx(planner.obstacle_map.grid.bbox)
+    assert np.array_equal(planner.obstacle_map.map, reference.obstacle_map.map)
+    assert np.array_equal(planner.obstacle_map.stack, reference.obstacle_map.stack)
+    assert np.allclose(planner.obstacle_map.dist_stack, reference.obstacle_map.dist_stack)
+
+    path = planner.search(start, goal)
+    assert_point(path[-1].spline.end, goal.point)
+    assert not any(planner.obstacle_map.test_spline(segment.spline, segment.backward) for segment in path)
+
+
+def test_obstacle_map_cache(shape: Prism, tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(obstacle_map, 'CACHE_PATH', tmp_path)
+    obstacles = [create_obstacle(x=3, y=2)]
+    points = [Point(x=0, y=0), Point(x=6, y=0)]
+
+    planner = DelaunayPlanner(shape.outline, PlannerParameters(cache_obstacle_maps=True))
+    planner.update_map([], obstacles, points, time.time() + 10.0)
+    assert len(list(tmp_path.glob('*.npy'))) == 3
+
+    restarted_planner = DelaunayPlanner(shape.outline, PlannerParameters(cache_obstacle_maps=True))
+    restarted_planner.update_map([], obstacles, points, time.time() + 10.0)
+    assert isinstance(restarted_planner.obstacle_map.stack, np.memmap)
+    assert np.array_equal(restarted_planner.obstacle_map.stack, planner.obstacle_map.stack)
+    assert np.array_equal(restarted_planner.obstacle_map.dist_stack, planner.obstacle_map.dist_stack)
+
+    restarted_obstacle_map = restarted_planner.obstacle_map
+    restarted_planner.update_map([], obstacles + [create_obstacle(x=5, y=0.5, radius=0.2)], points, time.time() + 10.0)
+    assert restarted_planner.obstacle_map is restarted_obstacle_map
+    assert not np.array_equal(restarted_planner.obstacle_map.stack, planner.obstacle_map.stack)
+    assert np.array_equal(np.load(next(tmp_path.glob('*.stack.npy'))), planner.obstacle_map.stack), \
+        'updates must not be written back to the cache'
+
+
+def test_compact_distance_stack(shape: Prism) -> None:
+    obstacles = [create_obstacle(x=3, y=2)]
+    points = [Point(x=0, y=0), Point(x=6, y=0)]
+    reference = DelaunayPlanner(shape.outline)
+    reference.update_map([], obstacles, points, time.time() + 10.0)
+    planner = DelaunayPlanner(shape.outline, PlannerParameters(distance_dtype='uint16', max_distance=1.0))
+    planner.update_map([], obstacles, points, time.time() + 10.0)
+    assert planner.obstacle_map.dist_stack.nbytes == reference.obstacle_map.dist_stack.nbytes // 4
+    assert np.array_equal(planner.obstacle_map.stack, reference.obstacle_map.stack)
+
+    x, y, yaw = np.random.uniform(-1, 7, 1000), np.random.uniform(-2, 4, 1000), np.random.uniform(-np.pi, np.pi, 1000)
+    expected = np.minimum(reference.obstacle_map.get_distance(x, y, yaw), 1.0)
+    assert np.allclose(planner.obstacle_map.get_distance(x, y, yaw), expected, atol=0.005)
+
+    obstacles = obstacles + [create_obstacle(x=5, y=0.5, radius=0.2)]
+    reference.update_map([], obstacles, points, time.time() + 10.0)
+    planner.update_map([], obstacles, points, time.time() + 10.0)
+    expected = np.minimum(reference.obstacle_map.get_distance(x, y, yaw), 1.0)
+    assert np.allclose(planner.obstacle_map.get_distance(x, y, yaw), expected, atol=0.005)
+
+
+def test_parallel_obstacle_map(shape: Prism) -> None:
+    obstacles = [create_obstacle(x=3, y=2), create_obstacle(x=5, y=0.5, radius=0.2)]
+    grid = Grid.from_points([Point(x=0, y=0), Point(x=6, y=3)], pixel_size=0.1, num_layers=36, padding=1.0)
+    reference = ObstacleMap.from_world(shape.outline, [], obstacles, grid)
+    parallel = ObstacleMap.from_world(shape.outline, [], obstacles, grid, num_threads=4)
+    assert np.array_equal(parallel.stack, reference.stack)
+    assert np.array_equal(parallel.dist_stack, reference.dist_stack)
+    with pytest.raises(TimeoutError):
+        ObstacleMap.from_world(shape.outline, [], obstacles, grid, time.time() - 1.0, num_threads=4)
+
+
+@pytest.mark.parametrize('with_areas', [False, True])
+def test_tiled_obstacle_map(shape: Prism, with_areas: bool) -> None:
+    obstacles = [create_obstacle(x=3, y=2), create_obstacle(x=5, y=0.5, radius=0.2), create_obstacle(x=1000, y=500)]
+    areas = [Area(id='field', outline=create_obstacle(x=3, y=2, radius=3).outline)] if with_areas else []
+    tiled = TiledObstacleMap(shape.outline, areas, obstacles, 0.1, 36, tile_size=4.0, max_distance=1.0)
+    assert len(tiled.tiles) < 20, 'only tiles around the areas and obstacles should be allocated'
+    grid = Grid((160, 160, 36), (-4.0, -4.0, 16.0, 16.0))
+    rng = np.random.default_rng(0)
+    x, y, yaw = rng.uniform(-2, 10, 1000), rng.uniform(-2, 10, 1000), rng.uniform(-np.pi, np.pi, 1000)
+    splines = [Spline.from_poses(Pose(x=x[i], y=y[i], yaw=yaw[i]), Pose(x=x[i+1], y=y[i+1], yaw=yaw[i])) for i in range(0, 100, 2)]
+
+    def assert_equal_to_dense_map() -> None:
+        dense = ObstacleMap.from_world(shape.outline, areas, obstacles, grid, max_distance=1.0)
+        assert np.array_equal(tiled.test(x, y, yaw), dense.test(x, y, yaw))
+        assert np.allclose(tiled.get_distance(x, y, yaw), dense.get_distance(x, y, yaw))
+        assert np.array_equal(tiled.test_splines(splines), dense.test_splines(splines))
+    assert_equal_to_dense_map()
+    assert tiled.test(1000, 500, 0) and tiled.test(500, 500, 0) == with_areas
+
+    obstacles = obstacles[1:] + [create_obstacle(x=6, y=4, radius=0.3)]
+    rects = tiled.update(areas, obstacles, [(2.5, 1.5, 1.0, 1.0), (5.7, 3.7, 0.6, 0.6)])
+    assert_equal_to_dense_map()
+    for point in [Point(x=3, y=2), Point(x=6, y=4)]:
+        row, col = tiled.grid.to_grid(point.x, point.y)
+        assert any(r0 <= row < r1 and c0 <= col < c1 for r0, r1, c0, c1 in rects), 'changed pixels should be reported'
+
+
+def test_tiled_planner(shape: Prism) -> None:
+    obstacles = [create_obstacle(x=3, y=0), create_obstacle(x=100, y=100)]
+    start = Pose(x=0, y=0)
+    goal = Pose(x=6, y=0)
+    planner = DelaunayPlanner(shape.outline, PlannerParameters(tile_size=4.0, max_distance=2.0,
+                                                               graph_backend='scipy', hierarchical_search=True))
+    planner.update_map([], obstacles, [start.point, goal.point], time.time() + 10.0)
+    assert isinstance(planner.obstacle_map, TiledObstacleMap)
+    dense_size = planner.obstacle_map.grid.size[0] * planner.obstacle_map.grid.size[1] * (1 + 36 * (1 + 8))
+    assert planner.obstacle_map.nbytes < 0.1 * dense_size, 'only tiles around obstacles and points should be allocated'
+    path = planner.search(start, goal)
+    assert_point(path[-1].spline.end, goal.point)
+    assert not any(planner.obstacle_map.test_spline(segment.spline, segment.backward) for segment in path)
+
+    obstacle_map = planner.obstacle_map
+    planner.update_map([], obstacles + [create_obstacle(x=3, y=2)], [start.point, goal.point], time.time() + 10.0)
+    assert planner.obstacle_map is obstacle_map, 'the map should have been updated incrementally'
+    planner.grow_map([Point(x=0, y=-10)], time.time() + 10.0)
+    assert planner.obstacle_map is obstacle_map, 'the map should have grown in place'
+    path = planner.search(start, Pose(x=0, y=-10))
+    assert not any(planner.obstacle_map.test_spline(segment.spline, segment.backward) for segment in path)
+
+    with pytest.raises(ValueError):
+        DelaunayPlanner(shape.outline, PlannerParameters(tile_size=4.0))
+
+
+def test_scanline_rasterizer() -> None:
+    rng = np.random.default_rng(0)
+    for i in range(300):
+        # NOTE: integer coordinates cause many points exactly on edges
+        points = rng.uniform(-5, 45, (rng.integers(3, 10), 2))
+        if i % 2:
+            points = np.round(points)
+        renderers = [BinaryRenderer((40, 45), fill_value=True, backend=backend) for backend in ['matplotlib', 'scanline']]
+        for renderer in renderers:
+            renderer.polygon(points, False)
+        assert np.array_equal(renderers[0].map, renderers[1].map)
+
+
+def test_scanline_rasterizer_with_degenerate_outlines() -> None:
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        # NOTE: areas which are being drawn have only one or two points
+        points = np.round(rng.uniform(-5, 45, (rng.integers(1, 3), 2)))
+        renderers = [BinaryRenderer((40, 45), fill_value=True, backend=backend) for backend in ['matplotlib', 'scanline']]
+        for renderer in renderers:
+            renderer.polygon(points, False)
+        assert renderers[0].map.all()
+        assert renderers[1].map.all()
+
+
+def test_kernel_library() -> None:
+    for robot_renderer, num_unique_layers in [
+        (RobotRenderer.from_size(0.77, 1.21), 18),
+        (RobotRenderer.from_size(0.77, 1.21, 0.445), 36),
+        (RobotRenderer(Prism.default_robot_shape().outline), 36),
+    ]:
+        library = robot_renderer.render_kernels(0.1, 36)
+        assert robot_renderer.render_kernels(0.1, 36) is library
+        assert len(library.unique_layers) == num_unique_layers
+        for layer, kernel in enumerate(library.kernels):
+            assert np.array_equal(kernel, robot_renderer.render(0.1, layer / 36 * 2 * np.pi))
+
+
+def test_batch_spline_tests(shape: Prism) -> None:
+    planner = DelaunayPlanner(shape.outline)
+    planner.update_map([], [create_obstacle(x=2, y=1)], [Point(x=0, y=0), Point(x=4, y=2)], time.time() + 10.0)
+    splines = [
+        Spline.from_poses(Pose(x=0, y=0), Pose(x=4, y=2)),
+        Spline.from_poses(Pose(x=0, y=0), Pose(x=1, y=-1)),
+        Spline.from_poses(Pose(x=0, y=0), Pose(x=0, y=0)),
+        Spline.from_poses(Pose(x=4, y=2), Pose(x=1, y=1), backward=True),
+    ]
+    backward_flags = [False, False, False, True]
+    collisions = planner.obstacle_map.test_splines(splines, backward_flags)
+    assert collisions.tolist() == [True, False, False, True]
+    assert collisions.tolist() == [planner.obstacle_map.test_spline(s, b) for s, b in zip(splines, backward_flags)]
+
+    distances = planner.obstacle_map.get_minimum_spline_distances(splines, backward_flags)
+    assert distances[0] == 0
+    assert distances[1] > 0
+    assert distances[2] == np.inf, 'splines without samples have no minimum distance'
+    assert distances[1] == planner.obstacle_map.get_minimum_spline_distance(splines[1])
+
+
+async def test_worker_pool(shape: Prism, integration: None) -> None:
+    path_planner = PathPlanner(shape, num_workers=2)
+    await forward(1.0)
+
+    spline = Spline.from_poses(Pose(), Pose(x=2.0, y=1.0))
+    search = asyncio.create_task(path_planner.search(start=Pose(), goal=Pose(x=10.0, y=1.0), timeout=20.0), name='search')
+    await asyncio.sleep(0)
+    test = asyncio.create_task(path_planner.test_spline(spline, timeout=20.0), name='test')
+    await asyncio.sleep(0)
+    assert path_planner.queue_depths == [1, 1], 'the test should not queue behind the search'
+    path, collision = await asyncio.gather(search, test, return_exceptions=True)
+    assert isinstance(path, list)
+    assert collision == False
+    assert path_planner.queue_depths == [0, 0]
 
 
 async def test_overlapping_commands(path_planner: PathPlanner) -> None:
@@ -96,3 +352,156 @@ async def test_overlapping_commands(path_planner: PathPlanner) -> None:
     path, test = await asyncio.gather(task1, task2)
     assert isinstance(path, list)
     assert isinstance(test, bool)
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_sparse_graph_backend(shape: Prism, incremental: bool) -> None:
+    obstacles = [create_obstacle(x=x, y=y) for x, y in [(2, 0), (4, 1), (6, -1), (4, -3)]]
+    points = [Point(x=-2, y=-4), Point(x=10, y=3)]
+    start, goal = Pose(x=0, y=0), Pose(x=8, y=0, yaw=np.pi)
+    planners = [DelaunayPlanner(shape.outline, PlannerParameters(graph_backend=backend))
+                for backend in ['networkx', 'scipy']]
+    for planner in planners:
+        planner.update_map([], obstacles[:-1] if incremental else obstacles, points, time.time() + 10.0)
+        if incremental:
+            planner.update_map([], obstacles, points, time.time() + 10.0)
+    nx_planner, scipy_planner = planners
+    assert scipy_planner.graph is None
+    assert scipy_planner.sparse_graph is not None
+    assert scipy_planner.sparse_graph.num_edges == nx_planner.graph.number_of_edges()
+
+    nx_path = nx_planner.search(start, goal)
+    scipy_path = scipy_planner.search(start, goal)
+    assert len(scipy_path) == len(nx_path)
+    for nx_segment, scipy_segment in zip(nx_path, scipy_path):
+        assert scipy_segment.backward == nx_segment.backward
+        assert_point(scipy_segment.spline.end, nx_segment.spline.end)
+
+
+def test_astar_search(shape: Prism) -> None:
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 10, (200, 2))
+    sources, targets = np.unique(rng.integers(0, 200, (1000, 2)), axis=0).T
+    lengths = np.linalg.norm(points[sources] - points[targets], axis=1) * rng.uniform(1, 2, len(sources))
+    graph = SparseGraph(200, sources, targets, lengths)
+    from_nodes, to_nodes = [0, 1, 2], [197, 198, 199]
+    dijkstra_path = graph.astar(from_nodes, to_nodes)
+    dijkstra_expansions = graph.num_expanded_nodes
+    heuristic = np.min(np.linalg.norm(points[:, np.newaxis] - points[to_nodes], axis=2), axis=1)
+    astar_path = graph.astar(from_nodes, to_nodes, heuristic)
+    assert graph.num_expanded_nodes < dijkstra_expansions
+
+    def cost(path: list[int]) -> float:
+        return sum(graph.matrix[a, b] for a, b in zip(path[:-1], path[1:]))
+    shortest_paths = [path for row in graph.shortest_paths(from_nodes, to_nodes) for path in row if path is not None]
+    assert cost(astar_path) == pytest.approx(cost(dijkstra_path))
+    assert cost(astar_path) == pytest.approx(min(cost(path) for path in shortest_paths))
+
+    obstacles = [create_obstacle(x=x, y=y) for x, y in [(2, 0), (4, 1), (6, -1), (4, -3)]]
+    start, goal = Pose(x=0, y=0), Pose(x=8, y=0, yaw=np.pi)
+    for heuristic_name in ['euclidean', 'geodesic']:
+        planner = DelaunayPlanner(shape.outline, PlannerParameters(graph_backend='scipy', search_algorithm='astar',
+                                                                   heuristic=heuristic_name))
+        planner.update_map([], obstacles, [Point(x=-2, y=-4), Point(x=10, y=3)], time.time() + 10.0)
+        path = planner.search(start, goal)
+        assert_point(path[-1].spline.end, goal.point)
+        assert not any(planner.obstacle_map.test_spline(segment.spline, segment.backward) for segment in path)
+    with pytest.raises(ValueError):
+        DelaunayPlanner(shape.outline, PlannerParameters(search_algorithm='astar'))
+
+
+def test_hierarchical_search(shape: Prism) -> None:
+    wall = Obstacle(id='wall', outline=[Point(x=10, y=-10), Point(x=11, y=-10), Point(x=11, y=10), Point(x=10, y=10)])
+    points = [Point(x=-10, y=-30), Point(x=30, y=30)]
+    start, goal = Pose(x=5, y=0), Pose(x=15, y=0)
+    reference = DelaunayPlanner(shape.outline)
+    reference.update_map([], [wall], points, time.time() + 10.0)
+    planner = DelaunayPlanner(shape.outline, PlannerParameters(hierarchical_search=True))
+    planner.update_map([], [wall], points, time.time() + 10.0)
+    assert len(planner.tri_points) < len(reference.tri_points) / 2, 'open space should be covered by a coarse lattice'
+    assert np.array_equal(planner.fine_points, reference.tri_points)
+
+    path = planner.search(start, goal)
+    assert_point(path[-1].spline.end, goal.point)
+    assert not any(planner.obstacle_map.test_spline(segment.spline, segment.backward) for segment in path)
+    assert sum(s.spline.estimated_length() for s in path) == \
+        pytest.approx(sum(s.spline.estimated_length() for s in reference.search(start, goal)), rel=0.1)
+
+
+def test_anytime_search(shape: Prism, monkeypatch: pytest.MonkeyPatch) -> None:
+    obstacles = [create_obstacle(x=x, y=y) for x, y in [(2, 0), (4, 1), (6, -1), (4, -3)]]
+    start, goal = Pose(x=0, y=0), Pose(x=8, y=0, yaw=np.pi)
+    planner = DelaunayPlanner(shape.outline)
+    planner.update_map([], obstacles, [Point(x=-2, y=-4), Point(x=10, y=3)], time.time() + 10.0)
+    path = planner.search(start, goal)
+    interrupted_path = planner.search(start, goal, deadline=time.time())
+    assert len(interrupted_path) > len(path), 'there should be no time for shortcuts'
+    assert_point(interrupted_path[0].spline.start, start.point)
+    assert_point(interrupted_path[-1].spline.end, goal.point)
+    assert not any(planner.obstacle_map.test_spline(segment.spline, segment.backward) for segment in interrupted_path)
+    assert len(planner.search(start, goal, deadline=time.time() + 10.0)) == len(path)
+
+    edges: list[tuple] = []
+    is_backward = planner._is_backward  # pylint: disable=protected-access
+    monkeypatch.setattr(planner, '_is_backward', lambda *args: edges.append(args) or is_backward(*args))
+    planner.search(start, goal)
+    num_edges = len(edges)
+    edges.clear()
+    planner.search(start, goal, deadline=time.time())
+    assert 0 < len(edges) < num_edges, 'only the first entry/exit pair should be turned into a path after the deadline'
+
+
+def test_search_cache(shape: Prism) -> None:
+    obstacles = [create_obstacle(x=x, y=y) for x, y in [(2, 0), (4, 1), (6, -1)]]
+    points = [Point(x=-2, y=-4), Point(x=10, y=3)]
+    start, goal = Pose(x=0, y=0), Pose(x=8, y=0, yaw=np.pi)
+    planner = DelaunayPlanner(shape.outline)
+    planner.update_map([], obstacles, points, time.time() + 10.0)
+    cache = SearchCache(4, 0.05)
+    assert cache.get(planner.map_version, start, goal, planner.obstacle_map) is None
+    path = planner.search(start, goal)
+    cache.put(planner.map_version, start, goal, path)
+
+    nearby_start = Pose(x=0.01, y=-0.01, yaw=0.01)
+    cached_path = cache.get(planner.map_version, nearby_start, goal, planner.obstacle_map)
+    assert cached_path is not None
+    assert len(cached_path) == len(path)
+    assert_point(cached_path[0].spline.start, nearby_start.point)
+    assert_point(cached_path[-1].spline.end, goal.point)
+    assert cache.get(planner.map_version, Pose(x=0.1, y=0), goal, planner.obstacle_map) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.get(planner.map_version, start, Pose(x=8, y=0, yaw=-np.pi), planner.obstacle_map) is not None, \
+        'yaws on both sides of ±π should share their bucket'
+    assert cache.get(planner.map_version, Pose(yaw=2 * np.pi - 0.01), goal, planner.obstacle_map) is not None
+    assert (cache.hits, cache.misses) == (3, 2)
+
+    blocked_map = ObstacleMap.from_world(shape.outline, [], [create_obstacle(x=8, y=0, radius=0.3)],
+                                         planner.obstacle_map.grid)
+    assert cache.get(planner.map_version, start, goal, blocked_map) is None, 'the cached path should be revalidated'
+    assert not cache.entries
+    cache.put(planner.map_version, start, goal, path)
+
+    obstacles = obstacles + [create_obstacle(x=8, y=2, radius=0.3)]
+    planner.update_map([], obstacles, points, time.time() + 10.0)
+    assert cache.get(planner.map_version, start, goal, planner.obstacle_map) is None, 'the map has changed'
+    assert not cache.entries
+
+
+def test_distance_map(shape: Prism) -> None:
+    grid = Grid((40, 60, 36), (0, 0, 6.0, 4.0))
+    wall = Obstacle(id='wall', outline=[Point(x=3.0, y=-1), Point(x=3.2, y=-1), Point(x=3.2, y=3.0), Point(x=3.0, y=3.0)])
+    obstacle_map = ObstacleMap.from_world(shape.outline, [], [wall], grid)
+    distance_map = DistanceMap(obstacle_map, Point(x=1.05, y=1.05))
+    assert distance_map.map[10, 10] == pytest.approx(0.0, abs=1e-6)
+    assert distance_map.map[10, 20] == pytest.approx(1.0)
+    assert distance_map.map[20, 20] == pytest.approx(np.sqrt(2))
+    assert np.isinf(distance_map.map[obstacle_map.map]).all()
+
+    x, y = np.array([[1.05, 2.05], [5.05, 5.05]]), np.array([[1.05, 1.05], [1.05, 3.55]])
+    distances = distance_map.interpolate(x, y)
+    assert distances.shape == (2, 2)
+    assert distances[0, 0] == pytest.approx(0.0, abs=1e-6)
+    assert distances[0, 1] == pytest.approx(1.0)
+    assert distances[1, 0] > distances[1, 1] > 4.0, 'the path to the right side leads around the wall'
+    gradient_x, gradient_y = distance_map.gradient(2.05, 1.05)
+    assert (gradient_x, gradient_y) == (pytest.approx(1.0), pytest.approx(0.0))